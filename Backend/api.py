@@ -1,24 +1,256 @@
 # api.py
 
-from flask import Blueprint, request, jsonify, session
-from dataservice import get_goals_by_category, save_goals_for_category, reset_all_goals
+import hashlib
+import json
+import time
+from flask import Blueprint, Response, current_app, request, jsonify, session, make_response, stream_with_context
+from dataservice import (
+    get_goal_tuples, get_all_goal_tuples, get_goal_versions,
+    save_goals_for_category, apply_goal_changes, reset_all_goals,
+    iter_goals, iter_notifications, import_goals, import_notifications,
+    get_goal_stats, get_reminders, set_reminder, disable_reminder, flush_pending_goals
+)
+import bulk_io
+from serialization import encode_goals, encode_goal_groups
 
 api_bp = Blueprint('api', __name__)
 
+def _conditional_goals_response(user_id, categories, build_payload):
+    """
+    Answer from the goal version counters alone when the client's ETag is
+    current; only build the payload (and query goals) when it is not.
+    `build_payload` returns the encoded JSON body.
+    """
+    versions = get_goal_versions(user_id, categories)
+    fingerprint = repr((user_id, sorted(versions.items()))).encode('utf-8')
+    etag = hashlib.blake2b(fingerprint, digest_size=8).hexdigest()
+
+    # Weak matches too: compressed responses carry the ETag as W/"...".
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = current_app.response_class(build_payload(), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _is_int(value):
+    # bool is an int subclass, but never a goal id or position; SQLite (and
+    # orjson) integers are 64-bit.
+    return isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63
+
+GOAL_FIELD_CHECKS = {
+    'id': _is_int,
+    'sort_order': _is_int,
+    'text': lambda value: isinstance(value, str),
+    'completed': lambda value: isinstance(value, (bool, int)),
+}
+
+# (required fields, optional fields) of each PATCH change list's entries.
+GOAL_CHANGE_FIELDS = {
+    'inserted': (('text',), ('completed', 'sort_order')),
+    'updated': (('id',), ('text', 'completed')),
+    'reordered': (('id', 'sort_order'), ()),
+}
+
+def _valid_goal_change(entry, required, optional):
+    return (isinstance(entry, dict)
+            and all(GOAL_FIELD_CHECKS[field](entry.get(field)) for field in required)
+            and all(entry.get(field) is None or GOAL_FIELD_CHECKS[field](entry[field]) for field in optional))
+
+def _invalid_goal_changes(data):
+    """The name of the first malformed change list in a PATCH body, or None."""
+    for name in ('inserted', 'updated', 'reordered', 'deleted'):
+        entries = data.get(name, [])
+        if not isinstance(entries, list):
+            return name
+        if name == 'deleted':
+            valid = all(_is_int(goal_id) for goal_id in entries)
+        else:
+            valid = all(_valid_goal_change(entry, *GOAL_CHANGE_FIELDS[name]) for entry in entries)
+        if not valid:
+            return name
+    return None
+
 @api_bp.route('/goals', methods=['GET', 'POST'])
 def api_goals():
     user_id = session['user_id']
     category = request.args.get('category')
 
     if request.method == 'GET':
-        goals = get_goals_by_category(user_id, category)
-        return jsonify([{'text': g['text'], 'completed': bool(g['completed'])} for g in goals])
+        return _conditional_goals_response(
+            user_id, [category], lambda: encode_goals(get_goal_tuples(user_id, category)))
 
-    data = request.get_json()
-    save_goals_for_category(user_id, category, data.get('goals', []))
+    data = request.get_json(silent=True)
+    goals = data.get('goals', []) if isinstance(data, dict) else None
+    # Ids are checked here too: pending write-behind lists are served as sent.
+    if not category or not isinstance(goals, list) or not all(
+            _valid_goal_change(goal, ('text',), ('id', 'completed')) for goal in goals):
+        return jsonify({'error': 'A category and a list of goals with text are required'}), 400
+    if 'write_behind' in current_app.extensions:
+        import write_behind  # only loaded when enabled
+        # Acknowledged once logged; the background flusher writes it to SQLite.
+        write_behind.submit(user_id, category, goals)
+        return jsonify({'message': 'Goals saved successfully'}), 202
+    save_goals_for_category(user_id, category, goals)
     return jsonify({'message': 'Goals saved successfully'})
 
+@api_bp.route('/goals', methods=['PATCH'])
+def api_goals_patch():
+    """
+    Apply only the goals that changed:
+    {"inserted": [...], "updated": [...], "reordered": [...], "deleted": [ids]}
+    """
+    user_id = session['user_id']
+    category = request.args.get('category')
+    data = request.get_json(silent=True)
+    if not category or not isinstance(data, dict):
+        return jsonify({'error': 'A category and a JSON change set are required'}), 400
+    invalid = _invalid_goal_changes(data)
+    if invalid:
+        return jsonify({'error': f'Malformed "{invalid}" changes'}), 400
+
+    flush_pending_goals(user_id)
+    inserted_ids = apply_goal_changes(
+        user_id, category,
+        inserted=data.get('inserted', []),
+        updated=data.get('updated', []),
+        reordered=data.get('reordered', []),
+        deleted=data.get('deleted', []),
+    )
+    return jsonify({'message': 'Goals updated successfully', 'inserted_ids': inserted_ids})
+
+@api_bp.route('/goals/all')
+def api_all_goals():
+    """
+    Goals for several categories in one round trip.
+    Accepts ?category=daily&category=weekly or ?categories=daily,weekly;
+    with neither, every category the user has goals in is returned.
+    """
+    categories = request.args.getlist('category')
+    for value in request.args.getlist('categories'):
+        categories.extend(c for c in value.split(',') if c)
+    user_id = session['user_id']
+    return _conditional_goals_response(
+        user_id, categories or None, lambda: encode_goal_groups(get_all_goal_tuples(user_id, categories or None)))
+
+@api_bp.route('/stats')
+def api_goal_stats():
+    """
+    Current and longest streaks plus weekly and monthly completion rates for
+    every goal, optionally limited to ?category=.
+    """
+    user_id = session['user_id']
+    flush_pending_goals(user_id)
+    return jsonify(get_goal_stats(user_id, request.args.get('category')))
+
+REMINDER_MESSAGE_MAX_LENGTH = 200
+
+def _valid_reminder_message(message):
+    return message is None or (isinstance(message, str) and len(message) <= REMINDER_MESSAGE_MAX_LENGTH)
+
+@api_bp.route('/reminders')
+def api_reminders():
+    return jsonify(get_reminders(session['user_id']))
+
+@api_bp.route('/reminders/<category>', methods=['PUT', 'DELETE'])
+def api_reminder(category):
+    """
+    PUT enables the category's reminder (optionally with a custom "message");
+    DELETE turns it off, and it stays off until the next PUT.
+    """
+    from reminders import DEFAULT_REMINDERS  # the scheduler module isn't loaded otherwise
+    if category not in DEFAULT_REMINDERS:
+        return jsonify({'error': 'Unknown category'}), 404
+    user_id = session['user_id']
+    interval, message = DEFAULT_REMINDERS[category]
+    if request.method == 'DELETE':
+        disable_reminder(user_id, category, message, interval)
+        return jsonify({'message': 'Reminder disabled'})
+
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}  # no body: the default message
+    if not isinstance(data, dict) or not _valid_reminder_message(data.get('message')):
+        return jsonify({'error': f'"message" must be text of at most {REMINDER_MESSAGE_MAX_LENGTH} characters'}), 400
+    message = data.get('message') or message
+    scheduler = current_app.extensions.get('reminders')
+    first_fire_at = scheduler.first_fire_at(interval) if scheduler else int(time.time()) + interval
+    set_reminder(user_id, category, message, interval, first_fire_at)
+    if scheduler:
+        scheduler.wake()
+    return jsonify({'message': 'Reminder saved', 'next_fire_at': first_fire_at})
+
 @api_bp.route('/reset', methods=['POST'])
 def reset_goals_api():
+    flush_pending_goals(session['user_id'])
     reset_all_goals(session['user_id'])
-    return jsonify({'message': 'Goals reset successfully'})
\ No newline at end of file
+    return jsonify({'message': 'Goals reset successfully'})
+
+@api_bp.route('/stream')
+def api_stream():
+    """
+    Server-Sent Events for the logged-in user: `goals` carries the full list
+    of each category that changed ({"daily": [...]}), `notifications` an
+    action (created, deleted, cleared). Nothing is replayed, so clients
+    reload their data whenever the stream reconnects.
+    """
+    broker = current_app.extensions.get('events')
+    if broker is None:
+        return jsonify({'error': 'Live updates are disabled'}), 404
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    import events  # only loaded (with asyncio) once live updates are in use
+    stream = events.EventStream(broker, broker.subscribe(session['user_id']))
+    # Passed through untouched, so servers see the stream itself (see asgi.py).
+    response = current_app.response_class(stream, mimetype='text/event-stream', direct_passthrough=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer events
+    return response
+
+# Bulk transfer: exports stream row batches straight from a cursor, imports
+# are parsed as the upload arrives and answered with NDJSON progress lines.
+BULK_DATASETS = {
+    'goals': (iter_goals, import_goals, bulk_io.GOAL_FIELDS),
+    'notifications': (iter_notifications, import_notifications, bulk_io.NOTIFICATION_FIELDS),
+}
+
+def _bulk_format():
+    fmt = request.args.get('format', 'ndjson')
+    return fmt if fmt in bulk_io.FORMATS else None
+
+@api_bp.route('/export/<dataset>')
+def export_data(dataset):
+    fmt = _bulk_format()
+    if dataset not in BULK_DATASETS or fmt is None:
+        return jsonify({'error': 'Unknown dataset or format'}), 404
+    user_id = session['user_id']
+    flush_pending_goals(user_id)
+    export, _import, fields = BULK_DATASETS[dataset]
+    mimetype, extension = bulk_io.FORMATS[fmt]
+    response = Response(stream_with_context(bulk_io.encode(export(user_id), fmt, fields)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={dataset}.{extension}'
+    return response
+
+@api_bp.route('/import/<dataset>', methods=['POST'])
+def import_data(dataset):
+    fmt = _bulk_format()
+    if dataset not in BULK_DATASETS or fmt is None:
+        return jsonify({'error': 'Unknown dataset or format'}), 404
+    user_id = session['user_id']
+    flush_pending_goals(user_id)
+    _export, importer = BULK_DATASETS[dataset][:2]
+    records = bulk_io.parse(request.stream, fmt)
+
+    def progress():
+        processed = imported = 0
+        try:
+            for processed, imported in importer(user_id, records):
+                yield json.dumps({'processed': processed, 'imported': imported}) + '\n'
+        except (ValueError, UnicodeDecodeError) as e:
+            # Chunks before the bad record are already committed.
+            yield json.dumps({'error': str(e), 'processed': processed, 'imported': imported}) + '\n'
+            return
+        yield json.dumps({'done': True, 'processed': processed, 'imported': imported}) + '\n'
+
+    return Response(stream_with_context(progress()), mimetype='application/x-ndjson')
@@ -1,53 +1,245 @@
 import os
+import threading
 from flask import Flask
-from flask_mail import Mail
 from dotenv import load_dotenv
 
 # ─── Load Environment Variables ─────────────────────────────
 load_dotenv()
 
-# ─── Flask App Configuration ───────────────────────────────
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 TEMPLATE_DIR = os.path.join(PROJECT_ROOT, 'WebApp', 'templates')
 STATIC_DIR = os.path.join(PROJECT_ROOT, 'WebApp', 'static')
 
-app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
-app.secret_key = os.urandom(24)
+IS_DEVELOPMENT = os.environ.get('FLASK_ENV') == 'development'
 
-app.config['TEMPLATES_AUTO_RELOAD'] = True
 
-app.config.update(
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SECURE=True,
-    SESSION_COOKIE_SAMESITE='Lax',
-)
+def load_config(app):
+    """Read the settings from the environment into app.config."""
+    # ─── Flask App Configuration ───────────────────────────────
+    # A stable key so every worker, and the next restart, accepts the same cookies.
+    # Without SECRET_KEY one is generated once and kept in SECRET_KEY_FILE.
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['SECRET_KEY_FILE'] = os.getenv('SECRET_KEY_FILE', os.path.join(PROJECT_ROOT, 'Backend', 'secret.key'))
 
-# ─── Email Configuration ───────────────────────────────────
-app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.example.com')  # use env variable or default
-app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))  # default 587
-app.config['MAIL_USE_TLS'] = True  # TLS support
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'your_email@example.com')
+    # Re-stat template files on every render only while developing.
+    app.config['TEMPLATES_AUTO_RELOAD'] = IS_DEVELOPMENT
+    app.config['DEBUG'] = IS_DEVELOPMENT
 
-# Initialize Flask-Mail
-mail = Mail(app)
+    app.config.update(
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SECURE=True,
+        SESSION_COOKIE_SAMESITE='Lax',
+    )
 
-# ─── Register Blueprints ─────────────────────────────────────
-from auth import auth_bp
-from views import views_bp
-from api import api_bp
+    # ─── Email Configuration ───────────────────────────────────
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.example.com')  # use env variable or default
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))  # default 587
+    app.config['MAIL_USE_TLS'] = True  # TLS support
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'your_email@example.com')
 
-app.register_blueprint(auth_bp)
-app.register_blueprint(views_bp)
-app.register_blueprint(api_bp, url_prefix='/api')
+    # Queued mail (reset codes, notification digests) is sent by a background
+    # dispatcher. Off by default: reset codes are printed to the console instead.
+    app.config['EMAIL_DELIVERY_ENABLED'] = os.getenv('EMAIL_DELIVERY_ENABLED', '0') == '1'
+    app.config['EMAIL_BATCH_SIZE'] = int(os.getenv('EMAIL_BATCH_SIZE', 100))  # messages claimed per transaction
+    app.config['EMAIL_DOMAIN_RATE_PER_MINUTE'] = int(os.getenv('EMAIL_DOMAIN_RATE_PER_MINUTE', 60))
+    app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+    app.config['EMAIL_DIGEST_INTERVAL'] = int(os.getenv('EMAIL_DIGEST_INTERVAL', 24 * 60 * 60))  # 0 disables digests
+
+    # ─── Password Hashing ──────────────────────────────────────
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')  # werkzeug method string
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # 0 hashes inline
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))  # beyond this, 503
+
+    # ─── Reverse Proxy ─────────────────────────────────────────
+    # How many proxies in front of the app set X-Forwarded-For/-Proto. Without
+    # this every client behind a proxy has the proxy's address, and so shares
+    # one per-IP rate limit. Leave at 0 when clients connect directly, or they
+    # could pick their own address.
+    app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+
+    # ─── Rate Limiting ─────────────────────────────────────────
+    # Per-worker token buckets by default; 'sqlite' also shares them across workers.
+    # 'ip' limits key on the client address (see TRUSTED_PROXY_HOPS).
+    app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+    app.config['RATE_LIMIT_STORE'] = os.getenv('RATE_LIMIT_STORE', 'memory')  # 'memory' or 'sqlite'
+    app.config['RATE_LIMIT_MAX_KEYS'] = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))  # buckets kept per worker
+
+    # ─── Server-Side Sessions ──────────────────────────────────
+    # The cookie holds only a signed session id; the data lives in SQLite.
+    app.config['SERVER_SESSIONS_ENABLED'] = os.getenv('SERVER_SESSIONS_ENABLED', '1') == '1'
+    app.config['SESSION_CACHE_SIZE'] = int(os.getenv('SESSION_CACHE_SIZE', 10000))  # 0 disables the LRU
+    app.config['SESSION_CACHE_TTL'] = float(os.getenv('SESSION_CACHE_TTL', 5))  # staleness across workers
+    app.config['SESSION_SWEEP_INTERVAL'] = int(os.getenv('SESSION_SWEEP_INTERVAL', 300))  # expired-row sweeps
+
+    # ─── Instrumentation (opt-in) ──────────────────────────────
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '0') == '1'  # SQL timing + /metrics
+    # Scrapers send it as `Authorization: Bearer <token>`; unset, /metrics is 404.
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+    app.config['PROFILE_SLOW_REQUESTS_MS'] = int(os.getenv('PROFILE_SLOW_REQUESTS_MS', 0))  # 0 disables profiling
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(PROJECT_ROOT, 'profiles'))
+
+    # ─── Write-Behind Goal Autosave (opt-in) ───────────────────
+    # Single-process only: pending saves and their log are local to this process.
+    app.config['WRITE_BEHIND_ENABLED'] = os.getenv('WRITE_BEHIND_ENABLED', '0') == '1'
+    app.config['WRITE_BEHIND_LOG'] = os.getenv('WRITE_BEHIND_LOG', os.path.join(PROJECT_ROOT, 'Backend', 'goal-writes.log'))
+    app.config['WRITE_BEHIND_WINDOW_MS'] = int(os.getenv('WRITE_BEHIND_WINDOW_MS', 250))  # coalescing window
+    app.config['WRITE_BEHIND_FSYNC'] = os.getenv('WRITE_BEHIND_FSYNC', '0') == '1'  # fsync every logged save
+
+    # ─── Reminder Scheduler ────────────────────────────────────
+    # Every process with this enabled runs one scheduler thread; they take the
+    # SQLite write lock to claim reminders, so several workers never double-fire.
+    app.config['REMINDERS_ENABLED'] = os.getenv('REMINDERS_ENABLED', '1') == '1'
+    app.config['REMINDER_BATCH_SIZE'] = int(os.getenv('REMINDER_BATCH_SIZE', 500))  # reminders per transaction
+    app.config['REMINDER_JITTER_SECONDS'] = int(os.getenv('REMINDER_JITTER_SECONDS', 300))  # spread per fire
+
+    # ─── Database Maintenance ──────────────────────────────────
+    # Purges expired reset tokens and old token rows, runs PRAGMA optimize and
+    # returns free pages to the filesystem (see `flask db-maintenance`).
+    app.config['MAINTENANCE_ENABLED'] = os.getenv('MAINTENANCE_ENABLED', '1') == '1'
+    app.config['MAINTENANCE_INTERVAL'] = int(os.getenv('MAINTENANCE_INTERVAL', 3600))  # seconds between passes
+    app.config['MAINTENANCE_VACUUM_PAGES'] = int(os.getenv('MAINTENANCE_VACUUM_PAGES', 1000))  # pages per pass
+
+    # ─── Live Updates (opt-in) ─────────────────────────────────
+    # /api/stream pushes each user's goal and notification changes to their open
+    # tabs over Server-Sent Events. Events stay within this process: enable it
+    # when serving with `python asgi.py`, where idle streams wait on the event
+    # loop; under a threaded WSGI server every open tab holds a thread.
+    app.config['EVENTS_ENABLED'] = os.getenv('EVENTS_ENABLED', '0') == '1'
+    app.config['EVENT_QUEUE_SIZE'] = int(os.getenv('EVENT_QUEUE_SIZE', 32))  # unsent events before a stream is dropped
+    app.config['EVENT_KEEPALIVE'] = float(os.getenv('EVENT_KEEPALIVE', 15))  # seconds between keep-alive comments
+    app.config['EVENT_STREAM_MAX_AGE'] = int(os.getenv('EVENT_STREAM_MAX_AGE', 3600))  # then the browser reconnects
+    app.config['EVENT_STREAMS_PER_USER'] = int(os.getenv('EVENT_STREAMS_PER_USER', 8))  # oldest closed beyond this
+
+    # ─── Response Compression ──────────────────────────────────
+    # API JSON bodies of at least COMPRESSION_MIN_SIZE bytes are sent brotli-
+    # (with the optional `brotli` package) or gzip-encoded. HTML is not: pages
+    # with a CSRF token and reflected input would be open to BREACH.
+    app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # bytes
+    app.config['COMPRESSION_LEVEL'] = int(os.getenv('COMPRESSION_LEVEL', 6))  # gzip level, 1-9
+
+    # ─── Fingerprinted Static Assets ───────────────────────────
+    # `flask build-assets` writes content-hashed, precompressed copies of
+    # WebApp/static into its build/ directory. When that manifest exists,
+    # url_for('static') points at them and they are served as immutable, so
+    # browsers stop revalidating; a front server can serve build/ directly.
+    app.config['STATIC_ASSETS_ENABLED'] = os.getenv('STATIC_ASSETS_ENABLED', '0' if IS_DEVELOPMENT else '1') == '1'
+    app.config['STATIC_BUILD_DIR'] = os.getenv('STATIC_BUILD_DIR', 'build')  # relative to the static folder
+
+
+def create_app(config=None):
+    """
+    Build the app from the environment, with `config` applied on top.
+
+    Only the enabled features are imported, and nothing here opens a
+    database connection or starts a thread: each database file gets its
+    schema checked the first time a process connects to it, and background
+    threads (reminders, maintenance, mail, write-behind) start on a
+    process's first request. So the result can be built once and forked,
+    as `gunicorn --preload` does (see gunicorn.conf.py).
+    """
+    app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
+    load_config(app)
+    app.config.update(config or {})
+
+    if not app.config['SECRET_KEY']:
+        from session_store import load_secret_key
+        app.secret_key = load_secret_key(app.config['SECRET_KEY_FILE'])
+
+    # ─── Password Hashing ──────────────────────────────────────
+    import password_hashing
+    password_hashing.init_app(app)
+
+    # ─── Database Connections ──────────────────────────────────
+    import dataservice
+    dataservice.init_app(app)
+
+    # ─── Reverse Proxy ─────────────────────────────────────────
+    if app.config['TRUSTED_PROXY_HOPS']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    # ─── Optional Features ─────────────────────────────────────
+    if app.config['RATE_LIMIT_ENABLED']:
+        import rate_limit
+        rate_limit.init_app(app)
+
+    if app.config['SERVER_SESSIONS_ENABLED']:
+        import session_store
+        session_store.init_app(app)
+
+    if app.config['METRICS_ENABLED']:
+        import instrumentation
+        instrumentation.init_app(app)
+
+    if app.config['WRITE_BEHIND_ENABLED']:
+        import write_behind
+        write_behind.init_app(app)
+
+    if app.config['EMAIL_DELIVERY_ENABLED']:
+        from flask_mail import Mail
+        import email_outbox
+        email_outbox.init_app(app, Mail(app))
+
+    if app.config['REMINDERS_ENABLED']:
+        import reminders
+        reminders.init_app(app)
+
+    if app.config['MAINTENANCE_ENABLED']:
+        import maintenance
+        maintenance.init_app(app)
+
+    if app.config['EVENTS_ENABLED']:
+        import events
+        events.init_app(app)
+
+    if app.config['COMPRESSION_ENABLED']:
+        import serialization
+        serialization.init_app(app)
+
+    import static_assets
+    static_assets.init_app(app)  # `flask build-assets` is registered even when disabled
+
+    # ─── Register Blueprints ─────────────────────────────────────
+    from auth import auth_bp
+    from views import views_bp
+    from api import api_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(views_bp)
+    app.register_blueprint(api_bp, url_prefix='/api')
+    return app
+
+
+# ─── ASGI Entry Point ──────────────────────────────────────
+# `python asgi.py` (or `uvicorn app:asgi_app`) serves the app from an event
+# loop; requests run on a dedicated executor sized like the DB pool.
+def create_asgi_app(app=None):
+    from asgi import WsgiToAsgi
+    import dataservice
+    return WsgiToAsgi(app or create_app(), workers=int(os.getenv('ASGI_WORKERS', dataservice.DB_POOL_SIZE)))
+
+
+# ─── Default App ───────────────────────────────────────────
+# `app` and `asgi_app` are built from the environment on first access, so
+# `from app import app`, `flask run` and `uvicorn app:asgi_app` keep working
+# while importing this module stays cheap.
+_default_lock = threading.RLock()
+
+
+def __getattr__(name):
+    if name not in ('app', 'asgi_app'):
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    with _default_lock:
+        if name not in globals():
+            globals()[name] = create_app() if name == 'app' else create_asgi_app(__getattr__('app'))
+    return globals()[name]
 
-# ─── Set Debug Mode Based on Environment ────────────────────
-if os.environ.get('FLASK_ENV') == 'development':
-    app.config['DEBUG'] = True
-else:
-    app.config['DEBUG'] = False
 
 # ─── Run the App ───────────────────────────────────────────
 if __name__ == '__main__':
+    app = create_app()
     app.run(debug=app.config['DEBUG'])
@@ -0,0 +1,349 @@
+"""
+Serve the app from an asyncio event loop.
+
+Connections, keep-alive and request bodies are handled on the loop, so idle
+connections from open tabs cost a coroutine each rather than a thread. Each
+request then runs through the unchanged Flask app (same blueprints, hooks
+and session cookie) on a dedicated executor sized like the DB pool. That way
+only requests doing work hold a thread and a database connection.
+Response bodies that support `async for` (the /api/stream event streams)
+are sent from the loop once the view returns, so an open stream does not
+keep its thread either.
+
+    python asgi.py [--host 127.0.0.1] [--port 8000]   # runs uvicorn
+    uvicorn app:asgi_app                              # or any ASGI server
+
+HttpServer below is a small HTTP/1.1 server kept for development and the
+benchmarks; `python asgi.py --builtin` (or a missing uvicorn) falls back to
+it. It is not hardened for the open internet: run uvicorn in production.
+"""
+import argparse
+import asyncio
+import http
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Request bodies above this size are spooled to disk instead of memory.
+SPOOL_MAX_MEMORY = 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+
+# --- ASGI Adapter ---
+class WsgiToAsgi:
+    """Run a WSGI app as an ASGI 3 app on a bounded thread pool."""
+
+    def __init__(self, wsgi_app, workers=5):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi-worker')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    self.executor.shutdown(wait=False)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope type {scope["type"]!r}')
+
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        length = body.tell()
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        environ = build_environ(scope, body, length)
+        try:
+            stream = await loop.run_in_executor(self.executor, self._run, environ, send_from_thread)
+        finally:
+            body.close()
+        if stream is not None:
+            await self._stream(receive, send, *stream)
+
+    def _run(self, environ, send):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return lambda data: None  # the legacy write() callable; Flask never uses it
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                send({'type': 'http.response.start', 'status': response['status'],
+                      'headers': response['headers']})
+
+        iterable = self.wsgi_app(environ, start_response)
+        if hasattr(iterable, '__aiter__'):
+            return response, iterable  # see _stream
+        try:
+            for chunk in iterable:
+                if chunk:
+                    start()
+                    send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            start()
+            send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+    async def _stream(self, receive, send, response, iterable):
+        """Send an async response body from the loop until it ends or the client leaves."""
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            iterable.close()  # ends the iteration below
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            async for chunk in iterable:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            watcher.cancel()
+            iterable.close()
+
+
+def build_environ(scope, body, length):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    path = scope.get('raw_path') or scope['path'].encode('utf-8')
+    path = path.split(b'?', 1)[0]
+    root_path = scope.get('root_path', '').encode('utf-8')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.decode('latin-1'),
+        'PATH_INFO': path[len(root_path):].decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name in ('content-length', 'transfer-encoding'):
+            continue  # the body has already been read and de-chunked; its real length is set above
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+# --- Built-in HTTP/1.1 Server ---
+class BadRequest(Exception):
+    pass
+
+
+class HttpServer:
+    """
+    A small keep-alive HTTP/1.1 server for ASGI apps, for development when no
+    ASGI server is installed. Idle connections are closed after
+    `keep_alive_timeout` seconds.
+    """
+
+    def __init__(self, app, keep_alive_timeout=300, max_header_bytes=16 * 1024):
+        self.app = app
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_header_bytes = max_header_bytes
+        self.connections = 0
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.server = await asyncio.start_server(self._connection, host, port, limit=self.max_header_bytes,
+                                                 backlog=4096)
+        return self.server
+
+    async def _connection(self, reader, writer):
+        self.connections += 1
+        server = writer.get_extra_info('sockname')[:2]
+        client = writer.get_extra_info('peername')[:2]
+        try:
+            while await self._request(reader, writer, server, client):
+                pass
+        except (BadRequest, ValueError, asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+            writer.write(b'HTTP/1.1 400 Bad Request\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _request(self, reader, writer, server, client):
+        line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+        if not line:
+            return False
+        try:
+            method, target, version = line.decode('latin-1').rstrip('\r\n').split(' ')
+        except ValueError:
+            raise BadRequest from None
+        headers, size = [], 0
+        while True:
+            header = await reader.readline()
+            size += len(header)
+            if size > self.max_header_bytes:
+                raise BadRequest
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+        header_map = {name: value for name, value in headers}
+
+        connection = header_map.get(b'connection', b'').lower()
+        keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+        path, _, query = target.partition('?')
+
+        # A body framed two ways (or a framing we don't parse) could be read
+        # differently by a proxy in front of us; refuse it (RFC 9112 6.3).
+        lengths = {value for name, value in headers if name == b'content-length'}
+        encodings = [value for name, value in headers if name == b'transfer-encoding']
+        if (lengths and encodings) or len(lengths) > 1 or len(encodings) > 1:
+            raise BadRequest
+        if encodings and encodings[0].lower() != b'chunked':
+            raise BadRequest
+        length = lengths.pop() if lengths else b'0'
+        if not length.isdigit():
+            raise BadRequest
+        chunked = bool(encodings)
+        remaining = int(length)
+        request = {'done': False, 'continue': header_map.get(b'expect', b'').lower() == b'100-continue'}
+
+        async def receive():
+            nonlocal remaining, keep_alive
+            if request['done']:
+                # Only a streaming response waits here: block until the peer
+                # closes. Anything it sends meanwhile can't start a new request.
+                while await reader.read(READ_CHUNK):
+                    keep_alive = False
+                return {'type': 'http.disconnect'}
+            if request.pop('continue', False):
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            if chunked:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                data = await reader.readexactly(size) if size else b''
+                await reader.readline()  # CRLF after the chunk, or after the last (empty) one
+                more = bool(size)
+            else:
+                data = await reader.readexactly(min(remaining, READ_CHUNK)) if remaining else b''
+                remaining -= len(data)
+                more = remaining > 0
+            request['done'] = not more
+            return {'type': 'http.request', 'body': data, 'more_body': more}
+
+        response = {'chunked': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = list(message.get('headers', ()))
+            elif message['type'] == 'http.response.body':
+                body, more = message.get('body', b''), message.get('more_body', False)
+                if 'sent_headers' not in response:
+                    names = {name for name, _value in response['headers']}
+                    if not more and b'content-length' not in names:
+                        response['headers'].append((b'content-length', str(len(body)).encode()))
+                    elif more and b'content-length' not in names:
+                        response['chunked'] = True
+                        response['headers'].append((b'transfer-encoding', b'chunked'))
+                    if not keep_alive:
+                        response['headers'].append((b'connection', b'close'))
+                    status = response['status']
+                    head = [f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n'.encode('latin-1')]
+                    head += [name + b': ' + value + b'\r\n' for name, value in response['headers']]
+                    writer.write(b''.join(head) + b'\r\n')
+                    response['sent_headers'] = True
+                if response['chunked']:
+                    if body:
+                        writer.write(f'{len(body):x}\r\n'.encode() + body + b'\r\n')
+                    if not more:
+                        writer.write(b'0\r\n\r\n')
+                elif method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version.partition('/')[2],
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+            'server': server, 'client': client,
+        }
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            if 'sent_headers' in response:
+                raise  # mid-response: all we can do is drop the connection
+            sys.stderr.write(f'Unhandled error serving {method} {path}\n')
+            writer.write(b'HTTP/1.1 500 Internal Server Error\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+            return False
+        # Skip any body the app didn't read so the next request parses cleanly.
+        while not request['done']:
+            await receive()
+        return keep_alive
+
+
+def serve(app, host='127.0.0.1', port=8000, keep_alive_timeout=300):
+    async def run():
+        server = await HttpServer(app, keep_alive_timeout).start(host, port)
+        print(f'Serving on http://{host}:{port}')
+        async with server:
+            await server.serve_forever()
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the app from an asyncio event loop.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--keep-alive', type=int, default=300, help='idle connection timeout in seconds')
+    parser.add_argument('--builtin', action='store_true', help='use the built-in development server')
+    args = parser.parse_args()
+
+    from app import asgi_app
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if args.builtin or uvicorn is None:
+        if not args.builtin:
+            print('uvicorn is not installed; using the built-in development server', file=sys.stderr)
+        serve(asgi_app, args.host, args.port, args.keep_alive)
+    else:
+        uvicorn.run(asgi_app, host=args.host, port=args.port, timeout_keep_alive=args.keep_alive)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, EqualTo, Email
-from datetime import datetime, timedelta, timezone
 import random
 import string
+import time
 
 
 from dataservice import (
-    create_user, find_user_by_username, find_user_by_email,
+    create_user, find_user_by_username, find_user_by_identifier,
     update_user_password, find_user_by_id, update_user_reset_token,
-    soft_delete_user, get_user_reset_token, clear_reset_token
+    soft_delete_user, get_user_reset_token, clear_reset_token, set_user_password_hash
 )
+from password_hashing import hash_password, verify_password, needs_rehash
 
 # === Setup ===
 
@@ -74,16 +74,14 @@ def is_token_valid(user_id, token_value):
         return False
     if token_data.get('token') != token_value:
         return False
-    expires = datetime.strptime(token_data.get('expires_at'), '%Y-%m-%d %H:%M:%S')
-    return datetime.now() <= expires
+    return time.time() <= token_data['expires_at']
 
 
 def can_reset_password(user_id):
     token_data = get_user_reset_token(user_id)
     if not token_data:
         return True
-    last_reset = datetime.strptime(token_data.get('created_at'), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
-    return datetime.now(timezone.utc) - last_reset >= timedelta(hours=24)
+    return time.time() - token_data['created_at'] >= 24 * 60 * 60
 
 # === Routes ===
 @auth_bp.route('/login', methods=['GET', 'POST'])
@@ -94,9 +92,11 @@ def login():
     if login_form.validate_on_submit():
         identifier = login_form.identifier.data.strip().lower()
         password = login_form.password.data
-        user = find_user_by_username(identifier) or find_user_by_email(identifier)
+        user = find_user_by_identifier(identifier)
 
-        if user and check_password_hash(user['password'], password):
+        if user and verify_password(user['password'], password):
+            if needs_rehash(user['password']):
+                set_user_password_hash(user['id'], hash_password(password))
             session['user_id'] = user['id']
             flash('Login successful.', 'success')
             return redirect(url_for('views.habit_tracker'))
@@ -115,14 +115,20 @@ def signup():
         email = signup_form.email.data.strip().lower()
         password = signup_form.password.data
 
-        if find_user_by_username(username):
+        existing = find_user_by_identifier(username, email)
+        if existing and existing['username'] == username:
             flash('Username already exists.', 'error')
-        elif find_user_by_email(email):
+        elif existing:
             flash('Email already in use.', 'error')
         else:
-            create_user(username, password, email)
-            flash('Account created successfully. You can now log in.', 'success')
-            return redirect(url_for('auth.login'))
+            try:
+                create_user(username, password, email)
+            except ValueError:
+                # A deactivated account still holds this username or email.
+                flash('Username or email already in use.', 'error')
+            else:
+                flash('Account created successfully. You can now log in.', 'success')
+                return redirect(url_for('auth.login'))
 
     return render_template('auth.html', signup_form=signup_form, login_form=login_form, form_type='signup')
 
@@ -145,8 +151,8 @@ def change_password():
 
     if form.validate_on_submit():
         user = find_user_by_id(user_id)
-        if user and check_password_hash(user['password'], form.old_password.data):
-            update_user_password(user_id, generate_password_hash(form.new_password.data))
+        if user and verify_password(user['password'], form.old_password.data):
+            update_user_password(user_id, form.new_password.data)
             flash('Password changed successfully.', 'success')
             return redirect(url_for('auth.login'))
         flash('Old password is incorrect.', 'error')
@@ -179,8 +185,8 @@ def profile():
 
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        if check_password_hash(user['password'], form.old_password.data):
-            update_user_password(user_id, generate_password_hash(form.new_password.data))
+        if verify_password(user['password'], form.old_password.data):
+            update_user_password(user_id, form.new_password.data)
             flash('Password updated successfully.', 'success')
         else:
             flash('Incorrect old password.', 'error')
@@ -208,9 +214,17 @@ def recover():
             # Generate token and expiry by calling the function
             
             token, expires_at = update_user_reset_token(user['id'], expiry_duration_minutes=10)
-            
-            # Simulate sending email by printing to console
-            print(f"[Password Reset] Verification code for {email}: {token}")
+
+            if current_app.config.get('EMAIL_DELIVERY_ENABLED'):
+                import email_outbox  # loaded (with flask_mail) only when mail is enabled
+                # Queued for the background dispatcher; dropped if still unsent when the code expires.
+                email_outbox.enqueue(
+                    email, 'Your password reset code',
+                    f'Your verification code is: {token}\n\nIt expires in 10 minutes.',
+                    kind='password_reset', user_id=user['id'], expires_at=int(time.time()) + 10 * 60)
+            else:
+                # No mail server configured: print the code to the console instead
+                print(f"[Password Reset] Verification code for {email}: {token}")
 
 
             # Store session variables for verification
@@ -218,7 +232,10 @@ def recover():
             session['reset_username'] = username
             session['reset_email'] = email
 
-            flash(f'Verification code sent to {email} (check console output in this demo).', 'info')
+            if current_app.config.get('EMAIL_DELIVERY_ENABLED'):
+                flash(f'Verification code sent to {email}.', 'info')
+            else:
+                flash(f'Verification code sent to {email} (check console output in this demo).', 'info')
             return redirect(url_for('auth.recover', step='2'))
 
         return render_template('recover.html', form=form, recovery_step='1')
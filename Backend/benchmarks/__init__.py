@@ -0,0 +1,3 @@
+# Benchmarks for the Flask backend; everything runs offline against scratch databases.
+# Run from the Backend directory: `python -m benchmarks` for the load-test suite,
+# or a single micro-benchmark such as `python -m benchmarks.goal_save`.
@@ -0,0 +1,5 @@
+import sys
+
+from benchmarks.load import main
+
+sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Compare the threaded WSGI server with the asyncio (ASGI) serving mode.
+
+Both servers run the same app against the same seeded database. First the
+JSON API is driven over concurrent keep-alive connections; then each server
+is given many idle keep-alive connections (like open browser tabs) and the
+thread count and memory they cost are reported, along with whether a fresh
+request still gets through.
+
+    python -m benchmarks.asgi [--requests N] [--concurrency N] [--idle N]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+from benchmarks.load import QuietRequestHandler, login_form, summarize
+from benchmarks.seed import scratch_database, seed
+
+ENDPOINTS = (
+    ('GET /api/goals', '/api/goals?category=daily'),
+    ('GET /api/goals/all', '/api/goals/all'),
+)
+
+
+class KeepAliveHandler(QuietRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+
+def rss_anon_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1])
+    return 0
+
+
+class KeepAliveClient:
+    """One persistent connection carrying a logged-in session cookie."""
+
+    def __init__(self, port, cookie_name, user_index):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.conn.request('POST', '/login', body=urlencode(login_form(user_index)),
+                          headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie', '')
+        self.cookie = cookie.split(';', 1)[0] if cookie.startswith(cookie_name + '=') else ''
+
+    def get(self, path):
+        self.conn.request('GET', path, headers={'Cookie': self.cookie})
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+
+def drive(clients, path, requests):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    per_client = max(1, requests // len(clients))
+
+    def worker(client):
+        local, failed = [], 0
+        for _ in range(per_client):
+            start = time.perf_counter()
+            status = client.get(path)
+            local.append(time.perf_counter() - start)
+            failed += status != 200
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def idle_cost(port, cookie_name, idle):
+    """Hold `idle` connections open, then check a new client is still served."""
+    threads, rss = threading.active_count(), rss_anon_kb()
+    sockets = []
+    for _ in range(idle):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sockets.append(sock)
+    time.sleep(1)  # let the server accept them all
+    result = {
+        'idle_connections': idle,
+        'extra_threads': threading.active_count() - threads,
+        'extra_rss_kb': rss_anon_kb() - rss,
+    }
+    try:
+        start = time.perf_counter()
+        status = KeepAliveClient(port, cookie_name, 0).get('/api/goals/all')
+        result['fresh_request'] = {'status': status, 'ms': round((time.perf_counter() - start) * 1000, 3)}
+    except OSError as e:
+        result['fresh_request'] = {'error': repr(e)}
+    for sock in sockets:
+        sock.close()
+    return result
+
+
+def run_server(name, app, asgi_app):
+    """Start the named server in the background; returns (port, stop)."""
+    if name == 'wsgi':
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.server_port, server.shutdown
+
+    from asgi import HttpServer
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(HttpServer(asgi_app).start('127.0.0.1', 0), loop).result()
+
+    async def shutdown():
+        server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    return server.sockets[0].getsockname()[1], stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--goals', type=int, default=40, help='goals per user')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--idle', type=int, default=2000, help='idle keep-alive connections to hold open')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limiter
+    import password_hashing
+    from app import app, asgi_app
+
+    app.config.update(WTF_CSRF_ENABLED=False, SESSION_COOKIE_SECURE=False)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_database(tmp)
+        password_hashing.configure(method='pbkdf2:sha256:1000')
+        seed(app, users=args.users, goals=args.goals, notifications=0)
+
+        for name in ('wsgi', 'asgi'):
+            port, stop = run_server(name, app, asgi_app)
+            try:
+                clients = [KeepAliveClient(port, cookie_name, i % args.users) for i in range(args.concurrency)]
+                results = {}
+                for endpoint, path in ENDPOINTS:
+                    drive(clients, path, args.requests // 10)  # warm-up
+                    results[endpoint] = drive(clients, path, args.requests)
+                for client in clients:
+                    client.conn.close()
+                results['idle'] = idle_cost(port, cookie_name, args.idle)
+                report[name] = results
+            finally:
+                stop()
+            time.sleep(0.5)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
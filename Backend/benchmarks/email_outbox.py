@@ -0,0 +1,142 @@
+"""
+Deliver queued mail to a local stand-in SMTP server and compare one SMTP
+connection per message (what sending inline from each request costs) with
+the outbox dispatcher, which reuses one connection per batch.
+
+    python -m benchmarks.email_outbox [--messages N] [--domains N] [--temp-fail-every N]
+
+The stand-in is a minimal SMTP sink in this file, so no extra packages are needed.
+"""
+import argparse
+import os
+import socketserver
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from flask_mail import Mail, Message
+
+import dataservice
+from email_outbox import EmailDispatcher
+
+
+# --- Stand-in SMTP Server ---
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib; counts accepted messages."""
+
+    def reply(self, text):
+        self.wfile.write(text.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 sink ESMTP')
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line.rstrip(b'\r\n') == b'.':
+                    in_data = False
+                    with server.lock:
+                        server.delivered += 1
+                    self.reply('250 OK queued')
+                continue
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.wfile.write(b'250-sink\r\n250 8BITMIME\r\n')
+            elif command == b'RCPT':
+                with server.lock:
+                    server.recipients += 1
+                    refuse = server.temp_fail_every and server.recipients % server.temp_fail_every == 0
+                self.reply('451 Try again later' if refuse else '250 OK')
+            elif command == b'DATA':
+                in_data = True
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command in (b'HELO', b'MAIL', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, temp_fail_every=0):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.lock = threading.Lock()
+        self.temp_fail_every = temp_fail_every
+        self.connections = self.delivered = self.recipients = 0
+
+
+def make_app(port):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                      MAIL_DEFAULT_SENDER='bench@example.com')
+    return app, Mail(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--domains', type=int, default=20)
+    parser.add_argument('--temp-fail-every', type=int, default=0,
+                        help='answer every Nth RCPT with a 451 to exercise retries')
+    args = parser.parse_args()
+
+    server = SinkServer(args.temp_fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app, mail = make_app(server.server_address[1])
+    recipients = [f'user{n}@domain{n % args.domains}.example' for n in range(args.messages)]
+
+    # One connection per message.
+    with app.app_context():
+        start = time.perf_counter()
+        for recipient in recipients:
+            try:
+                mail.send(Message('Inline', recipients=[recipient], body='Sent inline.'))
+            except Exception:
+                pass
+        inline = time.perf_counter() - start
+    inline_connections, server.connections, server.delivered = server.connections, 0, 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        dataservice.init_app(app)
+        clock = [1_700_000_000]
+        dispatcher = EmailDispatcher(app, mail, clock=lambda: clock[0], domain_rate=args.messages,
+                                     backoff_base=1, digest_interval=0)
+        with app.app_context():
+            dataservice.init_db()
+            for recipient in recipients:
+                dataservice.enqueue_email(recipient, 'Queued', 'Sent from the outbox.', now=clock[0])
+
+        start = time.perf_counter()
+        passes = 0
+        while server.delivered < args.messages and passes < 50:
+            dispatcher.run_pending()
+            passes += 1
+            clock[0] += 60  # let retries come due
+        outbox = time.perf_counter() - start
+        with app.app_context():
+            statuses = dict(dataservice.get_db_connection().execute(
+                'SELECT status, COUNT(*) FROM email_outbox GROUP BY status').fetchall())
+
+    server.shutdown()
+    print(f'{args.messages} messages to {args.domains} domains')
+    print(f'  inline, connection per message: {inline:6.2f}s  {args.messages / inline:8.0f} msg/s  '
+          f'{inline_connections} connections')
+    print(f'  outbox dispatcher:              {outbox:6.2f}s  {server.delivered / outbox:8.0f} msg/s  '
+          f'{server.connections} connections over {passes} passes')
+    print(f'  outbox status: {statuses}')
+
+
+if __name__ == '__main__':
+    main()
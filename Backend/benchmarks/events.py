@@ -0,0 +1,133 @@
+"""
+What open /api/stream tabs cost each serving mode, and how fast a change
+reaches them.
+
+`--streams` event streams are opened against the threaded WSGI server and
+then the asyncio (ASGI) one, spread over the seeded users. Reported per
+mode: the threads and memory the idle streams hold, how long a fresh API
+request takes meanwhile, and the time from a goal save returning to every
+one of that user's tabs having received the `goals` event.
+
+    python -m benchmarks.events [--streams N] [--users N] [--saves N]
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.asgi import KeepAliveClient, rss_anon_kb, run_server
+from benchmarks.seed import scratch_database, seed
+
+
+def open_stream(port, cookie):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(f'GET /api/stream HTTP/1.1\r\nHost: bench\r\nCookie: {cookie}\r\n\r\n'.encode())
+    return sock
+
+
+def read_until(sockets, marker, timeout=30):
+    """Wait until every socket has received `marker`; returns the seconds taken."""
+    start = time.perf_counter()
+    buffers = {sock: b'' for sock in sockets}
+    waiting = len(sockets)
+    with selectors.DefaultSelector() as selector:
+        for sock in sockets:
+            selector.register(sock, selectors.EVENT_READ)
+        while waiting:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f'{waiting} streams never saw {marker!r}')
+            for key, _ in selector.select(1):
+                sock = key.fileobj
+                buffers[sock] += sock.recv(65536)
+                if marker in buffers[sock]:
+                    selector.unregister(sock)
+                    waiting -= 1
+    return time.perf_counter() - start
+
+
+def wait_for(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError('condition not reached')
+        time.sleep(0.05)
+
+
+def measure(name, app, asgi_app, broker, cookie_name, args):
+    port, stop = run_server(name, app, asgi_app)
+    try:
+        clients = [KeepAliveClient(port, cookie_name, i) for i in range(args.users)]
+        threads, rss = threading.active_count(), rss_anon_kb()
+        streams = [open_stream(port, clients[i % args.users].cookie) for i in range(args.streams)]
+        wait_for(lambda: broker.stats()['streams'] == args.streams)
+        read_until(streams, b'retry:')
+        result = {
+            'streams': args.streams,
+            'extra_threads': threading.active_count() - threads,
+            'rss_kb_per_stream': round((rss_anon_kb() - rss) / args.streams, 1),
+        }
+
+        start = time.perf_counter()
+        status = clients[1].get('/api/goals/all')
+        result['fresh_request'] = {'status': status, 'ms': round((time.perf_counter() - start) * 1000, 3)}
+
+        # Every save reaches all of user 0's tabs (streams 0, users, 2 * users, ...).
+        tabs = streams[::args.users]
+        latencies = []
+        for index in range(args.saves):
+            body = json.dumps({'goals': [{'text': f'Live goal {index}'}]})
+            clients[0].conn.request('POST', '/api/goals?category=daily', body=body,
+                                    headers={'Cookie': clients[0].cookie, 'Content-Type': 'application/json'})
+            response = clients[0].conn.getresponse()
+            response.read()
+            latencies.append(read_until(tabs, f'Live goal {index}"'.encode()))
+        result['fanout'] = {'tabs': len(tabs), 'median_ms': round(statistics.median(latencies) * 1000, 3),
+                            'max_ms': round(max(latencies) * 1000, 3)}
+
+        for sock in streams:
+            sock.close()
+        for client in clients:
+            client.conn.close()
+        # The loop notices closed streams at once; a blocked WSGI thread on its next keep-alive.
+        wait_for(lambda: broker.stats()['streams'] == 0, timeout=broker.keepalive * 4 + 10)
+        return result
+    finally:
+        stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=1000, help='open event streams (tabs)')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--saves', type=int, default=20, help='goal saves timed end to end')
+    args = parser.parse_args(argv)
+
+    os.environ['EVENTS_ENABLED'] = '1'
+    os.environ['EVENT_KEEPALIVE'] = '1'
+    os.environ['EVENT_STREAMS_PER_USER'] = str(args.streams)
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    import password_hashing
+    from app import app, asgi_app
+
+    app.config.update(WTF_CSRF_ENABLED=False, SESSION_COOKIE_SECURE=False)
+    broker = app.extensions['events']
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_database(tmp)
+        password_hashing.configure(method='pbkdf2:sha256:1000')
+        seed(app, users=args.users, goals=8, notifications=0)
+        for name in ('wsgi', 'asgi'):
+            report[name] = measure(name, app, asgi_app, broker, app.config['SESSION_COOKIE_NAME'], args)
+            time.sleep(0.5)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
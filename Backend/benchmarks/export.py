@@ -0,0 +1,99 @@
+"""
+Stream a large notification export and re-import it, tracking the process
+RSS to show that memory stays flat as the row count grows.
+
+    python -m benchmarks.export [--rows N] [--format ndjson|csv]
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import dataservice
+from benchmarks.seed import scratch_database
+
+
+def rss_mb():
+    # Anonymous RSS on Linux, which leaves out the pages SQLite maps from the
+    # database file (mmap_size); elsewhere fall back to the peak RSS.
+    try:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_notifications(app, user_id, rows):
+    with app.app_context():
+        conn = dataservice.get_db_connection()
+        conn.executemany(
+            'INSERT INTO notifications (user_id, message, time, message_hash) VALUES (?, ?, ?, ?)',
+            ((user_id, f'Notification {n}', '2024-01-01 00:00:00',
+              dataservice.notification_message_hash(f'Notification {n}')) for n in range(rows)))
+        conn.commit()
+
+
+def login_as(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', default='ndjson', choices=('ndjson', 'csv'))
+    args = parser.parse_args()
+
+    from app import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_database(tmp)
+        with app.app_context():
+            dataservice.init_db()
+            for name in ('exporter', 'importer'):
+                dataservice.create_user(name, 'bench-password', f'{name}@example.com')
+        seed_notifications(app, 1, args.rows)
+
+        client = app.test_client()
+        export_path = os.path.join(tmp, f'export.{args.format}')
+        login_as(client, 1)
+        baseline = peak = rss_mb()
+        start = time.perf_counter()
+        response = client.get(f'/api/export/notifications?format={args.format}', buffered=False)
+        with open(export_path, 'wb') as handle:
+            for chunk in response.response:
+                handle.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+                peak = max(peak, rss_mb())
+        response.close()
+        export_seconds = time.perf_counter() - start
+        export_peak, peak = peak, rss_mb()
+
+        login_as(client, 2)
+        start = time.perf_counter()
+        with open(export_path, 'rb') as upload:
+            # input_stream, unlike data=, is not read into memory by the test client.
+            response = client.post(f'/api/import/notifications?format={args.format}', input_stream=upload,
+                                   content_length=os.path.getsize(export_path), buffered=False)
+            last = b''
+            for line in response.response:
+                last = line
+                peak = max(peak, rss_mb())
+            response.close()
+        import_seconds = time.perf_counter() - start
+
+        size_mb = os.path.getsize(export_path) / 2**20
+
+    print(f'{args.rows} notifications as {args.format} ({size_mb:.1f} MB)')
+    print(f'  export: {export_seconds:6.2f}s  {args.rows / export_seconds:10.0f} rows/s')
+    print(f'  import: {import_seconds:6.2f}s  {args.rows / import_seconds:10.0f} rows/s  last progress: '
+          f'{last.decode().strip()}')
+    print(f'  RSS before {baseline:.1f} MB, peak during export {export_peak:.1f} MB, '
+          f'during import {peak:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare the legacy delete-and-reinsert goal save against the diff-based path
+for a single checkbox toggle at 10, 1k and 10k goals.
+
+    python -m benchmarks.goal_save [--repeat N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+import dataservice
+
+SIZES = (10, 1_000, 10_000)
+USER_ID = 1
+CATEGORY = 'daily'
+
+
+def legacy_save(user_id, category, goals):
+    # The pre-diff implementation, kept here as the baseline.
+    conn = dataservice.get_db_connection()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM goals WHERE user_id = ? AND category = ?', (user_id, category))
+    for index, goal in enumerate(goals):
+        cur.execute('INSERT INTO goals (user_id, category, text, completed, sort_order) VALUES (?, ?, ?, ?, ?)',
+                    (user_id, category, goal['text'], int(goal.get('completed', False)), index))
+    conn.commit()
+
+
+def seed(size):
+    conn = dataservice.get_db_connection()
+    conn.execute('DELETE FROM goals')
+    conn.executemany('INSERT INTO goals (user_id, category, text, completed, sort_order) VALUES (?, ?, ?, 0, ?)',
+                     [(USER_ID, CATEGORY, f'goal {i}', i) for i in range(size)])
+    conn.commit()
+
+
+def current_goals():
+    return [{'id': g['id'], 'text': g['text'], 'completed': bool(g['completed'])}
+            for g in dataservice.get_goals_by_category(USER_ID, CATEGORY)]
+
+
+def toggle_first(goals):
+    goals[0]['completed'] = not goals[0]['completed']
+    return goals
+
+
+def time_call(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        goals = toggle_first(current_goals())
+        start = time.perf_counter()
+        fn(goals)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(repeat):
+    results = []
+    for size in SIZES:
+        seed(size)
+        legacy = time_call(lambda goals: legacy_save(USER_ID, CATEGORY, goals), repeat)
+        seed(size)
+        full_diff = time_call(lambda goals: dataservice.save_goals_for_category(USER_ID, CATEGORY, goals), repeat)
+        seed(size)
+        patch = time_call(lambda goals: dataservice.apply_goal_changes(
+            USER_ID, CATEGORY, updated=[{'id': goals[0]['id'], 'completed': goals[0]['completed']}]), repeat)
+        results.append((size, legacy, full_diff, patch))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        app = Flask(__name__)
+        dataservice.init_app(app)
+        with app.app_context():
+            dataservice.init_db()
+            results = run(args.repeat)
+
+    print(f"{'goals':>8} {'delete+insert':>15} {'diff (POST)':>13} {'PATCH':>10}")
+    for size, legacy, full_diff, patch in results:
+        print(f'{size:>8} {legacy * 1000:>13.2f}ms {full_diff * 1000:>11.2f}ms {patch * 1000:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
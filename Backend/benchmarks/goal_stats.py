@@ -0,0 +1,92 @@
+"""
+Time the set-based rebuild of the goal rollups against replaying the same
+completion events one at a time, then time the stats query for one user.
+
+    python -m benchmarks.goal_stats [--users N] [--goals N] [--days N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from flask import Flask
+
+import dataservice
+
+
+def seed_events(conn, users, goals, days):
+    """Insert goals plus a random check history; returns the event count."""
+    today = date.today().toordinal()
+    rng = random.Random(42)
+    events = []
+    for user_id in range(1, users + 1):
+        for n in range(goals):
+            cur = conn.execute('INSERT INTO goals (user_id, category, text, completed, sort_order) '
+                               'VALUES (?, ?, ?, 0, ?)', (user_id, 'daily', f'goal {n}', n))
+            goal_id = cur.lastrowid
+            for day in range(today - days, today + 1):
+                if rng.random() < 0.7:
+                    events.append((goal_id, user_id, 'daily', 1, day, '2024-01-01 00:00:00'))
+    conn.executemany('INSERT INTO goal_completions (goal_id, user_id, category, completed, day, created_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', events)
+    conn.commit()
+    return len(events)
+
+
+def replay_events(conn):
+    """The naive alternative: fold the events into the rollups one at a time."""
+    conn.execute('DELETE FROM goal_daily_stats')
+    conn.execute('DELETE FROM goal_streaks')
+    cur = conn.cursor()
+    rows = conn.execute('SELECT goal_id, user_id, category, completed, day FROM goal_completions '
+                        'ORDER BY id').fetchall()
+    for row in rows:
+        # Same upserts as a live check, without logging the event again.
+        cur.execute('INSERT INTO goal_daily_stats (goal_id, day, user_id, completed) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (goal_id, day) DO UPDATE SET completed = excluded.completed',
+                    (row['goal_id'], row['day'], row['user_id'], row['completed']))
+    dataservice._rebuild_streaks(cur)
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--goals', type=int, default=20, help='goals per user')
+    parser.add_argument('--days', type=int, default=365, help='days of history')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        app = Flask(__name__)
+        dataservice.init_app(app)
+        with app.app_context():
+            dataservice.init_db()
+            conn = dataservice.get_db_connection()
+            events = seed_events(conn, args.users, args.goals, args.days)
+
+            start = time.perf_counter()
+            replay_events(conn)
+            replay = time.perf_counter() - start
+            expected = conn.execute('SELECT * FROM goal_streaks ORDER BY goal_id').fetchall()
+
+            start = time.perf_counter()
+            dataservice.rebuild_goal_stats()
+            rebuild = time.perf_counter() - start
+            assert conn.execute('SELECT * FROM goal_streaks ORDER BY goal_id').fetchall() == expected
+
+            start = time.perf_counter()
+            for _ in range(100):
+                stats = dataservice.get_goal_stats(1)
+            per_call = (time.perf_counter() - start) / 100
+
+    print(f'{events} completion events, {args.users * args.goals} goals')
+    print(f'  row-at-a-time replay: {replay:8.3f}s')
+    print(f'  set-based rebuild:    {rebuild:8.3f}s')
+    print(f'  stats for one user ({len(stats)} goals): {per_call * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
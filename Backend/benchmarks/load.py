@@ -0,0 +1,230 @@
+"""
+Load test the Flask backend against a freshly seeded scratch database.
+
+Each endpoint is driven by concurrent clients, first in-process through the
+Flask test client and then over HTTP through a real threaded WSGI server on
+localhost. Latency percentiles and requests/sec are printed as JSON. With
+--baseline, the run fails if any endpoint's p95 regresses by more than
+--max-regression compared to an earlier report.
+
+    python -m benchmarks [--users N] [--goals N] [--notifications N]
+                         [--requests N] [--concurrency N] [--modes test_client,wsgi]
+                         [--output report.json] [--baseline report.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.seed import PASSWORD, scratch_database, seed, username_for
+
+# (report name, method, path); every client logs in first, POST bodies are login forms
+ENDPOINTS = (
+    ('GET /api/goals', 'GET', '/api/goals?category=daily'),
+    ('GET /api/goals/all', 'GET', '/api/goals/all'),
+    ('GET /goals/all-goals', 'GET', '/goals/all-goals'),
+    ('GET /settings', 'GET', '/settings'),
+    ('POST /login', 'POST', '/login'),
+)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def login_form(user_index):
+    return {'identifier': username_for(user_index), 'password': PASSWORD}
+
+
+# --- Clients ---
+class TestClientDriver:
+    """Calls the app in-process through Flask's test client."""
+
+    def __init__(self, app, user_index):
+        self.user_index = user_index
+        self.client = app.test_client()
+        self.client.post('/login', data=login_form(user_index))
+
+    def request(self, method, path):
+        if method == 'POST':
+            response = self.client.post(path, data=login_form(self.user_index))
+        else:
+            response = self.client.get(path)
+        return response.status_code
+
+
+class HttpDriver:
+    """Calls a live server over HTTP, replaying the session cookie it was given."""
+
+    def __init__(self, host, port, cookie_name, user_index):
+        self.host, self.port = host, port
+        self.user_index = user_index
+        self.cookie = ''
+        self.cookie_name = cookie_name
+        self.request('POST', '/login')
+
+    def request(self, method, path):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if method == 'POST':
+            body = urlencode(login_form(self.user_index))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            for header, value in response.getheaders():
+                if header.lower() == 'set-cookie' and value.startswith(self.cookie_name + '='):
+                    self.cookie = value.split(';', 1)[0]
+            return response.status
+        finally:
+            conn.close()
+
+
+# --- Runner ---
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def drive(drivers, method, path, requests):
+    """Split `requests` calls across one thread per driver; return the summary."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    per_driver = max(1, requests // len(drivers))
+
+    def worker(driver):
+        local, failed = [], 0
+        for _ in range(per_driver):
+            start = time.perf_counter()
+            try:
+                status = driver.request(method, path)
+            except OSError:
+                status = 0
+            local.append(time.perf_counter() - start)
+            if status >= 400 or status == 0:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(driver,)) for driver in drivers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def run_mode(mode, app, users, requests, concurrency):
+    server = None
+    if mode == 'wsgi':
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        drivers = [HttpDriver('127.0.0.1', server.server_port, app.config['SESSION_COOKIE_NAME'], i % users)
+                   for i in range(concurrency)]
+    else:
+        drivers = [TestClientDriver(app, i % users) for i in range(concurrency)]
+
+    try:
+        results = {}
+        for name, method, path in ENDPOINTS:
+            drive(drivers, method, path, max(concurrency, requests // 10))  # warm-up
+            results[name] = drive(drivers, method, path, requests)
+        return results
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def compare(report, baseline, max_regression):
+    """Return a list of human-readable regressions of `report` against `baseline`."""
+    failures = []
+    for mode, endpoints in report['results'].items():
+        for name, current in endpoints.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(name)
+            if not previous or not previous.get('p95_ms'):
+                continue
+            change = current['p95_ms'] / previous['p95_ms'] - 1
+            if change > max_regression:
+                failures.append(f'{mode} {name}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms '
+                                f'(+{change:.0%})')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--goals', type=int, default=40, help='goals per user')
+    parser.add_argument('--notifications', type=int, default=50, help='notifications per user')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--modes', default='test_client,wsgi')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='password hash method for seeded users (cheap by default)')
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed p95 slowdown versus the baseline, as a fraction')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limiter
+    import password_hashing
+    from app import app
+
+    app.config.update(WTF_CSRF_ENABLED=False, SESSION_COOKIE_SECURE=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch_database(tmp)
+        password_hashing.configure(method=args.hash_method)
+        seed(app, users=args.users, goals=args.goals, notifications=args.notifications)
+
+        report = {
+            'config': {key: value for key, value in vars(args).items()
+                       if key not in ('output', 'baseline')},
+            'results': {},
+        }
+        for mode in args.modes.split(','):
+            report['results'][mode] = run_mode(mode, app, args.users, args.requests, args.concurrency)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            failures = compare(report, json.load(handle), args.max_regression)
+        for failure in failures:
+            print('REGRESSION', failure, file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Login throughput with password hashing inline versus in the worker pool.
+
+Login threads hammer POST /login while one probe thread times GET /api/goals,
+showing both hash throughput and how much a login burst stalls cheap requests.
+
+    python -m benchmarks.login_throughput [--threads N] [--seconds S] [--workers W]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def run_case(app, workers, threads, seconds):
+    import password_hashing
+
+    password_hashing.configure(method=app.config['PASSWORD_HASH_METHOD'],
+                               workers=workers, max_pending=threads * 2)
+    password_hashing.hash_password('warm-up')  # start the pool outside the timed window
+
+    stop = time.perf_counter() + seconds
+    logins = []
+    probe_latencies = []
+
+    def login_loop():
+        client = app.test_client()
+        count = 0
+        while time.perf_counter() < stop:
+            response = client.post('/login', data={'identifier': 'bench', 'password': 'bench-password'})
+            assert response.status_code == 302, response.status_code
+            count += 1
+        logins.append(count)
+
+    def probe_loop():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            client.get('/api/goals?category=daily')
+            probe_latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    runners = [threading.Thread(target=login_loop) for _ in range(threads)]
+    runners.append(threading.Thread(target=probe_loop))
+    for thread in runners:
+        thread.start()
+    for thread in runners:
+        thread.join()
+
+    probe_latencies.sort()
+    return {
+        'logins_per_sec': sum(logins) / seconds,
+        'probe_p50_ms': statistics.median(probe_latencies) * 1000,
+        'probe_p95_ms': probe_latencies[int(len(probe_latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limiter
+    import dataservice
+    from app import app
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        with app.app_context():
+            dataservice.init_db()
+            dataservice.create_user('bench', 'bench-password', 'bench@example.com')
+
+        print(f"{'mode':>12} {'logins/s':>10} {'probe p50':>11} {'probe p95':>11}")
+        for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+            result = run_case(app, workers, args.threads, args.seconds)
+            print(f"{label:>12} {result['logins_per_sec']:>10.1f} "
+                  f"{result['probe_p50_ms']:>9.2f}ms {result['probe_p95_ms']:>9.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
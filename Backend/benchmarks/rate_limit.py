@@ -0,0 +1,96 @@
+"""
+Cost of the rate limiter per allowed request, per rejection, and what it
+saves during a credential-stuffing burst against POST /login.
+
+    python -m benchmarks.rate_limit [--checks N] [--attempts N]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+
+def time_checks(app, limiter, endpoint, method, count, path='/', data=None):
+    """Average seconds per limiter.check() inside one request context."""
+    allowed = rejected = 0.0
+    allowed_n = rejected_n = 0
+    from rate_limit import RateLimitExceeded
+    environ = {'REMOTE_ADDR': '203.0.113.7'}
+    with app.test_request_context(path, method=method, data=data, environ_base=environ):
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                limiter.check(endpoint, method)
+            except RateLimitExceeded:
+                rejected += time.perf_counter() - start
+                rejected_n += 1
+            else:
+                allowed += time.perf_counter() - start
+                allowed_n += 1
+    return allowed / max(1, allowed_n), rejected / max(1, rejected_n)
+
+
+def stuffing(app, attempts):
+    """Fire `attempts` wrong-password logins; return (seconds, 429 count)."""
+    client = app.test_client()
+    page = client.get('/login').get_data(as_text=True)
+    csrf_token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    start = time.perf_counter()
+    limited = 0
+    for n in range(attempts):
+        response = client.post('/login', data={'identifier': 'victim', 'password': f'guess{n}',
+                                               'csrf_token': csrf_token})
+        limited += response.status_code == 429
+    return time.perf_counter() - start, limited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checks', type=int, default=100_000)
+    parser.add_argument('--attempts', type=int, default=100, help='login attempts in the stuffing burst')
+    args = parser.parse_args()
+
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    import dataservice
+    from app import app
+    from rate_limit import RateLimiter
+
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        with app.app_context():
+            dataservice.init_db()
+            dataservice.create_user('victim', 'correct-horse', 'victim@example.com')
+
+        generous = {'bench': ({'POST'}, (('ip', 10 ** 9, 1), ('identifier', 10 ** 9, 1)))}
+        strict = {'bench': ({'POST'}, (('ip', 1, 3600),))}
+        form = {'identifier': 'victim'}
+        print(f'limiter.check() over {args.checks} calls:')
+        for label, shared in (('memory', False), ('memory+sqlite', True)):
+            count = args.checks if not shared else args.checks // 10
+            with app.app_context():
+                allowed, _ = time_checks(app, RateLimiter(generous, shared=shared), 'bench', 'POST', count,
+                                         data=form)
+                _, rejected = time_checks(app, RateLimiter(strict, shared=shared), 'bench', 'POST', count,
+                                          data=form)
+            print(f'  {label:>14}: allowed {allowed * 1e6:7.2f} us, rejected {rejected * 1e6:7.2f} us')
+        with app.app_context():
+            unlimited, _ = time_checks(app, RateLimiter(generous), 'unlisted', 'GET', args.checks)
+        print(f'  {"unlisted route":>14}: {unlimited * 1e6:7.2f} us')
+
+        limiter = app.extensions['rate_limit']
+        limits = limiter.limits
+        limiter.limits = {}
+        unthrottled, _ = stuffing(app, args.attempts)
+        limiter.limits = limits
+        throttled, limited = stuffing(app, args.attempts)
+
+    print(f'{args.attempts} wrong-password logins ({app.config["PASSWORD_HASH_METHOD"]}):')
+    print(f'  without limits: {unthrottled:.2f}s')
+    print(f'  with limits:    {throttled:.2f}s ({limited} rejected before hashing)')
+
+
+if __name__ == '__main__':
+    main()
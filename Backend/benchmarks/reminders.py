@@ -0,0 +1,96 @@
+"""
+Schedule many reminders, then drive the scheduler with a fake clock through
+one day and report scheduling cost and firing throughput.
+
+    python -m benchmarks.reminders [--reminders N] [--batch N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask import Flask
+
+import dataservice
+from reminders import DAY, DEFAULT_REMINDERS, ReminderScheduler
+
+START = 1_700_000_000
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def seed(conn, count, users):
+    """Spread `count` reminders over `users` users and the next 24 hours."""
+    rng = random.Random(7)
+    categories = list(DEFAULT_REMINDERS)
+    conn.executemany('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
+                     [(f'user{n}', 'x', f'user{n}@example.com') for n in range(users)])
+    rows = []
+    for n in range(count):
+        user_id, category = n // len(categories) + 1, categories[n % len(categories)]
+        interval, message = DEFAULT_REMINDERS[category]
+        first = START + rng.randrange(DAY)
+        rows.append((user_id, category, message, interval, first, first))
+    conn.executemany('INSERT INTO reminders (user_id, category, message, interval_seconds, anchor_at, next_fire_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reminders', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=500, help='reminders fired per transaction')
+    args = parser.parse_args()
+    users = -(-args.reminders // len(DEFAULT_REMINDERS))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        app = Flask(__name__)
+        dataservice.init_app(app)
+        clock = FakeClock(START)
+        scheduler = ReminderScheduler(app, clock=clock, batch_size=args.batch, rng=random.Random(1))
+        with app.app_context():
+            dataservice.init_db()
+            seed(dataservice.get_db_connection(), args.reminders, users)
+
+            start = time.perf_counter()
+            for _ in range(1000):
+                scheduler.seconds_until_next()
+            probe = (time.perf_counter() - start) / 1000
+
+            start = time.perf_counter()
+            for n in range(1000):
+                dataservice.set_reminder(n + 1, 'daily', 'Bench reminder', DAY, START + n)
+            schedule = (time.perf_counter() - start) / 1000
+
+        # Walk the fake clock through the day in ten-minute steps, like a worker waking up.
+        fired, passes = 0, 0
+        start = time.perf_counter()
+        for step in range(0, DAY + 600, 600):
+            clock.now = START + step
+            fired += scheduler.run_pending()
+            passes += 1
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            conn = dataservice.get_db_connection()
+            notifications = conn.execute('SELECT COUNT(*) FROM notifications').fetchone()[0]
+            remaining = conn.execute('SELECT COUNT(*) FROM reminders WHERE next_fire_at <= ?',
+                                     (START + DAY,)).fetchone()[0]
+
+    print(f'{args.reminders} reminders for {users} users')
+    print(f'  next-due probe:   {probe * 1e6:8.1f} us')
+    print(f'  set_reminder:     {schedule * 1e6:8.1f} us')
+    print(f'  fired {fired} over {passes} passes in {elapsed:.2f}s ({fired / elapsed:,.0f}/s); '
+          f'{notifications} notifications, {remaining} still due')
+
+
+if __name__ == '__main__':
+    main()
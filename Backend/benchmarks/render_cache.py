@@ -0,0 +1,52 @@
+"""
+Requests/sec on /goals/daily with per-request Jinja rendering (and template
+auto-reload) versus the production configuration with the render cache.
+
+    python -m benchmarks.render_cache [--requests N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def measure(app, requests):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    client.get('/goals/daily')  # warm Jinja's compiled-template cache
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/goals/daily')
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    import dataservice
+    import template_cache
+    from app import app
+
+    app.config['SESSION_COOKIE_SECURE'] = False
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        with app.app_context():
+            dataservice.init_db()
+
+        results = []
+        for label, auto_reload in (('uncached, auto-reload', True), ('cached', False)):
+            app.config['TEMPLATES_AUTO_RELOAD'] = auto_reload
+            app.jinja_env.auto_reload = auto_reload
+            template_cache.clear()
+            results.append((label, measure(app, args.requests)))
+
+    for label, rate in results:
+        print(f'{label:>22}: {rate:8.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
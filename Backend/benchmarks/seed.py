@@ -0,0 +1,45 @@
+"""
+Seed a scratch SQLite database with users, goals and notifications.
+"""
+import os
+import tempfile
+
+import dataservice
+
+CATEGORIES = ('daily', 'weekly', 'monthly', 'yearly')
+PASSWORD = 'bench-password'
+
+
+def username_for(index):
+    return f'bench{index}'
+
+
+def scratch_database(directory=None):
+    """Point dataservice at a new database file and return its path."""
+    directory = directory or tempfile.mkdtemp(prefix='habit-bench-')
+    dataservice.DATABASE_PATH = os.path.join(directory, 'bench.sqlite')
+    return dataservice.DATABASE_PATH
+
+
+def seed(app, users=10, goals=40, notifications=50):
+    """
+    Create `users` accounts, each with `goals` goals spread over the four
+    categories and `notifications` notifications. Passwords are hashed with
+    whatever password_hashing is configured with. Returns the user ids.
+    """
+    user_ids = []
+    with app.app_context():
+        dataservice.init_db()
+        for index in range(users):
+            name = username_for(index)
+            dataservice.create_user(name, PASSWORD, f'{name}@example.com')
+            user_id = dataservice.find_user_by_username(name)['id']
+            user_ids.append(user_id)
+            for position, category in enumerate(CATEGORIES):
+                count = goals // len(CATEGORIES) + (1 if position < goals % len(CATEGORIES) else 0)
+                dataservice.save_goals_for_category(user_id, category, [
+                    {'text': f'{category} goal {n}', 'completed': n % 3 == 0} for n in range(count)
+                ])
+            for n in range(notifications):
+                dataservice.create_notification(user_id, f'Reminder {n} for {name}')
+    return user_ids
@@ -0,0 +1,107 @@
+"""
+Latency and allocations of building the GET /api/goals body at 10k goals:
+the old sqlite3.Row -> dict -> jsonify path against plain tuples encoded by
+serialization.encode_goals (stdlib and, when installed, orjson), plus what
+gzip and brotli cost and save on the result.
+
+    python -m benchmarks.serialization [--goals N] [--repeat N]
+"""
+import argparse
+import gzip
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+
+def measure(fn, repeat):
+    """(median ms, peak KiB allocated, result) for fn()."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--goals', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    import dataservice
+    import serialization
+    from app import app
+    from flask import jsonify
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        app.config['SESSION_COOKIE_SECURE'] = False
+        with app.app_context():
+            dataservice.init_db()
+            dataservice.create_user('bench', 'bench-password', 'bench@example.com')
+            dataservice.save_goals_for_category(1, 'daily', [
+                {'text': f'Goal number {i}: "stay on track"', 'completed': i % 3 == 0} for i in range(args.goals)])
+
+        rows = {}
+        with app.test_request_context():
+            def legacy():
+                return jsonify([{'id': g['id'], 'text': g['text'], 'completed': bool(g['completed'])}
+                                for g in dataservice.get_goals_by_category(1, 'daily')]).get_data()
+
+            def tuples():
+                return serialization.encode_goals(dataservice.get_goal_tuples(1, 'daily'))
+
+            def tuples_stdlib():
+                orjson, serialization.orjson = serialization.orjson, None
+                try:
+                    return tuples()
+                finally:
+                    serialization.orjson = orjson
+
+            rows['Row + dict + jsonify'] = measure(legacy, args.repeat)
+            rows['tuples + stdlib'] = measure(tuples_stdlib, args.repeat)
+            if serialization.orjson is not None:
+                rows['tuples + orjson'] = measure(tuples, args.repeat)
+
+        body = rows['tuples + stdlib'][2]
+        compressors = {'gzip -6': lambda: gzip.compress(body, compresslevel=6, mtime=0)}
+        if serialization.brotli is not None:
+            compressors['brotli q4'] = lambda: serialization.brotli.compress(body, quality=4)
+        encoded = {name: measure(fn, args.repeat) for name, fn in compressors.items()}
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        end_to_end = {}
+        for label, accept in (('identity', 'identity'), ('gzip', 'gzip'), ('br', 'br, gzip')):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get('/api/goals?category=daily', headers={'Accept-Encoding': accept})
+                timings.append(time.perf_counter() - start)
+            end_to_end[label] = (statistics.median(timings) * 1000, len(response.data),
+                                 response.headers.get('Content-Encoding', 'identity'))
+
+    print(f'{args.goals} goals, median of {args.repeat}')
+    print(f"{'body':<22} {'ms':>8} {'peak KiB':>10} {'bytes':>9}")
+    for name, (ms, peak, result) in rows.items():
+        print(f'{name:<22} {ms:>8.2f} {peak:>10.0f} {len(result):>9}')
+    for name, (ms, peak, result) in encoded.items():
+        print(f'{name:<22} {ms:>8.2f} {peak:>10.0f} {len(result):>9}')
+    print('GET /api/goals end to end:')
+    for label, (ms, size, encoding) in end_to_end.items():
+        print(f'  Accept-Encoding {label:<9} {ms:>8.2f} ms {size:>9} bytes ({encoding})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Goal-save throughput with the per-user tables split over 0 (a single file),
+2, 4 and 8 shards, with several writer processes saving for different users
+at once. SQLite allows one writer per file, so with one file the writers
+queue on its lock; with shards they mostly write to different files.
+
+    python -m benchmarks.sharding [--writers N] [--seconds N] [--shards 0 2 4 8]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+import connection_pool
+import dataservice
+
+CATEGORY = 'daily'
+
+
+def make_app():
+    app = Flask(__name__)
+    dataservice.init_app(app)
+    return app
+
+
+def setup(directory, shard_count, users, goals):
+    dataservice.DATABASE_PATH = os.path.join(directory, 'bench.sqlite')
+    dataservice.SHARD_COUNT = shard_count
+    with make_app().app_context():
+        dataservice.init_db()
+        for n in range(users):
+            dataservice.create_user(f'bench{n}', 'x', f'bench{n}@example.com')
+        user_ids = [row['id'] for row in dataservice.get_db_connection().execute('SELECT id FROM users')]
+        for user_id in user_ids:
+            dataservice.save_goals_for_category(user_id, CATEGORY, [
+                {'text': f'goal {i}', 'completed': False} for i in range(goals)])
+    return user_ids
+
+
+def writer(user_ids, deadline, results):
+    """Toggle one goal per save, cycling over `user_ids` until `deadline`."""
+    saves = failures = 0
+    dataservice._pools.clear()  # never share the parent's connections across fork
+    with make_app().app_context():
+        goals = {user_id: [{'id': g['id'], 'text': g['text'], 'completed': bool(g['completed'])}
+                           for g in dataservice.get_goals_by_category(user_id, CATEGORY)]
+                 for user_id in user_ids}
+        dataservice.close_db_connection()
+        while time.time() < deadline:
+            for user_id in user_ids:
+                user_goals = goals[user_id]
+                user_goals[saves % len(user_goals)]['completed'] ^= True
+                try:
+                    dataservice.save_goals_for_category(user_id, CATEGORY, user_goals)
+                    saves += 1
+                except Exception:
+                    failures += 1
+                # Hand the pooled connections back between saves, like a request would.
+                dataservice.close_db_connection()
+    results.put((saves, failures))
+
+
+def run(shard_count, writers, seconds, users, goals):
+    with tempfile.TemporaryDirectory() as tmp:
+        user_ids = setup(tmp, shard_count, users, goals)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + 0.5 + seconds
+        processes = [context.Process(target=writer, args=(user_ids[w::writers], deadline, results))
+                     for w in range(writers)]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    return sum(saves for saves, _ in totals) / seconds, sum(failures for _, failures in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8, help='writer processes')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--goals', type=int, default=20, help='goals per user')
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--synchronous', default=connection_pool.DEFAULT_PRAGMAS['synchronous'],
+                        help='FULL fsyncs every commit, as on a durable deployment')
+    args = parser.parse_args()
+    connection_pool.DEFAULT_PRAGMAS['synchronous'] = args.synchronous
+
+    print(f'{args.writers} writers, {args.users} users, {args.goals} goals each, '
+          f'synchronous={args.synchronous}, {args.seconds:g}s per run')
+    print(f"{'shards':>6} {'saves/s':>10} {'failed':>7}")
+    for shard_count in args.shards:
+        throughput, failures = run(shard_count, args.writers, args.seconds, args.users, args.goals)
+        print(f'{shard_count or 1:>6} {throughput:>10.0f} {failures:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+How long a new process takes to answer its first request.
+
+Each run is a fresh interpreter timing `import app`, create_app(), the
+schema bootstrap its first connection does, and the first GET /login,
+against a brand-new database and then one already at the newest migration.
+A preloaded parent then forks `--forks` workers, gunicorn --preload style,
+and each times the same bootstrap and first request.
+
+    python -m benchmarks.startup [--runs N] [--forks N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def first_request(app):
+    """(schema check ms, first GET /login ms after it) in this process."""
+    import dataservice
+
+    start = time.perf_counter()
+    dataservice.bootstrap_schema(dataservice.DATABASE_PATH)  # what the first connection does
+    schema_ms = ms(start)
+    start = time.perf_counter()
+    status = app.test_client().get('/login').status_code
+    assert status == 200, status
+    return schema_ms, ms(start)
+
+
+def child(forks):
+    """Runs in the measured interpreter; prints one JSON line per sample."""
+    start = time.perf_counter()
+    import app as app_module
+    imported = ms(start)
+    start = time.perf_counter()
+    app = app_module.create_app()
+    created = ms(start)
+    if not forks:
+        schema_ms, response_ms = first_request(app)
+        print(json.dumps({'import': imported, 'create_app': created,
+                          'schema': schema_ms, 'first_response': response_ms}))
+        return
+
+    # gunicorn --preload: the master has built the app, the workers only fork.
+    for _ in range(forks):
+        read_end, write_end = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            schema_ms, response_ms = first_request(app)
+            os.write(write_end, json.dumps({'schema': schema_ms, 'first_response': response_ms,
+                                            'fork_to_response': ms(start)}).encode())
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as result:
+            print(result.read())
+        os.waitpid(pid, 0)
+
+
+def spawn(database, forks=0):
+    env = dict(os.environ, DATABASE_PATH=database, REMINDERS_ENABLED='0', MAINTENANCE_ENABLED='0')
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', str(forks)],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    wall = ms(start)
+    samples = [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+    if not forks:
+        samples[0]['process_wall'] = wall
+    return samples
+
+
+def summarize(samples):
+    return {key: round(statistics.median(sample[key] for sample in samples), 2) for key in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes per case')
+    parser.add_argument('--forks', type=int, default=10, help='workers forked from one preloaded parent')
+    parser.add_argument('--child', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        child(args.child)
+        return 0
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = [spawn(os.path.join(tmp, f'fresh{run}.sqlite'))[0] for run in range(args.runs)]
+        report['new database'] = summarize(fresh)
+        existing = os.path.join(tmp, 'existing.sqlite')
+        spawn(existing)
+        report['migrated database'] = summarize([spawn(existing)[0] for _ in range(args.runs)])
+        report[f'preloaded parent, {args.forks} forks'] = summarize(spawn(existing, forks=args.forks))
+
+    print('median ms')
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""
+What a page view costs the workers in static traffic, with WebApp/static
+served as-is versus fingerprinted and precompressed by `flask build-assets`.
+
+For each page the assets it references are fetched once, as a first visit
+does, then again the way a browser with a warm cache would: only files that
+are not marked fresh (immutable or max-age) are revalidated.
+
+    python -m benchmarks.static_assets [--views N]
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+
+PAGES = ('/login', '/', '/goals/daily', '/advanced', '/settings')
+ASSET_URL = re.compile(r'''(?:href|src)="(/static/[^"]+)"''')
+
+
+def needs_revalidation(headers):
+    cache_control = headers.get('Cache-Control', '')
+    if 'immutable' in cache_control:
+        return False
+    return 'max-age=' not in cache_control or 'max-age=0' in cache_control
+
+
+def measure(mode, static_dir, views, results):
+    """Run in a fresh process, so the app is imported with this mode's config."""
+    os.environ['STATIC_ASSETS_ENABLED'] = '1' if mode == 'hashed' else '0'
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    import dataservice
+    from app import app
+    import static_assets
+
+    dataservice.DATABASE_PATH = os.path.join(static_dir, 'bench.sqlite')
+    app.static_folder = static_dir
+    if mode == 'hashed':
+        static_assets.init_app(app)
+    app.config['SESSION_COOKIE_SECURE'] = False
+    with app.app_context():
+        dataservice.init_db()
+        dataservice.create_user('bench', 'bench-password', 'bench@example.com')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    headers = {'Accept-Encoding': 'br, gzip'}
+
+    report = {'first_bytes': 0, 'first_requests': 0, 'repeat_requests': 0, 'seconds': 0.0}
+    for page in PAGES:
+        html = client.get(page).get_data(as_text=True)
+        assets = sorted(set(ASSET_URL.findall(html)))
+        cached = {}
+        start = time.perf_counter()
+        for url in assets:
+            response = client.get(url, headers=headers)
+            report['first_bytes'] += len(response.data)
+            report['first_requests'] += 1
+            cached[url] = response.headers
+            response.close()
+        for _ in range(views):
+            for url, stored in cached.items():
+                if needs_revalidation(stored):
+                    response = client.get(url, headers=dict(headers, **{'If-None-Match': stored.get('ETag', '')}))
+                    report['repeat_requests'] += 1
+                    response.close()
+        report['seconds'] += time.perf_counter() - start
+    results.put((mode, report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--views', type=int, default=50, help='repeat views per page')
+    args = parser.parse_args()
+
+    source = os.path.join(os.path.dirname(__file__), '..', '..', 'WebApp', 'static')
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('plain', 'hashed'):
+            static_dir = os.path.join(tmp, mode)
+            shutil.copytree(source, static_dir, ignore=shutil.ignore_patterns('build'))
+            if mode == 'hashed':
+                import static_assets
+                static_assets.build(static_dir)
+            process = context.Process(target=measure, args=(mode, static_dir, args.views, results))
+            process.start()
+            name, report = results.get()
+            process.join()
+            reports[name] = report
+
+    print(f'{len(PAGES)} pages, 1 first visit + {args.views} repeat views each')
+    print(f"{'mode':>8} {'first-visit KB':>15} {'first reqs':>11} {'repeat reqs':>12} {'worker time':>12}")
+    for mode, report in reports.items():
+        print(f"{mode:>8} {report['first_bytes'] / 1024:>15.1f} {report['first_requests']:>11} "
+              f"{report['repeat_requests']:>12} {report['seconds'] * 1000:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
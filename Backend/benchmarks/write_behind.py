@@ -0,0 +1,72 @@
+"""
+Compare synchronous goal saves with write-behind saves during an autosave
+burst. Crash replay is covered by tests/test_write_behind.py.
+
+    python -m benchmarks.write_behind [--goals N] [--saves N] [--fsync]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+import dataservice
+import write_behind
+
+USER_ID = 1
+CATEGORY = 'daily'
+
+
+def goal_list(size, edit):
+    # Each autosave toggles one more checkbox, like a user ticking through a list.
+    return [{'text': f'goal {i}', 'completed': i < edit} for i in range(size)]
+
+
+def burst(save, size, saves):
+    start = time.perf_counter()
+    for edit in range(saves):
+        save(goal_list(size, edit))
+    return (time.perf_counter() - start) / saves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--goals', type=int, default=200)
+    parser.add_argument('--saves', type=int, default=100)
+    parser.add_argument('--fsync', action='store_true', help='fsync the log on every save')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataservice.DATABASE_PATH = os.path.join(tmp, 'bench.sqlite')
+        app = Flask(__name__)
+        app.config.update(WRITE_BEHIND_LOG=os.path.join(tmp, 'goal-writes.log'),
+                          WRITE_BEHIND_FSYNC=args.fsync)
+        dataservice.init_app(app)
+        with app.app_context():
+            dataservice.init_db()
+            sync = burst(lambda goals: dataservice.save_goals_for_category(USER_ID, CATEGORY, goals),
+                         args.goals, args.saves)
+            dataservice.reset_all_goals(USER_ID)
+            versions_before = dataservice.get_goal_versions(USER_ID, [CATEGORY])[CATEGORY]
+
+        queue = write_behind.init_app(app)
+        with app.app_context():
+            deferred = burst(lambda goals: queue.submit(USER_ID, CATEGORY, goals), args.goals, args.saves)
+        start = time.perf_counter()
+        queue.stop()
+        flush = time.perf_counter() - start
+        dataservice.set_pending_goals_source(None)
+        with app.app_context():
+            versions_after = dataservice.get_goal_versions(USER_ID, [CATEGORY])[CATEGORY]
+
+
+    print(f'{args.saves} autosaves of {args.goals} goals')
+    print(f'  synchronous save:   {sync * 1000:8.3f} ms/save')
+    print(f'  write-behind ack:   {deferred * 1000:8.3f} ms/save')
+    print(f'  drain on shutdown:  {flush * 1000:8.3f} ms '
+          f'({versions_after - versions_before} SQLite write(s) for {args.saves} saves)')
+
+
+if __name__ == '__main__':
+    main()
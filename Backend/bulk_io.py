@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+# format name -> (mimetype, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+GOAL_FIELDS = ('id', 'category', 'text', 'completed', 'sort_order')
+NOTIFICATION_FIELDS = ('id', 'message', 'time')
+
+
+# --- Encoding ---
+def encode(batches, fmt, fields):
+    """
+    Turn an iterator of row batches into an iterator of text chunks, one chunk
+    per batch, so a response can be streamed without holding every row.
+    """
+    if fmt == 'csv':
+        return _encode_csv(batches, fields)
+    return _encode_ndjson(batches, fields)
+
+
+def _encode_ndjson(batches, fields):
+    for rows in batches:
+        yield ''.join(json.dumps({field: row[field] for field in fields}) + '\n' for row in rows)
+
+
+def _encode_csv(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        writer.writerows([row[field] for field in fields] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header only, for an empty export
+
+
+# --- Parsing ---
+def parse(stream, fmt):
+    """
+    Incrementally parse a binary upload stream into dicts, one per record.
+    Blank NDJSON lines are skipped; a malformed line raises ValueError.
+    """
+    if not hasattr(stream, 'read1'):
+        stream = io.BufferedReader(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        return csv.DictReader(text)
+    return _parse_ndjson(text)
+
+
+def _parse_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Line {number} is not valid JSON') from None
+        if not isinstance(record, dict):
+            raise ValueError(f'Line {number} is not a JSON object')
+        yield record
+
+
+def parse_bool(value):
+    """CSV cells arrive as text; accept the usual spellings of true."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y', 't')
+    return bool(value)
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Applied to every new connection, in order. busy_timeout goes first so the
+# journal_mode switch waits for other writers instead of failing outright.
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,           # ms to wait on a locked database
+    'journal_mode': 'WAL',          # readers no longer block the writer
+    'synchronous': 'NORMAL',        # fsync at checkpoints only; safe with WAL
+    'cache_size': -16000,           # negative = KiB, so ~16 MB page cache
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within the timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of SQLite connections for one database file.
+    At most `max_size` connections exist per process; callers beyond that
+    wait up to `timeout` seconds for one to be released.
+    """
+
+    def __init__(self, database, max_size=5, timeout=10.0, pragmas=None, factory=sqlite3.Connection):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.factory = factory
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self._available = threading.Condition(threading.Lock())
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._counters = {
+            'acquired': 0,
+            'created': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+        }
+
+    def _check_pid(self):
+        # Connections must never cross a fork (e.g. gunicorn --preload):
+        # the child drops the inherited ones and starts an empty pool.
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False,
+                               factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        with self._available:
+            self._check_pid()
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'No database connection available after {self.timeout}s '
+                        f'(pool size {self.max_size})')
+                self._available.wait(remaining)
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._size += 1
+            self._in_use += 1
+            self._counters['acquired'] += 1
+            if waited:
+                elapsed = time.perf_counter() - start
+                self._counters['waits'] += 1
+                self._counters['wait_seconds_total'] += elapsed
+                self._counters['wait_seconds_max'] = max(self._counters['wait_seconds_max'], elapsed)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._available:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self._counters['created'] += 1
+        return conn
+
+    def release(self, conn):
+        # Never hand a half-finished transaction to the next request.
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+
+        with self._available:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if conn is None:
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._available.notify()
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._available:
+            return dict(self._counters,
+                        max_size=self.max_size,
+                        size=self._size,
+                        in_use=self._in_use,
+                        idle=len(self._idle))
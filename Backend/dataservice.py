@@ -1,32 +1,208 @@
 import sqlite3
 import os
+import click
 from flask import Flask, g
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import secrets
-from werkzeug.security import generate_password_hash, check_password_hash
+import random
+import hashlib
+import threading
+import time
+from connection_pool import ConnectionPool
+from lru_cache import LRUCache
+from password_hashing import hash_password
+from bulk_io import parse_bool
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'habitDatabase.sqlite')
+DATABASE_PATH = os.getenv('DATABASE_PATH') or os.path.join(os.path.dirname(__file__), 'habitDatabase.sqlite')
+# Create or migrate each database file the first time this process opens it.
+SCHEMA_BOOTSTRAP = os.getenv('SCHEMA_BOOTSTRAP', '1') == '1'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
 
 # --- Database Connection Management ---
+_pools = {}
+_pools_lock = threading.Lock()
+_connection_factory = sqlite3.Connection
+
+def get_pool(database=None):
+    """
+    Return the process-wide connection pool for a database file,
+    creating it on first use.
+    """
+    database = database or DATABASE_PATH
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                if SCHEMA_BOOTSTRAP:
+                    bootstrap_schema(database)
+                pool = _pools[database] = ConnectionPool(
+                    database, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, factory=_connection_factory)
+    return pool
+
+def set_connection_factory(factory):
+    """
+    Use a sqlite3.Connection subclass for new connections (e.g. to instrument
+    them). Idle pooled connections are closed so the change applies at once.
+    """
+    global _connection_factory
+    with _pools_lock:
+        _connection_factory = factory
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+def pool_stats():
+    return {database: pool.stats() for database, pool in _pools.items()}
+
 def get_db_connection():
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE_PATH, timeout=10, check_same_thread=False)
-        g.db.row_factory = sqlite3.Row
+        g.db_pool = get_pool()
+        g.db = g.db_pool.acquire()
     return g.db
 
 def close_db_connection(e=None):
     db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
     if db is not None:
-        db.close()
+        pool.release(db)
+    for shard_pool, conn in g.pop('shard_dbs', {}).values():
+        shard_pool.release(conn)
 
 def init_app(app):
     app.teardown_appcontext(close_db_connection)
 
+    @app.cli.command('trim-notifications')
+    def trim_notifications_command():
+        """Trim every user's notifications to NOTIFICATION_RETENTION."""
+        print(f'Removed {trim_notifications()} notifications.')
+
+    @app.cli.command('db-maintenance')
+    @click.option('--full-vacuum', is_flag=True,
+                  help='Rewrite each database file once to enable incremental vacuum (takes an exclusive lock).')
+    def db_maintenance_command(full_vacuum):
+        """Purge expired tokens, trim notifications, run PRAGMA optimize and reclaim free pages."""
+        if full_vacuum:
+            before, after = enable_incremental_vacuum()
+            print(f'Full vacuum: {before} -> {after} pages.')
+        for name, value in run_maintenance(vacuum_pages=None).items():
+            print(f'{name}: {value}')
+
+    @app.cli.command('rebalance-shards')
+    @click.option('--from-count', type=int, required=True,
+                  help='SHARD_COUNT the data was written under (0: everything in the main database).')
+    def rebalance_shards_command(from_count):
+        """Move users' rows to the shard SHARD_COUNT assigns them. Run with the app stopped."""
+        init_db()
+        print(f'Moved {rebalance_shards(from_count)} users.')
+
+    @app.cli.command('rebuild-goal-stats')
+    def rebuild_goal_stats_command():
+        """Rebuild the daily goal rollups and streaks from completion history."""
+        print(f'Rebuilt {rebuild_goal_stats()} daily goal rows.')
+
+# --- Shard Routing ---
+# With SHARD_COUNT > 0 the per-user tables (goals, notifications, reminders,
+# ...) live in SHARD_COUNT files, each user's in the one chosen by a stable
+# hash of their id. DATABASE_PATH stays the directory: users, tokens, sessions
+# and the other global tables. Every file carries the full schema. With
+# SHARD_COUNT = 0 everything stays in DATABASE_PATH. Changing the count needs
+# an offline `flask rebalance-shards --from-count <old>`.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0))
+SHARD_PATH_TEMPLATE = os.getenv('SHARD_PATH_TEMPLATE')  # e.g. /data/habits.shard{}.sqlite
+
+def shard_index(user_id, shard_count=None):
+    """
+    Jump consistent hash of a user id: going from N to N + 1 shards moves
+    only 1/(N + 1) of the users.
+    """
+    count = SHARD_COUNT if shard_count is None else shard_count
+    key, bucket, jump = int(user_id) & 0xFFFFFFFFFFFFFFFF, -1, 0
+    while jump < count:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def shard_path(index):
+    if SHARD_PATH_TEMPLATE:
+        return SHARD_PATH_TEMPLATE.format(index)
+    return f'{os.path.splitext(DATABASE_PATH)[0]}.shard{index}.sqlite'
+
+def shard_paths(shard_count=None):
+    """Every file holding per-user tables under a layout (default: the current one)."""
+    count = SHARD_COUNT if shard_count is None else shard_count
+    return [shard_path(index) for index in range(count)] if count > 0 else [DATABASE_PATH]
+
+def _shard_connection(path):
+    if path == DATABASE_PATH:
+        return get_db_connection()
+    shards = g.setdefault('shard_dbs', {})
+    if path not in shards:
+        pool = get_pool(path)
+        shards[path] = (pool, pool.acquire())
+    return shards[path][1]
+
+def user_path(user_id, shard_count=None):
+    """The file holding this user's per-user tables under a layout."""
+    count = SHARD_COUNT if shard_count is None else shard_count
+    return shard_path(shard_index(user_id, count)) if count > 0 else DATABASE_PATH
+
+def get_user_connection(user_id):
+    """The connection for the file holding this user's per-user tables."""
+    if SHARD_COUNT <= 0:
+        return get_db_connection()
+    return _shard_connection(user_path(user_id))
+
+def shard_connections():
+    """One connection per file holding per-user tables, for cross-user jobs."""
+    return [_shard_connection(path) for path in shard_paths()]
+
+def all_connections():
+    """The directory connection followed by every distinct shard connection."""
+    directory = get_db_connection()
+    return [directory] + [conn for conn in shard_connections() if conn is not directory]
+
 # --- Database Initialization ---
+_bootstrapped = set()
+
+def bootstrap_schema(database):
+    """
+    Create the schema in one database file, unless its user_version shows it
+    is already at the newest migration: then this costs a single PRAGMA
+    read. Checked once per file per process. Needs no app context, and
+    closes its connection, so it is safe before a fork. Returns True if the
+    schema was (re)applied.
+    """
+    if database in _bootstrapped:
+        return False
+    pool = ConnectionPool(database, max_size=1, timeout=DB_POOL_TIMEOUT, factory=_connection_factory)
+    conn = pool.acquire()
+    try:
+        applied = conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION
+        if applied:
+            _init_schema(conn)
+    finally:
+        pool.release(conn)
+        pool.close()
+    _bootstrapped.add(database)
+    return applied
+
 def init_db():
-    conn = get_db_connection()
+    """Create the schema and run migrations in the directory and every shard."""
+    for conn in all_connections():
+        _init_schema(conn)
+
+def _init_schema(conn):
     cur = conn.cursor()
 
+    # auto_vacuum can only be chosen while the file is empty (or by a full VACUUM).
+    if conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
     cur.execute('''CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT NOT NULL UNIQUE,
@@ -78,11 +254,257 @@ def init_db():
         is_enabled INTEGER NOT NULL DEFAULT 1
     )''')
 
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)')
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)')
-    cur.execute('CREATE INDEX IF NOT EXISTS idx_goals_user_id ON goals (user_id)')
-
     conn.commit()
+    run_migrations(conn)
+
+# --- Schema Migrations ---
+# Applied once each, in order. PRAGMA user_version records the last one run,
+# so a migration must never be edited after release; add a new one instead.
+# A step is either an SQL string or a callable taking the connection.
+def _backfill_notification_hashes(conn):
+    rows = conn.execute('SELECT id, message FROM notifications').fetchall()
+    conn.executemany('UPDATE notifications SET message_hash = ? WHERE id = ?',
+                     [(notification_message_hash(row['message']), row['id']) for row in rows])
+
+MIGRATIONS = [
+    (1, 'composite and covering indexes for the hot lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_goals_user_category_order ON goals (user_id, category, sort_order)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications (user_id, id, message, time)',
+        'CREATE INDEX IF NOT EXISTS idx_tokens_user_name ON tokens (user_id, token_name, created_at, token_value)',
+        # Prefix of idx_goals_user_category_order, and duplicates of the UNIQUE autoindexes.
+        'DROP INDEX IF EXISTS idx_goals_user_id',
+        'DROP INDEX IF EXISTS idx_users_username',
+        'DROP INDEX IF EXISTS idx_users_email',
+    ]),
+    (2, 'notification dedupe by message hash', [
+        'ALTER TABLE notifications ADD COLUMN message_hash INTEGER',
+        _backfill_notification_hashes,
+        # Keep the oldest copy of any duplicates that predate the constraint.
+        'DELETE FROM notifications WHERE id NOT IN '
+        '(SELECT MIN(id) FROM notifications GROUP BY user_id, message_hash)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_user_message ON notifications (user_id, message_hash)',
+    ]),
+    (3, 'per-user, per-category goal version counters for ETags', [
+        '''CREATE TABLE IF NOT EXISTS goal_versions (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID''',
+        'INSERT OR IGNORE INTO goal_versions (user_id, category, version) '
+        'SELECT DISTINCT user_id, category, 1 FROM goals WHERE true',
+    ]),
+    (4, 'goal completion history with daily rollups and streaks', [
+        # Append-only: one row per check or uncheck. Days are date ordinals.
+        '''CREATE TABLE IF NOT EXISTS goal_completions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            goal_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            completed INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        )''',
+        # State of each goal at the end of each day it was touched.
+        '''CREATE TABLE IF NOT EXISTS goal_daily_stats (
+            goal_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            completed INTEGER NOT NULL,
+            PRIMARY KEY (goal_id, day)
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS goal_streaks (
+            goal_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            current_streak INTEGER NOT NULL,
+            longest_streak INTEGER NOT NULL,
+            last_day INTEGER NOT NULL
+        )''',
+    ]),
+    (5, 'server-side reminders ordered by next fire time', [
+        # Times are unix seconds. Fire times are anchor_at + k * interval_seconds
+        # plus jitter, so a late or jittered fire never drifts the schedule.
+        '''CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            message TEXT NOT NULL,
+            interval_seconds INTEGER NOT NULL,
+            anchor_at INTEGER NOT NULL,
+            next_fire_at INTEGER NOT NULL,
+            UNIQUE (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_reminders_next_fire ON reminders (next_fire_at)',
+    ]),
+    (6, 'email outbox and notification digest bookmarks', [
+        # Times are unix seconds. Pending rows are claimed in next_attempt_at order.
+        '''CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            kind TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            expires_at INTEGER,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            sent_at INTEGER
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (next_attempt_at) WHERE status = 'pending'",
+        '''CREATE TABLE IF NOT EXISTS email_digest_state (
+            user_id INTEGER PRIMARY KEY,
+            last_notification_id INTEGER NOT NULL
+        )''',
+        # Digests start from now rather than mailing out every old notification.
+        'INSERT OR IGNORE INTO email_digest_state (user_id, last_notification_id) '
+        'SELECT user_id, MAX(id) FROM notifications GROUP BY user_id',
+    ]),
+    (7, 'server-side sessions', [
+        # The cookie carries only the signed id; data is the tagged-JSON session.
+        '''CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)',
+    ]),
+    (8, 'shared rate-limit token buckets', [
+        # One token bucket per key: `tokens` as of `updated_at` (unix seconds).
+        '''CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID''',
+    ]),
+    (9, 'integer epoch timestamps for reset tokens and the tokens table', [
+        # The old text timestamps are naive local times; the 'utc' modifier
+        # converts them. Unparseable values become 0, i.e. long expired.
+        'ALTER TABLE users ADD COLUMN reset_token_expires_at INTEGER',
+        "UPDATE users SET reset_token_expires_at = COALESCE(CAST(strftime('%s', reset_token_expiry, 'utc') "
+        "AS INTEGER), 0), reset_token_expiry = NULL WHERE reset_token IS NOT NULL",
+        'CREATE INDEX IF NOT EXISTS idx_users_reset_token_expiry ON users (reset_token_expires_at) '
+        'WHERE reset_token IS NOT NULL',
+        # A TEXT column would store integers as text, so rebuild the table.
+        '''CREATE TABLE tokens_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token_name TEXT NOT NULL,
+            token_value TEXT,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )''',
+        "INSERT INTO tokens_new (id, user_id, token_name, token_value, created_at) "
+        "SELECT id, user_id, token_name, token_value, COALESCE(CAST(strftime('%s', created_at, 'utc') AS INTEGER), 0) "
+        "FROM tokens",
+        'DROP TABLE tokens',
+        'ALTER TABLE tokens_new RENAME TO tokens',
+        'CREATE INDEX idx_tokens_user_name ON tokens (user_id, token_name, created_at, token_value)',
+        'CREATE INDEX idx_tokens_created_at ON tokens (created_at)',
+    ]),
+    (10, 'index streaks by user and last day', [
+        'CREATE INDEX IF NOT EXISTS idx_goal_streaks_user_day ON goal_streaks (user_id, last_day)',
+    ]),
+    (11, 'reminders switched off are kept, so they are not recreated', [
+        'ALTER TABLE reminders ADD COLUMN enabled INTEGER NOT NULL DEFAULT 1',
+        'DROP INDEX IF EXISTS idx_reminders_next_fire',
+        'CREATE INDEX idx_reminders_next_fire ON reminders (next_fire_at) WHERE enabled = 1',
+    ]),
+    (12, 'when notification digests last went out', [
+        # One row; kept in the directory so restarts and workers share it.
+        '''CREATE TABLE IF NOT EXISTS email_digest_runs (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_run_at INTEGER NOT NULL
+        )''',
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Hot queries and the index each one must be answered from.
+QUERY_PLAN_CHECKS = [
+    ('SELECT id, text, completed FROM goals WHERE user_id = ? AND category = ? ORDER BY sort_order',
+     (1, 'daily'), 'idx_goals_user_category_order'),
+    ('SELECT id, text, completed, category FROM goals WHERE user_id = ? ORDER BY category, sort_order',
+     (1,), 'idx_goals_user_category_order'),
+    ('SELECT id, text, completed, category FROM goals WHERE user_id = ? AND category IN (?, ?) '
+     'ORDER BY category, sort_order', (1, 'daily', 'weekly'), 'idx_goals_user_category_order'),
+    ('SELECT id, message, time FROM notifications WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+     (1, 100, 20), 'idx_notifications_user_id'),
+    ('SELECT id, category, text, completed, sort_order FROM goals WHERE user_id = ? ORDER BY category, sort_order',
+     (1,), 'idx_goals_user_category_order'),
+    ('SELECT id, message, time FROM notifications WHERE user_id = ? ORDER BY id',
+     (1,), 'idx_notifications_user_id'),
+    ('SELECT COUNT(*) FROM goal_daily_stats WHERE goal_id = ? AND day > ? AND completed = 1',
+     (1, 738000), 'PRIMARY KEY'),
+    ('SELECT id, user_id, message, interval_seconds, anchor_at, next_fire_at FROM reminders '
+     'WHERE enabled = 1 AND next_fire_at <= ? ORDER BY next_fire_at LIMIT ?', (0, 500), 'idx_reminders_next_fire'),
+    ('SELECT MIN(next_fire_at) FROM reminders WHERE enabled = 1', (), 'idx_reminders_next_fire'),
+    ("SELECT id, user_id, kind, recipient, domain, subject, body, attempts, expires_at FROM email_outbox "
+     "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?", (0, 100),
+     'idx_email_outbox_due'),
+    ('SELECT category, version FROM goal_versions WHERE user_id = ? AND category IN (?)',
+     (1, 'daily'), 'PRIMARY KEY'),
+    ('SELECT * FROM tokens WHERE user_id = ? AND token_name = ?',
+     (1, 'last_password_reset'), 'idx_tokens_user_name'),
+    ('SELECT * FROM users WHERE username = ? AND deleted_at IS NULL',
+     ('alice',), 'sqlite_autoindex_users_1'),
+    ('SELECT * FROM users WHERE email = ? AND deleted_at IS NULL',
+     ('alice@example.com',), 'sqlite_autoindex_users_2'),
+    ('SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?', ('x', 0), 'PRIMARY KEY'),
+    ('SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?', (0, 1000), 'idx_sessions_expires_at'),
+    ('SELECT id FROM users WHERE reset_token IS NOT NULL AND reset_token_expires_at <= ?',
+     (0,), 'idx_users_reset_token_expiry'),
+    ('SELECT id FROM tokens WHERE created_at < ? LIMIT ?', (0, 1000), 'idx_tokens_created_at'),
+    ('SELECT goal_id FROM goal_streaks WHERE user_id = ? AND last_day > ?',
+     (1, 738000), 'idx_goal_streaks_user_day'),
+]
+
+def run_migrations(conn):
+    """
+    Bring the schema up to the newest migration. Returns the versions applied.
+    """
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # DDL does not open a transaction implicitly, so begin one explicitly
+            # to apply each migration and its version bump atomically. IMMEDIATE
+            # takes the write lock first: when several workers start on a new
+            # database, one applies the migration and the rest see its version.
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def verify_query_plans(conn):
+    """
+    Raise AssertionError if any hot query would scan a table, sort in a temp
+    B-tree or skip its expected index.
+    """
+    for query, params, index_name in QUERY_PLAN_CHECKS:
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+        detail = ' | '.join(plan)
+        if index_name not in detail or any(
+                step.startswith('SCAN') or 'TEMP B-TREE' in step for step in plan):
+            raise AssertionError(f'Unexpected query plan for {query!r}: {detail}')
 
 # --- Feature Flag Management ---
 def is_feature_enabled(feature_name):
@@ -102,10 +524,9 @@ def insert_feature_flag(feature_name, is_enabled=1):
 def insert_token(user_id, token_name, token_value):
     conn = get_db_connection()
     cur = conn.cursor()
-    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     cur.execute(
         'INSERT INTO tokens (user_id, token_name, token_value, created_at) VALUES (?, ?, ?, ?)',
-        (user_id, token_name, token_value, created_at)
+        (user_id, token_name, token_value, int(time.time()))
     )
     conn.commit()
 
@@ -115,32 +536,99 @@ def get_user_token(user_id, token_name):
     cur.execute('SELECT * FROM tokens WHERE user_id = ? AND token_name = ?', (user_id, token_name))
     return cur.fetchone()
 
+# --- User Identity Cache ---
+# Rows are memoized per request in `g`, and optionally in a process-wide LRU
+# (USER_CACHE_SIZE > 0). Usernames and emails map to an id and rows are stored
+# by id only, so invalidating a single key drops every alias. Other workers
+# only see invalidations once USER_CACHE_TTL expires, so keep it short.
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 0))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+_user_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL) if USER_CACHE_SIZE > 0 else None
+
+def _user_memo():
+    if 'user_memo' not in g:
+        g.user_memo = {}
+    return g.user_memo
+
+def _cache_get(key):
+    memo = _user_memo()
+    if key in memo:
+        return memo[key]
+    if _user_cache is not None:
+        value = _user_cache.get(key)
+        if value is not None:
+            memo[key] = value
+        return value
+    return None
+
+def _cache_user(user):
+    entries = [(('id', user['id']), user), (('username', user['username']), user['id'])]
+    if user['email']:
+        entries.append((('email', user['email']), user['id']))
+    memo = _user_memo()
+    for key, value in entries:
+        memo[key] = value
+        if _user_cache is not None:
+            _user_cache.set(key, value)
+    return user
+
+def _cached_lookup(field, value, query, params):
+    if field == 'id':
+        user = _cache_get(('id', value))
+    else:
+        user_id = _cache_get((field, value))
+        user = _cache_get(('id', user_id)) if user_id is not None else None
+    if user is not None:
+        return user
+    user = get_db_connection().execute(query, params).fetchone()
+    return _cache_user(user) if user else None
+
+def invalidate_user(user_id):
+    _user_memo().pop(('id', user_id), None)
+    if _user_cache is not None:
+        _user_cache.pop(('id', user_id))
+
 # --- User Management ---
 def find_user_by_id(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE id = ? AND deleted_at IS NULL', (user_id,))
-    return cur.fetchone()
+    return _cached_lookup('id', user_id,
+                          'SELECT * FROM users WHERE id = ? AND deleted_at IS NULL', (user_id,))
 
 def find_user_by_username(username):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE username = ? AND deleted_at IS NULL', (username,))
-    return cur.fetchone()
+    return _cached_lookup('username', username,
+                          'SELECT * FROM users WHERE username = ? AND deleted_at IS NULL', (username,))
 
 def find_user_by_email(email):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE email = ? AND deleted_at IS NULL', (email,))
-    return cur.fetchone()
+    return _cached_lookup('email', email,
+                          'SELECT * FROM users WHERE email = ? AND deleted_at IS NULL', (email,))
+
+def find_user_by_identifier(username, email=None):
+    """
+    Find the active user whose username or email matches, in one query.
+    With only `username` given it is tried against both columns (login);
+    a username match wins over an email match.
+    """
+    email = username if email is None else email
+    for field, value in (('username', username), ('email', email)):
+        user_id = _cache_get((field, value))
+        user = _cache_get(('id', user_id)) if user_id is not None else None
+        if user is not None:
+            return user
+    user = get_db_connection().execute(
+        'SELECT * FROM users WHERE (username = ? OR email = ?) AND deleted_at IS NULL '
+        'ORDER BY username = ? DESC LIMIT 1',
+        (username, email, username)
+    ).fetchone()
+    return _cache_user(user) if user else None
 
 def create_user(username, password, email=None):
-    if find_user_by_username(username) or (email and find_user_by_email(email)):
-        raise ValueError("User with this identifier already exists.")
+    hashed_password = hash_password(password)
     conn = get_db_connection()
-    hashed_password = generate_password_hash(password)
-    conn.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
-                 (username, hashed_password, email))
+    try:
+        conn.execute('INSERT INTO users (username, password, email) VALUES (?, ?, ?)',
+                     (username, hashed_password, email))
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise ValueError("User with this identifier already exists.")
     conn.commit()
 
 def soft_delete_user(user_id):
@@ -148,51 +636,63 @@ def soft_delete_user(user_id):
     conn.execute('UPDATE users SET deleted_at = ? WHERE id = ?',
                  (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), user_id))
     conn.commit()
+    invalidate_user(user_id)
 
 def restore_user(user_id):
     conn = get_db_connection()
     conn.execute('UPDATE users SET deleted_at = NULL WHERE id = ?', (user_id,))
     conn.commit()
+    invalidate_user(user_id)
 
 def update_user_password(user_id, new_password):
+    hashed_password = hash_password(new_password)
     conn = get_db_connection()
-    hashed_password = generate_password_hash(new_password)
     conn.execute('UPDATE users SET password = ? WHERE id = ?', (hashed_password, user_id))
     insert_token(user_id, 'last_password_reset', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     conn.commit()
+    invalidate_user(user_id)
+
+def set_user_password_hash(user_id, password_hash):
+    """
+    Replace the stored hash without recording a password change,
+    e.g. when upgrading a hash made with outdated cost parameters.
+    """
+    conn = get_db_connection()
+    conn.execute('UPDATE users SET password = ? WHERE id = ?', (password_hash, user_id))
+    conn.commit()
+    invalidate_user(user_id)
 
 def update_user_reset_token(user_id, expiry_duration_minutes=60):
-    # Generate a secure, one-time-use token
+    """
+    Issue a one-time reset token. Returns (token, expires_at in unix seconds).
+    """
     reset_token = secrets.token_urlsafe(32)
-    reset_token_expiry = (datetime.now() + timedelta(minutes=expiry_duration_minutes)).strftime('%Y-%m-%d %H:%M:%S')
-    
+    expires_at = int(time.time()) + expiry_duration_minutes * 60
+
     conn = get_db_connection()
     conn.execute(
-        'UPDATE users SET reset_token = ?, reset_token_expiry = ? WHERE id = ?',
-        (reset_token, reset_token_expiry, user_id)
+        'UPDATE users SET reset_token = ?, reset_token_expires_at = ? WHERE id = ?',
+        (reset_token, expires_at, user_id)
     )
     conn.commit()
-    return reset_token, reset_token_expiry
+    invalidate_user(user_id)
+    return reset_token, expires_at
 
 def get_user_reset_token(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT reset_token, reset_token_expiry FROM users WHERE id = ?', (user_id,))
-    result = cur.fetchone()
-    
-    if result:
-        reset_token, reset_token_expiry = result
-        # Check if the token is still valid
-        if reset_token and reset_token_expiry:
-            expires_at = datetime.strptime(reset_token_expiry, '%Y-%m-%d %H:%M:%S')
-            if expires_at > datetime.now():
-                return {
-                    'token': reset_token,
-                    'expires_at': reset_token_expiry,
-                    'created_at': (expires_at - timedelta(minutes=60)).strftime('%Y-%m-%d %H:%M:%S')
-                }
-    
-    return None
+    """
+    The user's unexpired reset token, with unix-second timestamps, or None.
+    """
+    row = get_db_connection().execute(
+        'SELECT reset_token, reset_token_expires_at FROM users '
+        'WHERE id = ? AND reset_token IS NOT NULL AND reset_token_expires_at > ?',
+        (user_id, int(time.time()))).fetchone()
+    if row is None:
+        return None
+    return {
+        'token': row['reset_token'],
+        'expires_at': row['reset_token_expires_at'],
+        'created_at': row['reset_token_expires_at'] - 60 * 60,
+    }
 
 
 def clear_reset_token(user_id):
@@ -201,81 +701,1161 @@ def clear_reset_token(user_id):
     """
     conn = get_db_connection()
     conn.execute(
-        'UPDATE users SET reset_token = NULL, reset_token_expiry = NULL WHERE id = ?',
+        'UPDATE users SET reset_token = NULL, reset_token_expires_at = NULL WHERE id = ?',
         (user_id,)
     )
     conn.commit()
+    invalidate_user(user_id)
+
+# --- Goal Versions ---
+# Every goal write bumps a per-(user, category) counter in the same transaction,
+# so the API can answer conditional GETs from this table alone.
+def _bump_goal_version(cur, user_id, category):
+    cur.execute('''INSERT INTO goal_versions (user_id, category, version) VALUES (?, ?, 1)
+                   ON CONFLICT (user_id, category) DO UPDATE SET version = version + 1''',
+                (user_id, category))
+
+def _bump_goal_version_for_goal(cur, goal_id):
+    cur.execute('''INSERT INTO goal_versions (user_id, category, version)
+                   SELECT user_id, category, 1 FROM goals WHERE id = ?
+                   ON CONFLICT (user_id, category) DO UPDATE SET version = version + 1''',
+                (goal_id,))
+
+def get_goal_versions(user_id, categories=None):
+    """
+    Current version of each category; categories never written are 0.
+    With no categories given, every category the user has written is returned.
+    """
+    conn = get_user_connection(user_id)
+    query = 'SELECT category, version FROM goal_versions WHERE user_id = ?'
+    params = [user_id]
+    if categories:
+        query += ' AND category IN ({})'.format(', '.join('?' * len(categories)))
+        params.extend(categories)
+    versions = {category: 0 for category in categories or ()}
+    versions.update((row['category'], row['version']) for row in conn.execute(query, params))
+    # A pending write-behind save must change the ETag before it is flushed.
+    for category, (seq, _goals) in _pending_goals(user_id).items():
+        if not categories or category in categories:
+            versions[category] = (versions.get(category, 0), seq)
+    return versions
+
+# --- Pending Goal Writes ---
+# With write-behind enabled, saves are acknowledged before they reach SQLite.
+# The source returns {category: (seq, goals)} for a user so reads see them;
+# `flush` applies a user's pending saves.
+_pending_goals_source = None
+_pending_goals_flush = None
+
+def set_pending_goals_source(source, flush=None):
+    global _pending_goals_source, _pending_goals_flush
+    _pending_goals_source = source
+    _pending_goals_flush = flush
+
+def _pending_goals(user_id):
+    if _pending_goals_source is None:
+        return {}
+    return _pending_goals_source(user_id)
+
+def flush_pending_goals(user_id):
+    """Apply a user's pending saves before a direct write, so ordering holds."""
+    if _pending_goals_flush is not None:
+        _pending_goals_flush(user_id)
+
+def _pending_rows(goals):
+    return [{'id': goal.get('id'), 'text': goal['text'], 'completed': int(bool(goal.get('completed')))}
+            for goal in goals]
+
+def _pending_tuples(goals):
+    return [(goal.get('id'), goal['text'], int(bool(goal.get('completed')))) for goal in goals]
+
+# --- Change Listener ---
+# Told about every committed change to a user's goals ('goals', with the
+# categories touched) or notifications ('notifications', with the action),
+# e.g. to push it to the user's open tabs (see events.py).
+_change_listener = None
+
+def set_change_listener(listener):
+    global _change_listener
+    _change_listener = listener
+
+def notify_change(user_id, kind, **details):
+    if _change_listener is not None:
+        _change_listener(user_id, kind, details)
+
+# --- Completion History ---
+# Every change to a goal's completed flag is logged in goal_completions and
+# folded into goal_daily_stats and goal_streaks in the same transaction, so
+# stats never have to replay the raw events.
+STATS_WINDOWS = {'week': 7, 'month': 30}
+
+def _today():
+    return date.today().toordinal()
+
+def _record_completions(cur, user_id, events, day=None):
+    """
+    Log (goal_id, category, completed) events for today and update the rollups.
+    """
+    if not events:
+        return
+    day = _today() if day is None else day
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur.executemany('INSERT INTO goal_completions (goal_id, user_id, category, completed, day, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(goal_id, user_id, category, int(completed), day, created_at)
+                     for goal_id, category, completed in events])
+    cur.executemany('''INSERT INTO goal_daily_stats (goal_id, day, user_id, completed) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (goal_id, day) DO UPDATE SET completed = excluded.completed''',
+                    [(goal_id, day, user_id, int(completed)) for goal_id, _category, completed in events])
+
+    # A check today extends or starts a streak in O(1). An uncheck can split
+    # a streak, and so can a day older than the streak: rebuild those goals.
+    latest = {goal_id: completed for goal_id, _category, completed in events}
+    cur.executemany('''INSERT INTO goal_streaks (goal_id, user_id, current_streak, longest_streak, last_day)
+                       VALUES (?, ?, 1, 1, ?)
+                       ON CONFLICT (goal_id) DO UPDATE SET
+                           current_streak = CASE WHEN last_day = excluded.last_day THEN current_streak
+                                                 WHEN last_day = excluded.last_day - 1 THEN current_streak + 1
+                                                 ELSE 1 END,
+                           longest_streak = MAX(longest_streak,
+                                                CASE WHEN last_day = excluded.last_day THEN current_streak
+                                                     WHEN last_day = excluded.last_day - 1 THEN current_streak + 1
+                                                     ELSE 1 END),
+                           last_day = excluded.last_day
+                       WHERE excluded.last_day >= last_day''',
+                    [(goal_id, user_id, day) for goal_id, completed in latest.items() if completed])
+    stale = [goal_id for goal_id, completed in latest.items() if not completed]
+    if day < _today():  # no streak can run past today
+        stale += [row['goal_id'] for row in cur.execute(
+            'SELECT goal_id FROM goal_streaks WHERE user_id = ? AND last_day > ?', (user_id, day))
+            if row['goal_id'] in latest and latest[row['goal_id']]]
+    if stale:
+        _rebuild_streaks(cur, stale)
+
+def _rebuild_streaks(cur, goal_ids=None):
+    """
+    Recompute streaks from goal_daily_stats for some goals, or all of them.
+    Consecutive days share the same (day - row number), so each run of days
+    is one group; the newest run is the current streak.
+    """
+    scope, params = '', []
+    if goal_ids is not None:
+        scope = ' AND goal_id IN ({})'.format(', '.join('?' * len(goal_ids)))
+        params = list(goal_ids)
+    cur.execute('DELETE FROM goal_streaks WHERE true' + scope, params)
+    cur.execute('''INSERT INTO goal_streaks (goal_id, user_id, current_streak, longest_streak, last_day)
+                   SELECT goal_id, user_id, length, longest, end_day FROM (
+                       SELECT goal_id, user_id, length, end_day,
+                              MAX(length) OVER (PARTITION BY goal_id) AS longest,
+                              ROW_NUMBER() OVER (PARTITION BY goal_id ORDER BY end_day DESC) AS recency
+                       FROM (
+                           SELECT goal_id, user_id, COUNT(*) AS length, MAX(day) AS end_day
+                           FROM (
+                               SELECT goal_id, user_id, day,
+                                      day - ROW_NUMBER() OVER (PARTITION BY goal_id ORDER BY day) AS run
+                               FROM goal_daily_stats WHERE completed = 1''' + scope + ''')
+                           GROUP BY goal_id, run))
+                   WHERE recency = 1''', params)
+
+def rebuild_goal_stats():
+    """
+    Rebuild goal_daily_stats and goal_streaks from the raw completion events
+    with set-based statements. Returns the number of daily rows written.
+    """
+    return sum(_rebuild_goal_stats(conn) for conn in shard_connections())
+
+def _rebuild_goal_stats(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute('DELETE FROM goal_daily_stats')
+        # The last event of a day decides that day's state.
+        cur.execute('''INSERT INTO goal_daily_stats (goal_id, day, user_id, completed)
+                       SELECT goal_id, day, user_id, completed FROM (
+                           SELECT goal_id, day, user_id, completed,
+                                  ROW_NUMBER() OVER (PARTITION BY goal_id, day ORDER BY id DESC) AS position
+                           FROM goal_completions)
+                       WHERE position = 1''')
+        rows = cur.rowcount
+        _rebuild_streaks(cur)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return rows
+
+def get_goal_stats(user_id, category=None, today=None):
+    """
+    Streaks and completion rates for each of a user's goals. Each goal costs
+    one streak lookup plus a range count over at most 30 rollup rows.
+    """
+    today = _today() if today is None else today
+    conn = get_user_connection(user_id)
+    windows = ', '.join(
+        f'(SELECT COUNT(*) FROM goal_daily_stats d '
+        f'WHERE d.goal_id = g.id AND d.day > ? AND d.completed = 1) AS {name}_days'
+        for name in STATS_WINDOWS)
+    query = (f'SELECT g.id, g.category, g.text, s.current_streak, s.longest_streak, s.last_day, {windows} '
+             'FROM goals g LEFT JOIN goal_streaks s ON s.goal_id = g.id WHERE g.user_id = ?')
+    params = [today - days for days in STATS_WINDOWS.values()] + [user_id]
+    if category:
+        query += ' AND g.category = ?'
+        params.append(category)
+    query += ' ORDER BY g.category, g.sort_order'
+
+    stats = []
+    for row in conn.execute(query, params):
+        last_day = row['last_day']
+        # A streak stays alive until a whole day passes without a check.
+        alive = last_day is not None and last_day >= today - 1
+        stats.append({
+            'goal_id': row['id'],
+            'category': row['category'],
+            'text': row['text'],
+            'current_streak': row['current_streak'] if alive else 0,
+            'longest_streak': row['longest_streak'] or 0,
+            'last_completed': date.fromordinal(last_day).isoformat() if last_day else None,
+            **{f'{name}_rate': round(row[f'{name}_days'] / days, 4) for name, days in STATS_WINDOWS.items()},
+        })
+    return stats
 
 # --- Goal Management ---
 def get_goals_by_category(user_id, category):
-    conn = get_db_connection()
+    pending = _pending_goals(user_id).get(category)
+    if pending is not None:
+        return _pending_rows(pending[1])
+    conn = get_user_connection(user_id)
     return conn.execute(
         'SELECT id, text, completed FROM goals WHERE user_id = ? AND category = ? ORDER BY sort_order',
         (user_id, category)
     ).fetchall()
 
-def save_goals_for_category(user_id, category, goals):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM goals WHERE user_id = ? AND category = ?', (user_id, category))
+def get_goal_tuples(user_id, category):
+    """
+    get_goals_by_category as plain (id, text, completed) tuples: no
+    sqlite3.Row per goal, for callers that only serialize them.
+    """
+    pending = _pending_goals(user_id).get(category)
+    if pending is not None:
+        return _pending_tuples(pending[1])
+    cur = get_user_connection(user_id).cursor()
+    cur.row_factory = None
+    return cur.execute(
+        'SELECT id, text, completed FROM goals WHERE user_id = ? AND category = ? ORDER BY sort_order',
+        (user_id, category)
+    ).fetchall()
+
+def get_all_goals(user_id, categories=None):
+    """
+    Load a user's goals for several categories in one ordered scan and group
+    them by category. Every requested category is present in the result.
+    """
+    grouped = _grouped_goals(user_id, categories, plain=False)
+    for category, (_seq, goals) in _pending_goals(user_id).items():
+        if not categories or category in categories:
+            grouped[category] = _pending_rows(goals)
+    return grouped
+
+def get_all_goal_tuples(user_id, categories=None):
+    """get_all_goals with (id, text, completed) tuples instead of rows."""
+    grouped = _grouped_goals(user_id, categories, plain=True)
+    for category, (_seq, goals) in _pending_goals(user_id).items():
+        if not categories or category in categories:
+            grouped[category] = _pending_tuples(goals)
+    return grouped
+
+def _grouped_goals(user_id, categories, plain):
+    query = 'SELECT id, text, completed, category FROM goals WHERE user_id = ?'
+    params = [user_id]
+    if categories:
+        query += ' AND category IN ({})'.format(', '.join('?' * len(categories)))
+        params.extend(categories)
+    query += ' ORDER BY category, sort_order'
+
+    cur = get_user_connection(user_id).cursor()
+    grouped = {category: [] for category in categories or ()}
+    if plain:
+        cur.row_factory = None
+        for row in cur.execute(query, params):
+            grouped.setdefault(row[3], []).append(row[:3])
+    else:
+        for row in cur.execute(query, params):
+            grouped.setdefault(row['category'], []).append(row)
+    return grouped
+
+def save_goals_for_category(user_id, category, goals, commit=True):
+    """
+    Persist the full ordered goal list for a category.
+    The list is diffed against the stored rows (matched by id, then by text)
+    so only the goals that actually changed are written. With commit=False
+    the caller owns the transaction (used to batch write-behind flushes).
+    """
+    conn = get_user_connection(user_id)
+    existing = conn.execute(
+        'SELECT id, text, completed, sort_order FROM goals WHERE user_id = ? AND category = ?',
+        (user_id, category)
+    ).fetchall()
+    by_id = {row['id']: row for row in existing}
+    by_text = {}
+    for row in existing:
+        by_text.setdefault(row['text'], []).append(row['id'])
+
+    inserted, updated, reordered = [], [], []
     for index, goal in enumerate(goals):
-        cur.execute('''INSERT INTO goals (user_id, category, text, completed, sort_order) VALUES (?, ?, ?, ?, ?)''',
-                    (user_id, category, goal['text'], int(goal.get('completed', False)), index))
-    conn.commit()
+        text = goal['text']
+        completed = int(goal.get('completed', False))
+        row = by_id.pop(goal.get('id'), None)
+        while row is None and by_text.get(text):
+            row = by_id.pop(by_text[text].pop(0), None)
+        if row is None:
+            inserted.append({'text': text, 'completed': completed, 'sort_order': index})
+            continue
+        if row['text'] != text or row['completed'] != completed:
+            updated.append({'id': row['id'], 'text': text, 'completed': completed})
+        if row['sort_order'] != index:
+            reordered.append({'id': row['id'], 'sort_order': index})
+
+    apply_goal_changes(user_id, category, inserted=inserted, updated=updated,
+                       reordered=reordered, deleted=list(by_id), commit=commit)
     return 'Goals saved successfully.'
 
-def update_goal(goal_id, new_text, new_completed):
-    conn = get_db_connection()
-    conn.execute('UPDATE goals SET text = ?, completed = ? WHERE id = ?', (new_text, int(new_completed), goal_id))
+def apply_goal_changes(user_id, category, inserted=(), updated=(), reordered=(), deleted=(), commit=True):
+    """
+    Apply an incremental set of goal changes in a single transaction.
+    Every statement is scoped to the user and category, so ids that belong
+    elsewhere are ignored. Returns the ids assigned to the inserted goals.
+    """
+    conn = get_user_connection(user_id)
+    cur = conn.cursor()
+    inserted_ids = []
+    try:
+        if deleted:
+            cur.executemany('DELETE FROM goals WHERE id = ? AND user_id = ? AND category = ?',
+                            [(goal_id, user_id, category) for goal_id in deleted])
+        events = []
+        toggled = {goal['id']: int(goal['completed']) for goal in updated if goal.get('completed') is not None}
+        # Only the toggled rows are read, by primary key, so a toggle stays O(1)
+        # however long the list is.
+        for chunk in _chunks(toggled, 500):
+            events += [(row['id'], category, toggled[row['id']]) for row in cur.execute(
+                'SELECT id, completed FROM goals WHERE id IN ({}) AND user_id = ? AND category = ?'.format(
+                    ', '.join('?' * len(chunk))), chunk + [user_id, category])
+                if row['completed'] != toggled[row['id']]]
+        if updated:
+            cur.executemany('UPDATE goals SET text = COALESCE(?, text), completed = COALESCE(?, completed) '
+                            'WHERE id = ? AND user_id = ? AND category = ?',
+                            [(goal.get('text'),
+                              None if goal.get('completed') is None else int(goal['completed']),
+                              goal['id'], user_id, category) for goal in updated])
+        if reordered:
+            cur.executemany('UPDATE goals SET sort_order = ? WHERE id = ? AND user_id = ? AND category = ?',
+                            [(goal['sort_order'], goal['id'], user_id, category) for goal in reordered])
+        if inserted:
+            # Goals sent without a position go after the rest, in the order sent
+            # (a NULL sort_order would sort ahead of every ordered row).
+            next_order = cur.execute('SELECT COALESCE(MAX(sort_order), -1) + 1 FROM goals '
+                                     'WHERE user_id = ? AND category = ?', (user_id, category)).fetchone()[0]
+            rows = []
+            for goal in inserted:
+                sort_order = goal.get('sort_order')
+                if sort_order is None:
+                    sort_order, next_order = next_order, next_order + 1
+                rows.append((user_id, category, goal['text'], int(goal.get('completed', False)), sort_order))
+            cur.executemany('INSERT INTO goals (user_id, category, text, completed, sort_order) VALUES (?, ?, ?, ?, ?)',
+                            rows)
+            # AUTOINCREMENT ids only grow and we hold the write lock, so the newest
+            # rows for this user/category are exactly the ones just inserted.
+            cur.execute('SELECT id FROM goals WHERE user_id = ? AND category = ? ORDER BY id DESC LIMIT ?',
+                        (user_id, category, len(inserted)))
+            inserted_ids = [row['id'] for row in reversed(cur.fetchall())]
+            events += [(goal_id, category, 1) for goal_id, goal in zip(inserted_ids, inserted)
+                       if goal.get('completed')]
+        _record_completions(cur, user_id, events)
+        changed = bool(deleted or updated or reordered or inserted)
+        if changed:
+            _bump_goal_version(cur, user_id, category)
+        if commit:
+            conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    # Uncommitted batches are announced by whoever commits them (write_behind).
+    if commit and changed:
+        notify_change(user_id, 'goals', categories=[category])
+    return inserted_ids
+
+def _goal_connection(user_id):
+    # Goal ids are only unique within a shard, so id-only writes need the owner.
+    if user_id is None:
+        if SHARD_COUNT > 0:
+            raise ValueError('user_id is required to find a goal when sharded')
+        return get_db_connection()
+    return get_user_connection(user_id)
+
+def update_goal(goal_id, new_text, new_completed, user_id=None):
+    conn = _goal_connection(user_id)
+    cur = conn.cursor()
+    goal = cur.execute('SELECT user_id, category, completed FROM goals WHERE id = ?', (goal_id,)).fetchone()
+    cur.execute('UPDATE goals SET text = ?, completed = ? WHERE id = ?', (new_text, int(new_completed), goal_id))
+    if goal is not None and goal['completed'] != int(new_completed):
+        _record_completions(cur, goal['user_id'], [(goal_id, goal['category'], int(new_completed))])
+    _bump_goal_version_for_goal(cur, goal_id)
     conn.commit()
+    if goal is not None:
+        notify_change(goal['user_id'], 'goals', categories=[goal['category']])
     return 'Goal updated successfully.'
 
-def toggle_goal_completion(goal_id):
-    conn = get_db_connection()
-    conn.execute('UPDATE goals SET completed = 1 - completed WHERE id = ?', (goal_id,))
+def toggle_goal_completion(goal_id, user_id=None):
+    conn = _goal_connection(user_id)
+    cur = conn.cursor()
+    cur.execute('UPDATE goals SET completed = 1 - completed WHERE id = ?', (goal_id,))
+    goal = cur.execute('SELECT user_id, category, completed FROM goals WHERE id = ?', (goal_id,)).fetchone()
+    if goal is not None:
+        _record_completions(cur, goal['user_id'], [(goal_id, goal['category'], goal['completed'])])
+    _bump_goal_version_for_goal(cur, goal_id)
     conn.commit()
+    if goal is not None:
+        notify_change(goal['user_id'], 'goals', categories=[goal['category']])
     return 'Goal completion toggled.'
 
 def reset_all_goals(user_id):
     """
-    Completely remove all goals for the given user.
+    Completely remove all goals for the given user. Completion history is kept.
     """
-    conn = get_db_connection()
+    conn = get_user_connection(user_id)
+    categories = [row[0] for row in conn.execute('SELECT DISTINCT category FROM goals WHERE user_id = ?', (user_id,))]
     conn.execute('DELETE FROM goals WHERE user_id = ?', (user_id,))
+    conn.execute('UPDATE goal_versions SET version = version + 1 WHERE user_id = ?', (user_id,))
     conn.commit()
+    if categories:
+        notify_change(user_id, 'goals', categories=categories)
     return 'All goals reset successfully.'
 
 # --- Notification Management ---
+NOTIFICATION_PAGE_SIZE = 20
+NOTIFICATION_RETENTION = int(os.getenv('NOTIFICATION_RETENTION', 500))
+
+def notification_message_hash(message):
+    """
+    Stable signed 64-bit hash of a message, used for the per-user dedupe index.
+    """
+    return int.from_bytes(hashlib.blake2b(message.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
 def create_notification(user_id, message, time=None):
     if time is None:
         time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    existing = get_notifications(user_id)
-    if any(note['message'] == message for note in existing):
-        return 'Notification already exists.'
-    conn = get_db_connection()
-    conn.execute('INSERT INTO notifications (user_id, message, time) VALUES (?, ?, ?)',
-                 (user_id, message, time))
+    conn = get_user_connection(user_id)
+    cur = conn.execute(
+        'INSERT OR IGNORE INTO notifications (user_id, message, time, message_hash) VALUES (?, ?, ?, ?)',
+        (user_id, message, time, notification_message_hash(message))
+    )
     conn.commit()
+    if cur.rowcount == 0:
+        return 'Notification already exists.'
+    notify_change(user_id, 'notifications', action='created', message=message, time=time)
     return 'Notification created.'
 
-def get_notifications(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM notifications WHERE user_id = ? ORDER BY id DESC', (user_id,))
-    return [{'id': row['id'], 'message': row['message'], 'time': row['time']} for row in cur.fetchall()]
+def get_notifications(user_id, before_id=None, limit=NOTIFICATION_PAGE_SIZE):
+    """
+    Newest-first page of a user's notifications. Pass the last id of a page
+    as `before_id` to get the next one; `limit=None` returns everything.
+    """
+    conn = get_user_connection(user_id)
+    query = 'SELECT id, message, time FROM notifications WHERE user_id = ?'
+    params = [user_id]
+    if before_id is not None:
+        query += ' AND id < ?'
+        params.append(before_id)
+    query += ' ORDER BY id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return [{'id': row['id'], 'message': row['message'], 'time': row['time']}
+            for row in conn.execute(query, params)]
+
+def trim_notifications(max_per_user=None):
+    """
+    Retention job: keep only the newest `max_per_user` notifications for
+    every user. Returns the number of rows removed.
+    """
+    max_per_user = NOTIFICATION_RETENTION if max_per_user is None else max_per_user
+    removed = 0
+    for conn in shard_connections():
+        cur = conn.execute(
+            '''DELETE FROM notifications WHERE id IN (
+                   SELECT id FROM (
+                       SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) AS position
+                       FROM notifications)
+                   WHERE position > ?)''',
+            (max_per_user,)
+        )
+        conn.commit()
+        removed += cur.rowcount
+    return removed
 
 def delete_notification(notification_id, user_id):
-    conn = get_db_connection()
+    conn = get_user_connection(user_id)
     conn.execute('DELETE FROM notifications WHERE id = ? AND user_id = ?', (notification_id, user_id))
     conn.commit()
+    notify_change(user_id, 'notifications', action='deleted', id=notification_id)
     return 'Notification deleted.'
 
 def clear_notifications(user_id):
-    conn = get_db_connection()
+    conn = get_user_connection(user_id)
     conn.execute('DELETE FROM notifications WHERE user_id = ?', (user_id,))
     conn.commit()
+    notify_change(user_id, 'notifications', action='cleared')
     return 'All notifications cleared.'
 
+# --- Reminder Management ---
+def set_reminder(user_id, category, message, interval_seconds, first_fire_at):
+    """
+    Create, replace or re-enable the user's reminder for a category. It
+    first fires at `first_fire_at` (unix seconds) and then every `interval_seconds`.
+    """
+    conn = get_user_connection(user_id)
+    conn.execute(
+        '''INSERT INTO reminders (user_id, category, message, interval_seconds, anchor_at, next_fire_at)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (user_id, category) DO UPDATE SET
+               message = excluded.message, interval_seconds = excluded.interval_seconds,
+               anchor_at = excluded.anchor_at, next_fire_at = excluded.next_fire_at, enabled = 1''',
+        (user_id, category, message, int(interval_seconds), int(first_fire_at), int(first_fire_at))
+    )
+    conn.commit()
+    return 'Reminder saved.'
+
+def get_reminders(user_id):
+    """Every reminder the user has configured, including those switched off."""
+    conn = get_user_connection(user_id)
+    return [{**row, 'enabled': bool(row['enabled'])} for row in map(dict, conn.execute(
+        'SELECT category, message, interval_seconds, next_fire_at, enabled FROM reminders '
+        'WHERE user_id = ? ORDER BY category', (user_id,)))]
+
+def disable_reminder(user_id, category, message, interval_seconds):
+    """
+    Switch the category's reminder off. The row is kept (created disabled if
+    there was none), so the choice is remembered rather than reset to the
+    default; `message` and `interval_seconds` only fill in a new row.
+    """
+    conn = get_user_connection(user_id)
+    conn.execute(
+        '''INSERT INTO reminders (user_id, category, message, interval_seconds, anchor_at, next_fire_at, enabled)
+           VALUES (?, ?, ?, ?, 0, 0, 0)
+           ON CONFLICT (user_id, category) DO UPDATE SET enabled = 0''',
+        (user_id, category, message, int(interval_seconds)))
+    conn.commit()
+    return 'Reminder disabled.'
+
+def next_reminder_due():
+    """
+    The earliest next_fire_at of any reminder, or None; one index probe per shard.
+    """
+    due = [conn.execute('SELECT MIN(next_fire_at) FROM reminders WHERE enabled = 1').fetchone()[0]
+           for conn in shard_connections()]
+    return min((value for value in due if value is not None), default=None)
+
+def fire_due_reminders(now, limit=500, jitter=0, rng=random):
+    """
+    Turn up to `limit` reminders due at `now` into notifications and move each
+    to its next slot after `now`, plus up to `jitter` seconds so reminders
+    sharing a slot don't all land on the same second. Returns the number fired.
+    """
+    fired = 0
+    for conn in shard_connections():
+        if fired >= limit:
+            break
+        fired += _fire_due_reminders(conn, now, limit - fired, jitter, rng)
+    return fired
+
+def _fire_due_reminders(conn, now, limit, jitter, rng):
+    # IMMEDIATE takes the write lock before reading, so schedulers in several
+    # processes never claim the same reminder twice.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        due = conn.execute(
+            'SELECT id, user_id, message, interval_seconds, anchor_at, next_fire_at FROM reminders '
+            'WHERE enabled = 1 AND next_fire_at <= ? ORDER BY next_fire_at LIMIT ?', (now, limit)
+        ).fetchall()
+        fired_at = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        notifications, schedule = [], []
+        for row in due:
+            # The slot date keeps each day's message distinct for the dedupe index.
+            slot = datetime.fromtimestamp(row['next_fire_at'])
+            message = f"{row['message']} ({slot:%Y-%m-%d})"
+            notifications.append((row['user_id'], message, fired_at, notification_message_hash(message)))
+            periods = (now - row['anchor_at']) // row['interval_seconds'] + 1
+            next_fire = row['anchor_at'] + periods * row['interval_seconds'] + int(rng.uniform(0, jitter))
+            schedule.append((next_fire, row['id']))
+        conn.executemany(
+            'INSERT OR IGNORE INTO notifications (user_id, message, time, message_hash) VALUES (?, ?, ?, ?)',
+            notifications)
+        conn.executemany('UPDATE reminders SET next_fire_at = ? WHERE id = ?', schedule)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    for user_id, message, _fired_at, _hash in notifications:
+        notify_change(user_id, 'notifications', action='created', message=message, time=fired_at)
+    return len(due)
+
+# --- Bulk Import / Export ---
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+
+def _iter_batches(conn, query, params, batch_size):
+    # One cursor stepped with fetchmany, so only a batch of rows is in memory.
+    cur = conn.execute(query, params)
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cur.close()
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_goals(user_id, batch_size=None):
+    """
+    Yield a user's goals in batches, category by category in display order.
+    """
+    return _iter_batches(
+        get_user_connection(user_id),
+        'SELECT id, category, text, completed, sort_order FROM goals WHERE user_id = ? ORDER BY category, sort_order',
+        (user_id,), batch_size or EXPORT_BATCH_SIZE)
+
+def iter_notifications(user_id, batch_size=None):
+    """
+    Yield a user's notifications in batches, oldest first.
+    """
+    return _iter_batches(
+        get_user_connection(user_id),
+        'SELECT id, message, time FROM notifications WHERE user_id = ? ORDER BY id',
+        (user_id,), batch_size or EXPORT_BATCH_SIZE)
+
+def import_goals(user_id, goals, chunk_size=None):
+    """
+    Append goals ({'category', 'text', 'completed'}) from any iterable, after
+    the existing goals of each category and in the order given. Every chunk is
+    inserted and committed on its own; yields (processed, imported) after each.
+    Raises ValueError on an invalid goal; earlier chunks stay committed.
+    """
+    conn = get_user_connection(user_id)
+    next_order = {row['category']: row['next'] for row in conn.execute(
+        'SELECT category, MAX(sort_order) + 1 AS next FROM goals WHERE user_id = ? GROUP BY category',
+        (user_id,))}
+    processed = 0
+    touched = set()
+    try:
+        for chunk in _chunks(goals, chunk_size or IMPORT_CHUNK_SIZE):
+            params = []
+            for goal in chunk:
+                processed += 1
+                category, text = goal.get('category'), goal.get('text')
+                if not category or not isinstance(category, str) or not isinstance(text, str):
+                    raise ValueError(f'Goal {processed} needs a category and text')
+                position = next_order.get(category) or 0
+                next_order[category] = position + 1
+                params.append((user_id, category, text, int(parse_bool(goal.get('completed', False))), position))
+            try:
+                conn.executemany('INSERT INTO goals (user_id, category, text, completed, sort_order) '
+                                 'VALUES (?, ?, ?, ?, ?)', params)
+                cur = conn.cursor()
+                for category in {row[1] for row in params}:
+                    _bump_goal_version(cur, user_id, category)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            touched.update(row[1] for row in params)
+            yield processed, processed
+    finally:
+        # One event for the whole import, covering the chunks that committed.
+        if touched:
+            notify_change(user_id, 'goals', categories=sorted(touched))
+
+def import_notifications(user_id, notifications, chunk_size=None):
+    """
+    Insert notifications ({'message', 'time'}) from any iterable in committed
+    chunks, skipping messages the user already has. Yields (processed, imported)
+    after each chunk. Raises ValueError on an invalid notification.
+    """
+    conn = get_user_connection(user_id)
+    processed = imported = 0
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for chunk in _chunks(notifications, chunk_size or IMPORT_CHUNK_SIZE):
+        params = []
+        for notification in chunk:
+            processed += 1
+            message = notification.get('message')
+            if not message or not isinstance(message, str):
+                raise ValueError(f'Notification {processed} needs a message')
+            params.append((user_id, message, notification.get('time') or now, notification_message_hash(message)))
+        try:
+            cur = conn.executemany(
+                'INSERT OR IGNORE INTO notifications (user_id, message, time, message_hash) VALUES (?, ?, ?, ?)',
+                params)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        imported += cur.rowcount
+        yield processed, imported
+
+# --- Email Outbox ---
+# Mail is queued here and sent by a background dispatcher, never inline.
+EMAIL_DIGEST_MAX_ITEMS = 50
+
+def get_user_settings(user_id):
+    conn = get_user_connection(user_id)
+    row = conn.execute('SELECT theme, email_notifications, push_notifications FROM user_settings WHERE user_id = ?',
+                       (user_id,)).fetchone()
+    if row is None:
+        return {'theme': 'light', 'email_notifications': 1, 'push_notifications': 0}
+    return dict(row)
+
+def update_notification_settings(user_id, email_notifications, push_notifications):
+    conn = get_user_connection(user_id)
+    conn.execute('''INSERT INTO user_settings (user_id, email_notifications, push_notifications) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        email_notifications = excluded.email_notifications,
+                        push_notifications = excluded.push_notifications''',
+                 (user_id, int(email_notifications), int(push_notifications)))
+    conn.commit()
+    return 'Notification settings saved.'
+
+def enqueue_email(recipient, subject, body, kind='notification', user_id=None, now=None, expires_at=None):
+    """
+    Queue a message for the dispatcher. Mail still queued after `expires_at`
+    (e.g. a short-lived reset code) is dropped instead of sent late.
+    """
+    now = int(time.time() if now is None else now)
+    conn = get_db_connection()
+    cur = conn.execute(
+        '''INSERT INTO email_outbox (user_id, kind, recipient, domain, subject, body, next_attempt_at, expires_at,
+                                     created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (user_id, kind, recipient, recipient.rpartition('@')[2].lower(), subject, body, now, expires_at, now)
+    )
+    conn.commit()
+    return cur.lastrowid
+
+def claim_digest_run(now, interval):
+    """
+    Record a digest run at `now` if the last one was at least `interval`
+    seconds ago. Returns (claimed, next run time); only one caller claims
+    each run. The first call starts the clock without claiming.
+    """
+    conn = get_db_connection()
+    conn.execute('INSERT OR IGNORE INTO email_digest_runs (id, last_run_at) VALUES (1, ?)', (now,))
+    claimed = conn.execute('UPDATE email_digest_runs SET last_run_at = ? WHERE id = 1 AND last_run_at <= ?',
+                           (now, now - interval)).rowcount == 1
+    last_run_at = conn.execute('SELECT last_run_at FROM email_digest_runs WHERE id = 1').fetchone()[0]
+    conn.commit()
+    return claimed, last_run_at + interval
+
+def next_email_due():
+    conn = get_db_connection()
+    return conn.execute("SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'").fetchone()[0]
+
+def claim_due_emails(now, limit=100, lease_seconds=300):
+    """
+    Take up to `limit` due messages, pushing their next attempt `lease_seconds`
+    out so another dispatcher won't pick them up while they are being sent.
+    Expired messages are marked failed instead of returned.
+    """
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(
+            "SELECT id, user_id, kind, recipient, domain, subject, body, attempts, expires_at FROM email_outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?", (now, limit)
+        ).fetchall()
+        expired = [row['id'] for row in rows if row['expires_at'] is not None and row['expires_at'] <= now]
+        claimed = [dict(row) for row in rows if row['id'] not in expired]
+        conn.executemany("UPDATE email_outbox SET status = 'failed', last_error = 'expired' WHERE id = ?",
+                         [(email_id,) for email_id in expired])
+        conn.executemany('UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?',
+                         [(now + lease_seconds, email['id']) for email in claimed])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return claimed
+
+def record_email_results(now, sent=(), retry=(), failed=(), deferred=()):
+    """
+    Store the outcome of a dispatch batch in one transaction.
+    sent: ids; retry: (id, error, next_attempt_at); failed: (id, error);
+    deferred: (id, next_attempt_at) for rate-limited mail, which costs no attempt.
+    """
+    conn = get_db_connection()
+    try:
+        conn.executemany("UPDATE email_outbox SET status = 'sent', attempts = attempts + 1, sent_at = ? WHERE id = ?",
+                         [(now, email_id) for email_id in sent])
+        conn.executemany('UPDATE email_outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? '
+                         'WHERE id = ?', [(error, next_at, email_id) for email_id, error, next_at in retry])
+        conn.executemany("UPDATE email_outbox SET status = 'failed', attempts = attempts + 1, last_error = ? "
+                         "WHERE id = ?", [(error, email_id) for email_id, error in failed])
+        conn.executemany('UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?',
+                         [(next_at, email_id) for email_id, next_at in deferred])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def queue_notification_digests(now=None):
+    """
+    Queue one email per user listing the notifications they got since their
+    last digest. Deleted users and those with email_notifications off are
+    skipped, but their bookmarks still advance. Returns the number queued.
+    """
+    now = int(time.time() if now is None else now)
+    return sum(_queue_notification_digests(conn, now) for conn in shard_connections())
+
+def _queue_notification_digests(conn, now):
+    # Hold the shard's write lock from the read on, so concurrent runs can't
+    # both pick up the same notifications.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(
+            '''SELECT n.user_id, n.id, n.message, COALESCE(s.email_notifications, 1) AS wanted
+               FROM notifications n
+               LEFT JOIN user_settings s ON s.user_id = n.user_id
+               LEFT JOIN email_digest_state d ON d.user_id = n.user_id
+               WHERE n.id > COALESCE(d.last_notification_id, 0)
+               ORDER BY n.user_id, n.id''').fetchall()
+        # Users live in the directory, which may be another file.
+        directory = get_db_connection()
+        user_ids = sorted({row['user_id'] for row in rows})
+        emails = {}
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
+            emails.update(directory.execute(
+                f'SELECT id, email FROM users WHERE id IN ({",".join("?" * len(chunk))}) AND deleted_at IS NULL',
+                chunk).fetchall())
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    digests, bookmarks = [], []
+    user_id = email = None
+    messages, last_id, wanted = [], 0, False
+
+    def flush():
+        # Every bookmark moves, even for deleted or opted-out users, so their
+        # notifications aren't scanned again on the next run.
+        if user_id is None:
+            return
+        bookmarks.append((user_id, last_id))
+        if wanted and email:
+            lines = [f'- {message}' for message in messages[:EMAIL_DIGEST_MAX_ITEMS]]
+            if len(messages) > EMAIL_DIGEST_MAX_ITEMS:
+                lines.append(f'...and {len(messages) - EMAIL_DIGEST_MAX_ITEMS} more.')
+            digests.append((user_id, 'digest', email, email.rpartition('@')[2].lower(),
+                            f'You have {len(messages)} new notification{"s" if len(messages) != 1 else ""}',
+                            'Here is what happened since your last update:\n\n' + '\n'.join(lines),
+                            now, now))
+
+    for row in rows:
+        if row['user_id'] != user_id:
+            flush()
+            user_id, email, wanted, messages = row['user_id'], emails.get(row['user_id']), row['wanted'], []
+        messages.append(row['message'])
+        last_id = row['id']
+    flush()
+
+    try:
+        directory.executemany('''INSERT INTO email_outbox (user_id, kind, recipient, domain, subject, body,
+                                                           next_attempt_at, created_at)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', digests)
+        if directory is not conn:
+            # Outbox first: a crash in between re-sends a digest rather than losing one.
+            directory.commit()
+        conn.executemany('''INSERT INTO email_digest_state (user_id, last_notification_id) VALUES (?, ?)
+                            ON CONFLICT (user_id) DO UPDATE SET last_notification_id = excluded.last_notification_id''',
+                         bookmarks)
+        conn.commit()
+    except sqlite3.Error:
+        directory.rollback()
+        conn.rollback()
+        raise
+    return len(digests)
+
+def purge_email_outbox(older_than):
+    """
+    Delete sent and failed mail created before `older_than` (unix seconds).
+    """
+    conn = get_db_connection()
+    cur = conn.execute("DELETE FROM email_outbox WHERE status != 'pending' AND created_at < ?", (older_than,))
+    conn.commit()
+    return cur.rowcount
+
+# --- Session Store ---
+def load_session(session_id, now):
+    """Return (data, expires_at) for an unexpired session, else None."""
+    row = get_db_connection().execute(
+        'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?', (session_id, now)).fetchone()
+    return (row['data'], row['expires_at']) if row else None
+
+def save_session(session_id, data, expires_at):
+    conn = get_db_connection()
+    conn.execute('INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) '
+                 'ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+                 (session_id, data, expires_at))
+    conn.commit()
+
+def touch_session(session_id, expires_at):
+    conn = get_db_connection()
+    conn.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, session_id))
+    conn.commit()
+
+def delete_session(session_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+    conn.commit()
+
+def purge_expired_sessions(now=None, limit=1000):
+    """
+    Delete up to `limit` sessions that expired by `now` (unix seconds), oldest
+    first, so a sweep never holds the write lock for long. Returns the count.
+    """
+    now = int(time.time() if now is None else now)
+    conn = get_db_connection()
+    cur = conn.execute('DELETE FROM sessions WHERE id IN '
+                       '(SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?)', (now, limit))
+    conn.commit()
+    return cur.rowcount
+
+# --- Rate Limits ---
+def take_rate_limit_token(key, requests, per, now):
+    """
+    Atomically refill the shared bucket for `key` and take a token from it.
+    Returns False (leaving the bucket untouched) when none is available.
+    """
+    conn = get_db_connection()
+    row = conn.execute(
+        'INSERT INTO rate_limits (key, tokens, updated_at) VALUES (?1, ?2 - 1, ?4) '
+        'ON CONFLICT (key) DO UPDATE SET tokens = MIN(?2, tokens + (?4 - updated_at) * ?2 / ?3) - 1, updated_at = ?4 '
+        'WHERE MIN(?2, tokens + (?4 - updated_at) * ?2 / ?3) >= 1 '
+        'RETURNING tokens', (key, requests, per, now)).fetchone()
+    conn.commit()
+    return row is not None
+
+def purge_rate_limits(idle_since):
+    """Delete buckets untouched since `idle_since`; they would be full again anyway."""
+    conn = get_db_connection()
+    cur = conn.execute('DELETE FROM rate_limits WHERE updated_at < ?', (idle_since,))
+    conn.commit()
+    return cur.rowcount
+
+# --- Database Maintenance ---
+# Only the newest row per (user, token name) is kept past this age.
+TOKEN_RETENTION_DAYS = int(os.getenv('TOKEN_RETENTION_DAYS', 90))
+
+def purge_expired_reset_tokens(now=None):
+    """Clear reset tokens that expired by `now` (unix seconds). Returns the count."""
+    now = int(time.time() if now is None else now)
+    conn = get_db_connection()
+    user_ids = [row[0] for row in conn.execute(
+        'UPDATE users SET reset_token = NULL, reset_token_expires_at = NULL '
+        'WHERE reset_token IS NOT NULL AND reset_token_expires_at <= ? RETURNING id', (now,)).fetchall()]
+    conn.commit()
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return len(user_ids)
+
+def purge_stale_tokens(older_than, batch_size=1000):
+    """
+    Delete `tokens` rows created before `older_than` (unix seconds), except
+    the newest one per user and token name, a batch per transaction. Each
+    run walks the created_at index once; whether a newer row exists is one
+    seek into idx_tokens_user_name per candidate.
+    """
+    conn = get_db_connection()
+    total = 0
+    position = (-1, 0)  # (created_at, id) of the last row looked at
+    while True:
+        rows = conn.execute(
+            '''SELECT created_at, id FROM tokens t
+               WHERE created_at < ? AND (created_at, id) > (?, ?)
+               AND EXISTS (SELECT 1 FROM tokens n WHERE n.user_id = t.user_id
+                           AND n.token_name = t.token_name AND n.created_at > t.created_at)
+               ORDER BY created_at, id LIMIT ?''', (older_than, *position, batch_size)).fetchall()
+        if rows:
+            position = tuple(rows[-1])
+            conn.execute('DELETE FROM tokens WHERE id IN ({})'.format(', '.join('?' * len(rows))),
+                         [row[1] for row in rows])
+            conn.commit()
+            total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+def reclaim_free_pages(max_pages=None):
+    """
+    Return up to `max_pages` (default: all) free pages per database file to
+    the filesystem. Needs auto_vacuum=INCREMENTAL; see enable_incremental_vacuum.
+    Returns (pages reclaimed, free pages left), summed over every file.
+    """
+    reclaimed = left = 0
+    for conn in all_connections():
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            left += before
+            continue
+        # executescript steps the pragma to completion; execute() would free only one page.
+        conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages or 0)})')
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        reclaimed, left = reclaimed + before - after, left + after
+    return reclaimed, left
+
+def enable_incremental_vacuum():
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL. This rewrites the
+    whole file under an exclusive lock, so run it offline.
+    Returns the page count before and after, summed over every file.
+    """
+    before = after = 0
+    for conn in all_connections():
+        before += conn.execute('PRAGMA page_count').fetchone()[0]
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        after += conn.execute('PRAGMA page_count').fetchone()[0]
+    return before, after
+
+def run_maintenance(now=None, vacuum_pages=1000):
+    """
+    Purge expired reset tokens and stale token rows, trim notifications to
+    NOTIFICATION_RETENTION per user, refresh the planner statistics and
+    reclaim up to `vacuum_pages` free pages. Returns a report.
+    """
+    now = int(time.time() if now is None else now)
+    report = {
+        'expired_reset_tokens': purge_expired_reset_tokens(now),
+        'stale_tokens': purge_stale_tokens(now - TOKEN_RETENTION_DAYS * 24 * 60 * 60),
+        'trimmed_notifications': trim_notifications(),
+    }
+    for conn in all_connections():
+        conn.execute('PRAGMA optimize')
+    report['pages_reclaimed'], report['free_pages'] = reclaim_free_pages(vacuum_pages)
+    report['page_count'] = sum(conn.execute('PRAGMA page_count').fetchone()[0] for conn in all_connections())
+    return report
+
+# --- Shard Rebalancing ---
+USER_TABLES = ('goals', 'goal_versions', 'goal_completions', 'goal_daily_stats', 'goal_streaks',
+               'notifications', 'reminders', 'user_settings', 'email_digest_state')
+
+def rebalance_shards(from_count):
+    """
+    Move every user whose rows sit in the wrong file for SHARD_COUNT, reading
+    the layout `from_count` shards left behind. Run it with the app stopped.
+    Each user is copied in one transaction and only then deleted from the
+    old file, so an interrupted run can simply be repeated. Goal and
+    notification ids are reassigned; the history of already deleted goals
+    is dropped. Returns the number of users moved.
+    """
+    moved = 0
+    for source_path in shard_paths(from_count):
+        if not os.path.exists(source_path):
+            continue
+        source_pool = get_pool(source_path)
+        source = source_pool.acquire()
+        try:
+            _init_schema(source)
+            user_ids = [row[0] for row in source.execute(
+                ' UNION '.join(f'SELECT user_id FROM {table}' for table in USER_TABLES))]
+            for user_id in user_ids:
+                target_path = user_path(user_id)
+                if target_path == source_path:
+                    continue
+                target_pool = get_pool(target_path)
+                target = target_pool.acquire()
+                try:
+                    _copy_user(source, target, user_id)
+                finally:
+                    target_pool.release(target)
+                for table in USER_TABLES:
+                    source.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+                source.commit()
+                moved += 1
+        finally:
+            source_pool.release(source)
+    return moved
+
+def _copy_user(source, target, user_id):
+    """Replace the user's rows in `target` with those in `source`, in one transaction."""
+    target.execute('BEGIN IMMEDIATE')
+    try:
+        for table in USER_TABLES:
+            target.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+
+        goal_ids = {}
+        for row in source.execute('SELECT id, category, text, completed, sort_order FROM goals '
+                                  'WHERE user_id = ? ORDER BY id', (user_id,)):
+            goal_ids[row['id']] = target.execute(
+                'INSERT INTO goals (user_id, category, text, completed, sort_order) VALUES (?, ?, ?, ?, ?)',
+                (user_id, row['category'], row['text'], row['completed'], row['sort_order'])).lastrowid
+        target.executemany(
+            'INSERT INTO goal_completions (goal_id, user_id, category, completed, day, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(goal_ids[row['goal_id']], user_id, row['category'], row['completed'], row['day'], row['created_at'])
+             for row in source.execute('SELECT * FROM goal_completions WHERE user_id = ? ORDER BY id', (user_id,))
+             if row['goal_id'] in goal_ids])
+        target.executemany(
+            'INSERT INTO goal_daily_stats (goal_id, day, user_id, completed) VALUES (?, ?, ?, ?)',
+            [(goal_ids[row['goal_id']], row['day'], user_id, row['completed'])
+             for row in source.execute('SELECT * FROM goal_daily_stats WHERE user_id = ?', (user_id,))
+             if row['goal_id'] in goal_ids])
+        target.executemany(
+            'INSERT INTO goal_streaks (goal_id, user_id, current_streak, longest_streak, last_day) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(goal_ids[row['goal_id']], user_id, row['current_streak'], row['longest_streak'], row['last_day'])
+             for row in source.execute('SELECT * FROM goal_streaks WHERE user_id = ?', (user_id,))
+             if row['goal_id'] in goal_ids])
+        # Ids changed, so bump the versions to invalidate clients' ETags.
+        target.executemany(
+            'INSERT INTO goal_versions (user_id, category, version) VALUES (?, ?, ?)',
+            [(user_id, row['category'], row['version'] + 1)
+             for row in source.execute('SELECT * FROM goal_versions WHERE user_id = ?', (user_id,))])
+
+        bookmark = source.execute('SELECT last_notification_id FROM email_digest_state WHERE user_id = ?',
+                                  (user_id,)).fetchone()
+        new_bookmark = 0
+        for row in source.execute('SELECT id, message, time, message_hash FROM notifications '
+                                  'WHERE user_id = ? ORDER BY id', (user_id,)):
+            new_id = target.execute(
+                'INSERT INTO notifications (user_id, message, time, message_hash) VALUES (?, ?, ?, ?)',
+                (user_id, row['message'], row['time'], row['message_hash'])).lastrowid
+            if bookmark is not None and row['id'] <= bookmark[0]:
+                new_bookmark = new_id
+        if bookmark is not None:
+            target.execute('INSERT INTO email_digest_state (user_id, last_notification_id) VALUES (?, ?)',
+                           (user_id, new_bookmark))
+
+        target.executemany(
+            'INSERT INTO reminders (user_id, category, message, interval_seconds, anchor_at, next_fire_at, enabled) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(user_id, row['category'], row['message'], row['interval_seconds'], row['anchor_at'],
+              row['next_fire_at'], row['enabled'])
+             for row in source.execute('SELECT * FROM reminders WHERE user_id = ?', (user_id,))])
+        target.executemany(
+            'INSERT INTO user_settings (user_id, theme, email_notifications, push_notifications) VALUES (?, ?, ?, ?)',
+            [(user_id, row['theme'], row['email_notifications'], row['push_notifications'])
+             for row in source.execute('SELECT * FROM user_settings WHERE user_id = ?', (user_id,))])
+        target.commit()
+    except sqlite3.Error:
+        target.rollback()
+        raise
+
 # --- Email Credential Access ---
 def get_email_credentials():
     email = os.environ.get("EMAIL_USERNAME")
@@ -290,4 +1870,6 @@ if __name__ == "__main__":
     init_app(app)
     with app.app_context():
         init_db()
+        for conn in all_connections():
+            verify_query_plans(conn)
         print("Database initialized.")
\ No newline at end of file
@@ -0,0 +1,184 @@
+import os
+import random
+import smtplib
+import threading
+import time
+
+from flask import current_app
+
+import dataservice
+
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain: `rate` messages per `per` seconds, bursting to `rate`."""
+
+    def __init__(self, rate, per=60.0):
+        self.rate = rate
+        self.per = per
+        self._buckets = {}
+
+    def acquire(self, domain, now):
+        """Take a token; returns 0 on success, otherwise seconds until one frees up."""
+        tokens, updated = self._buckets.get(domain, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - updated) * self.rate / self.per)
+        if tokens >= 1:
+            self._buckets[domain] = (tokens - 1, now)
+            return 0
+        self._buckets[domain] = (tokens, now)
+        return (1 - tokens) * self.per / self.rate
+
+
+class EmailDispatcher:
+    """
+    Sends queued mail from the email_outbox table on one background thread.
+    Each pass claims due messages in batches and sends them all over a single
+    SMTP connection. Mail to a domain over its rate limit is deferred.
+    Temporary failures retry with exponential backoff and jitter; permanent
+    (5xx) rejections and mail that exhausts `max_attempts` are marked failed.
+    """
+
+    def __init__(self, app, mail, clock=time.time, batch_size=100, domain_rate=60, max_attempts=5,
+                 backoff_base=30, backoff_max=3600, max_sleep=60, digest_interval=24 * 60 * 60, rng=None):
+        self.app = app
+        self.mail = mail
+        self.clock = clock
+        self.batch_size = batch_size
+        self.limiter = DomainRateLimiter(domain_rate)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_sleep = max_sleep
+        self.digest_interval = digest_interval
+        self.rng = rng or random.Random()
+        self._next_digest = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay + self.rng.uniform(0, delay / 2)
+
+    def _message(self, email):
+        from flask_mail import Message
+        return Message(subject=email['subject'], recipients=[email['recipient']], body=email['body'])
+
+    def run_pending(self, now=None):
+        """Send everything due at `now`. Returns the number of messages sent."""
+        now = int(self.clock() if now is None else now)
+        sent_total = 0
+        with self.app.app_context():
+            if self.digest_interval and (self._next_digest is None or now >= self._next_digest):
+                # The last run time lives in the database, so a restart doesn't
+                # push the next digest back and only one worker sends each run.
+                claimed, self._next_digest = dataservice.claim_digest_run(now, self.digest_interval)
+                if claimed:
+                    dataservice.queue_notification_digests(now)
+
+            batch = dataservice.claim_due_emails(now, self.batch_size)
+            if not batch:
+                return 0
+            with self.mail.connect() as connection:
+                while batch:
+                    sent_total += self._send_batch(connection, batch, now)
+                    if len(batch) < self.batch_size:
+                        break
+                    batch = dataservice.claim_due_emails(now, self.batch_size)
+        return sent_total
+
+    def _send_batch(self, connection, batch, now):
+        sent, retry, failed, deferred = [], [], [], []
+        for index, email in enumerate(batch):
+            wait = self.limiter.acquire(email['domain'], now)
+            if wait:
+                deferred.append((email['id'], int(now + wait) + 1))
+                continue
+            try:
+                connection.send(self._message(email))
+            except smtplib.SMTPResponseException as e:
+                error = f'{e.smtp_code} {e.smtp_error!r}'
+                self._failed(email, error, retry, failed, now, permanent=e.smtp_code >= 500)
+            except smtplib.SMTPRecipientsRefused as e:
+                codes = [code for code, _reply in e.recipients.values()]
+                self._failed(email, f'refused: {e.recipients!r}', retry, failed, now,
+                             permanent=all(code >= 500 for code in codes))
+            except (smtplib.SMTPException, OSError) as e:
+                # The connection is gone: retry this one and release the rest.
+                self._failed(email, repr(e), retry, failed, now, permanent=False)
+                deferred.extend((rest['id'], now) for rest in batch[index + 1:])
+                dataservice.record_email_results(now, sent, retry, failed, deferred)
+                raise
+            else:
+                sent.append(email['id'])
+        dataservice.record_email_results(now, sent, retry, failed, deferred)
+        return len(sent)
+
+    def _failed(self, email, error, retry, failed, now, permanent):
+        attempts = email['attempts'] + 1
+        if permanent or attempts >= self.max_attempts:
+            failed.append((email['id'], error))
+        else:
+            retry.append((email['id'], error, int(now + self.backoff(attempts))))
+
+    def seconds_until_next(self):
+        with self.app.app_context():
+            next_due = dataservice.next_email_due()
+        now = self.clock()
+        wait = self.max_sleep if next_due is None else max(0.0, next_due - now)
+        if self._next_digest is not None:
+            wait = min(wait, max(0.0, self._next_digest - now))
+        return min(self.max_sleep, wait)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='email-dispatcher', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+                delay = self.seconds_until_next()
+            except Exception:
+                self.app.logger.exception('Email dispatch pass failed')
+                delay = self.max_sleep
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+def enqueue(recipient, subject, body, **kwargs):
+    """Queue a message and nudge the dispatcher; returns the outbox id."""
+    email_id = dataservice.enqueue_email(recipient, subject, body, **kwargs)
+    dispatcher = current_app.extensions.get('email_outbox')
+    if dispatcher is not None:
+        dispatcher.wake()
+    return email_id
+
+
+def init_app(app, mail):
+    dispatcher = EmailDispatcher(
+        app, mail,
+        batch_size=app.config.get('EMAIL_BATCH_SIZE', 100),
+        domain_rate=app.config.get('EMAIL_DOMAIN_RATE_PER_MINUTE', 60),
+        max_attempts=app.config.get('EMAIL_MAX_ATTEMPTS', 5),
+        digest_interval=app.config.get('EMAIL_DIGEST_INTERVAL', 24 * 60 * 60),
+    )
+    app.extensions['email_outbox'] = dispatcher
+
+    @app.before_request
+    def start_email_dispatcher():
+        dispatcher.start()
+
+    @app.cli.command('queue-email-digests')
+    def queue_email_digests_command():
+        """Queue a notification digest email for every opted-in user now."""
+        print(f'Queued {dataservice.queue_notification_digests()} digests.')
+
+    return dispatcher
@@ -0,0 +1,275 @@
+"""
+Per-user change events pushed to open tabs over Server-Sent Events.
+
+The dataservice write functions report committed goal and notification
+changes; the broker turns each into one encoded SSE frame and appends it to
+the bounded queue of every stream that user has open. Goal events carry the
+changed categories' full lists, which a publisher thread loads after the
+write has returned. A stream whose queue
+fills up (a client that stopped reading) is closed rather than buffered
+without limit; the browser reconnects and reloads what it missed.
+
+The broker lives in this process only, so serve with `python asgi.py` to
+have every tab see every change. There an idle stream is a coroutine and a
+deque on the event loop; under a threaded WSGI server each one holds a thread.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app, has_app_context
+
+import dataservice
+from serialization import encode_goal_groups
+
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+
+def encode_frame(event, data):
+    """One SSE frame; `data` is a single line of JSON bytes."""
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + data + b'\n\n'
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded frames."""
+
+    __slots__ = ('user_id', 'max_queue', 'frames', 'closed', '_event', '_waiter')
+
+    def __init__(self, user_id, max_queue):
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.frames = deque()
+        self.closed = False
+        self._event = None  # threading.Event, made by the first blocking get()
+        self._waiter = None  # (loop, future) of a pending aget()
+
+    def put(self, frame):
+        """Queue a frame; False if the queue is full."""
+        if len(self.frames) >= self.max_queue:
+            return False
+        self.frames.append(frame)
+        self._notify()
+        return True
+
+    def close(self):
+        self.closed = True
+        self.frames.clear()
+        self._notify()
+
+    def _notify(self):
+        if self._event is not None:
+            self._event.set()
+        waiter = self._waiter
+        if waiter is not None:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _next(self):
+        if self.frames:
+            return self.frames.popleft()
+        return None if self.closed else b''
+
+    def get(self, timeout):
+        """The next frame, b'' after `timeout` seconds without one, None once closed."""
+        if self._event is None:
+            self._event = threading.Event()
+        self._event.clear()
+        if not self.frames and not self.closed:
+            self._event.wait(timeout)
+        return self._next()
+
+    async def aget(self, timeout):
+        """get() for the event loop: waits on a future instead of a thread."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Registered before checking the queue, so a put() in between still wakes us.
+        self._waiter = (loop, future)
+        try:
+            if not self.frames and not self.closed:
+                timer = loop.call_later(timeout, _wake, future)
+                try:
+                    await future
+                finally:
+                    timer.cancel()
+        finally:
+            self._waiter = None
+        return self._next()
+
+
+class EventBroker:
+    """
+    Fans published events out to each user's subscriptions. A user keeps at
+    most `max_per_user` streams; opening another closes their oldest.
+
+    With an `app`, goal changes are published from a background thread:
+    writers only mark the category dirty, so reloading it never adds to a
+    save's latency, and a burst of saves costs one reload. Without one they
+    are loaded and published by the writer itself.
+    """
+
+    def __init__(self, max_queue=32, keepalive=15.0, max_age=3600, max_per_user=8, app=None):
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self.max_age = max_age
+        self.max_per_user = max_per_user
+        self.app = app
+        self.evicted = 0
+        self._subscribers = {}  # user_id -> [Subscription], oldest first
+        self._dirty = {}  # user_id -> categories whose goals await publishing
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.max_queue)
+        with self._lock:
+            streams = self._subscribers.setdefault(user_id, [])
+            streams.append(subscription)
+            stale = streams[:-self.max_per_user] if len(streams) > self.max_per_user else []
+        for old in stale:
+            self.unsubscribe(old)
+            old.close()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._subscribers.get(subscription.user_id)
+            if streams and subscription in streams:
+                streams.remove(subscription)
+                if not streams:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_id, event, data):
+        """Queue `data` (JSON bytes) for the user's streams; returns how many took it."""
+        with self._lock:
+            streams = list(self._subscribers.get(user_id, ()))
+        if not streams:
+            return 0
+        frame = encode_frame(event, data)
+        delivered = 0
+        for subscription in streams:
+            if subscription.put(frame):
+                delivered += 1
+            else:
+                # A client this far behind resyncs on reconnect instead.
+                self.unsubscribe(subscription)
+                subscription.close()
+                self.evicted += 1
+        return delivered
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._subscribers),
+                    'streams': sum(len(streams) for streams in self._subscribers.values()),
+                    'evicted': self.evicted}
+
+    # --- Change Listener ---
+    def on_change(self, user_id, kind, details):
+        """dataservice change listener: publish what changed, if anyone is watching."""
+        if not self.has_subscribers(user_id):
+            return
+        if kind == 'goals' and self.app is not None:
+            with self._lock:
+                self._dirty.setdefault(user_id, set()).update(details['categories'])
+            self._start()
+            self._wake.set()
+            return
+        try:
+            if kind == 'goals':
+                data = encode_goal_groups(dataservice.get_all_goal_tuples(user_id, details['categories']))
+            else:
+                data = json.dumps(details, separators=(',', ':')).encode('utf-8')
+            self.publish(user_id, kind, data)
+        except Exception:
+            # The write has committed; a lost event only costs a stale tab.
+            if has_app_context():
+                current_app.logger.exception('Could not publish %s change for user %s', kind, user_id)
+
+    # --- Goal Publisher ---
+    def _start(self):
+        # Started on first use, so a preloading server runs one per worker.
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='event-publisher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            with self.app.app_context():
+                for user_id, categories in dirty.items():
+                    if not self.has_subscribers(user_id):
+                        continue
+                    try:
+                        grouped = dataservice.get_all_goal_tuples(user_id, sorted(categories))
+                        self.publish(user_id, 'goals', encode_goal_groups(grouped))
+                    except Exception:
+                        self.app.logger.exception('Could not publish goal changes for user %s', user_id)
+
+
+class EventStream:
+    """
+    The body of a text/event-stream response. Iterating it blocks the
+    serving thread between events; asgi.WsgiToAsgi consumes it with
+    `async for` on the event loop instead. Either way the stream ends after
+    the broker's max_age, and the browser reconnects.
+    """
+
+    def __init__(self, broker, subscription):
+        self.broker = broker
+        self.subscription = subscription
+        self.deadline = time.monotonic() + broker.max_age
+
+    def _timeout(self):
+        return max(0.0, min(self.broker.keepalive, self.deadline - time.monotonic()))
+
+    def __iter__(self):
+        # Sent at once so the browser sees the stream open.
+        yield b'retry: 3000\n' + KEEPALIVE_FRAME
+        while time.monotonic() < self.deadline:
+            frame = self.subscription.get(self._timeout())
+            if frame is None:
+                return
+            yield frame or KEEPALIVE_FRAME
+
+    async def __aiter__(self):
+        yield b'retry: 3000\n' + KEEPALIVE_FRAME
+        while time.monotonic() < self.deadline:
+            frame = await self.subscription.aget(self._timeout())
+            if frame is None:
+                return
+            yield frame or KEEPALIVE_FRAME
+
+    def close(self):
+        self.broker.unsubscribe(self.subscription)
+        self.subscription.close()
+
+
+def init_app(app):
+    broker = EventBroker(
+        max_queue=app.config.get('EVENT_QUEUE_SIZE', 32),
+        keepalive=app.config.get('EVENT_KEEPALIVE', 15.0),
+        max_age=app.config.get('EVENT_STREAM_MAX_AGE', 3600),
+        max_per_user=app.config.get('EVENT_STREAMS_PER_USER', 8),
+        app=app,
+    )
+    app.extensions['events'] = broker
+    dataservice.set_change_listener(broker.on_change)
+    return broker
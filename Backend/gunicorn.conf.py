@@ -0,0 +1,41 @@
+"""
+Gunicorn settings, picked up when gunicorn is started from this directory:
+
+    gunicorn                                          # WSGI, threaded workers
+    gunicorn -k uvicorn.workers.UvicornWorker 'app:create_asgi_app()'
+
+The app is built once in the master and forked into the workers, so each
+worker starts answering without importing anything and the modules' memory
+stays shared copy-on-write. create_app() leaves no database connection or
+thread behind for a worker to inherit; each worker opens its own pool and
+starts its background jobs on its first request.
+
+The default bind is loopback, i.e. behind a reverse proxy on this host, so
+TRUSTED_PROXY_HOPS defaults to 1 here (also for a unix: socket): clients
+are told apart, and rate limited, by the X-Forwarded-For address the proxy
+sets. Binding to a public address leaves it at 0.
+
+WRITE_BEHIND_ENABLED=1 keeps pending saves and their log in one process,
+so it needs WEB_CONCURRENCY=1; startup is refused otherwise.
+"""
+import gc
+import os
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+
+bind = os.getenv('BIND', '127.0.0.1:8000')
+if bind.startswith('unix:') or bind.rpartition(':')[0] in ('127.0.0.1', 'localhost', '[::1]'):
+    os.environ.setdefault('TRUSTED_PROXY_HOPS', '1')  # read by create_app() below
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+if os.getenv('WRITE_BEHIND_ENABLED', '0') == '1' and workers > 1:
+    raise RuntimeError('WRITE_BEHIND_ENABLED needs a single worker (set WEB_CONCURRENCY=1)')
+
+
+def when_ready(server):
+    # Objects created so far live as long as the workers do. Moving them out
+    # of the collector's generations keeps its passes from writing to, and
+    # so un-sharing, the pages they sit on.
+    gc.freeze()
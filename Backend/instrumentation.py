@@ -0,0 +1,293 @@
+import hmac
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request
+
+import dataservice
+
+# Upper bounds, in seconds, shared by every latency histogram.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def fingerprint(sql):
+    """
+    Reduce a statement to its shape so that queries differing only in
+    literals or IN-list length are aggregated together.
+    """
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return sql[:200]
+
+
+# --- Histograms ---
+class Histogram:
+    """Cumulative Prometheus-style histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0])
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, _total = series = self._series[labels]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+query_duration = Histogram('habit_sql_query_duration_seconds', 'Time spent executing SQL statements.',
+                           ('query',), LATENCY_BUCKETS)
+query_rows = Histogram('habit_sql_query_rows', 'Rows fetched or modified per SQL statement.',
+                       ('query',), ROW_BUCKETS)
+request_duration = Histogram('habit_http_request_duration_seconds', 'Time spent handling HTTP requests.',
+                             ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+
+
+def _record(entry):
+    query_duration.observe((entry['query'],), entry['duration'])
+    query_rows.observe((entry['query'],), entry['rows'])
+
+
+# --- Instrumented SQLite Connections ---
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times each statement and counts the rows it returns or changes."""
+
+    _entry = None
+
+    def _start(self, sql):
+        self._entry = {'query': fingerprint(sql), 'duration': 0.0, 'rows': 0}
+        return time.perf_counter()
+
+    def _track(self, started):
+        entry = self._entry
+        entry['duration'] += time.perf_counter() - started
+        if self.rowcount > 0:
+            entry['rows'] = self.rowcount
+        # Inside a request the log is aggregated in after_request, once the
+        # view has fetched its rows (or at teardown, for statements run while
+        # a streamed response is sent); elsewhere record straight away.
+        if has_request_context():
+            g.setdefault('query_log', []).append(entry)
+        else:
+            _record(entry)
+
+    def execute(self, sql, parameters=()):
+        started = self._start(sql)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._track(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = self._start(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._track(started)
+
+    def _count(self, rows):
+        if self._entry is not None:
+            self._entry['rows'] += rows
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Routes every statement through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# --- Sampling Profiler ---
+class SamplingProfiler:
+    """
+    One background thread samples the stacks of in-flight request threads
+    every `interval` seconds. Samples for a request are kept as folded stacks
+    ("outer;inner;leaf count"), the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_request(self):
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def finish_request(self):
+        with self._lock:
+            return self._samples.pop(threading.get_ident(), Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, counter in self._samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counter[_fold(frame)] += 1
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+# --- Flask Integration ---
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Behind a proxy every request looks local, so the address proves
+    # nothing: scrapers must present METRICS_TOKEN.
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(404)
+    lines = []
+    for histogram in (request_duration, query_duration, query_rows):
+        lines.extend(histogram.render())
+    for name, help_text in (('size', 'Open pooled connections.'),
+                            ('in_use', 'Pooled connections checked out.'),
+                            ('waits', 'Acquisitions that had to wait for a free connection.'),
+                            ('wait_seconds_total', 'Total time spent waiting for a connection.'),
+                            ('timeouts', 'Acquisitions that gave up waiting.')):
+        lines.append(f'# HELP habit_db_pool_{name} {help_text}')
+        lines.append(f'# TYPE habit_db_pool_{name} gauge')
+        for database, stats in dataservice.pool_stats().items():
+            lines.append(f'habit_db_pool_{name}{{database="{_escape(os.path.basename(database))}"}} {stats[name]}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """
+    Enable query timing, request histograms and the /metrics endpoint.
+    With PROFILE_SLOW_REQUESTS_MS set, requests slower than that are written
+    as folded stacks to PROFILE_DIR.
+    """
+    dataservice.set_connection_factory(InstrumentedConnection)
+    app.register_blueprint(metrics_bp)
+
+    threshold_ms = app.config.get('PROFILE_SLOW_REQUESTS_MS')
+    profile_dir = app.config.get('PROFILE_DIR', 'profiles')
+    profiler = SamplingProfiler() if threshold_ms else None
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if profiler is not None:
+            profiler.start_request()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        queries = g.pop('query_log', [])
+        for entry in queries:
+            _record(entry)
+        request_duration.observe((request.endpoint or 'unknown', request.method, str(response.status_code)),
+                                 elapsed)
+
+        db_ms = sum(entry['duration'] for entry in queries) * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{len(queries)} queries", app;dur={elapsed * 1000:.2f}')
+
+        if profiler is not None:
+            samples = profiler.finish_request()
+            if elapsed * 1000 >= threshold_ms and samples:
+                _dump_profile(profile_dir, samples, elapsed)
+        return response
+
+    @app.teardown_request
+    def record_late_queries(exc=None):
+        # Statements run after after_request, while a streamed body is sent.
+        for entry in g.pop('query_log', []):
+            _record(entry)
+
+
+def _dump_profile(profile_dir, samples, elapsed):
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(elapsed * 1000)}ms-{request.endpoint or "unknown"}.folded'
+    with open(os.path.join(profile_dir, name), 'w') as handle:
+        handle.write(f'# {request.method} {request.full_path}\n')
+        for stack, count in samples.most_common():
+            handle.write(f'{stack} {count}\n')
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A small thread-safe LRU mapping with optional time-to-live.
+    Entries older than `ttl` seconds are treated as missing and dropped on access.
+    """
+
+    def __init__(self, max_size, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'size': len(self._data), 'max_size': self.max_size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+import dataservice
+
+
+class MaintenanceScheduler:
+    """
+    Runs dataservice.run_maintenance every `interval` seconds on a background
+    thread and logs what it purged, trimmed and reclaimed. The first pass waits
+    `first_delay` seconds so it never competes with startup.
+    """
+
+    def __init__(self, app, interval=3600, vacuum_pages=1000, first_delay=60):
+        self.app = app
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.first_delay = first_delay
+        self.last_report = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def run_once(self):
+        with self.app.app_context():
+            self.last_report = dataservice.run_maintenance(vacuum_pages=self.vacuum_pages)
+        self.app.logger.info('Database maintenance: %s', self.last_report)
+        return self.last_report
+
+    def start(self):
+        # Started lazily from the first request, so each worker process runs its own.
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        delay = min(self.first_delay, self.interval)
+        while True:
+            time.sleep(delay)
+            try:
+                self.run_once()
+            except Exception:
+                self.app.logger.exception('Database maintenance pass failed')
+            delay = self.interval
+
+
+def init_app(app):
+    scheduler = MaintenanceScheduler(
+        app,
+        interval=app.config.get('MAINTENANCE_INTERVAL', 3600),
+        vacuum_pages=app.config.get('MAINTENANCE_VACUUM_PAGES', 1000),
+    )
+    app.extensions['maintenance'] = scheduler
+
+    @app.before_request
+    def start_maintenance():
+        scheduler.start()
+
+    return scheduler
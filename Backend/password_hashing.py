@@ -0,0 +1,126 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusyError(Exception):
+    """Raised when too many hashes are already queued; surfaced as HTTP 503."""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification in a bounded process pool so a
+    burst of logins can't stall every request thread. When `max_pending`
+    jobs are already queued, new ones fail fast with HashingBusyError.
+    With `workers=0` everything runs inline.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=0, max_pending=32, start_method='spawn'):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self._method_prefix = None
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method))
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingBusyError('Password hashing queue is full')
+            self._pending += 1
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future.result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    @property
+    def method_prefix(self):
+        # werkzeug fills in default parameters (e.g. pbkdf2 iterations), so take
+        # the canonical prefix from a real hash rather than the configured string.
+        # Computed on first use: a scrypt hash would otherwise slow every startup.
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
+
+    def pending(self):
+        return self._pending
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Inline until init_app configures it, so dataservice works without an app.
+_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return _hasher.hash(password)
+
+
+def verify_password(password_hash, password):
+    return _hasher.verify(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return _hasher.needs_rehash(password_hash)
+
+
+def configure(method=DEFAULT_METHOD, workers=0, max_pending=32):
+    global _hasher
+    _hasher.shutdown()
+    _hasher = PasswordHasher(method=method, workers=workers, max_pending=max_pending)
+
+
+@atexit.register
+def _shutdown():
+    # Looks _hasher up at exit, so replaced hashers aren't kept alive here.
+    _hasher.shutdown()
+
+
+def init_app(app):
+    configure(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 0),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 32),
+    )
+
+    @app.errorhandler(HashingBusyError)
+    def hashing_busy(e):
+        return 'The server is busy. Please try again in a moment.', 503, {'Retry-After': '1'}
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request, session
+
+import dataservice
+
+# endpoint -> (methods limited, ((scope, requests, per seconds), ...)). Scopes:
+# 'ip' is the client address, 'user' the logged-in user, 'identifier' the
+# username or email a login/recovery form targets (spreads stuffing across IPs),
+# or the account a recovery code is being entered for.
+DEFAULT_LIMITS = {
+    'auth.login': ({'POST'}, (('ip', 20, 60), ('identifier', 10, 300))),
+    'auth.signup': ({'POST'}, (('ip', 5, 60),)),
+    'auth.recover': ({'POST'}, (('ip', 10, 600), ('identifier', 5, 3600))),
+    'api.api_goals': ({'GET', 'POST'}, (('user', 240, 60),)),
+    'api.api_stream': ({'GET'}, (('user', 30, 60),)),  # caps reconnect storms
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised before the view runs; surfaced as HTTP 429."""
+
+    def __init__(self, retry_after):
+        super().__init__('Rate limit exceeded')
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """
+    In-process token buckets: `requests` per `per` seconds, bursting to
+    `requests`, refilled continuously. Only the `max_keys` most recently used
+    keys are kept; an evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, requests, per, now=None):
+        """Take a token; returns 0 on success, otherwise seconds until one frees up."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (requests, now))
+            tokens = min(requests, tokens + (now - updated) * requests / per)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) * per / requests
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RateLimiter:
+    """
+    Checks DEFAULT_LIMITS (or `limits`) in a before_request hook, so a
+    rejected request never reaches the view's database or hashing work.
+
+    Every worker checks its own TokenBuckets first, which makes rejections
+    free. With `shared=True` allowed requests are then also charged to the
+    `rate_limits` table, so the limits hold across all workers.
+    """
+
+    def __init__(self, limits=None, shared=False, max_keys=100000, sweep_interval=300, clock=time.time):
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.shared = shared
+        self.clock = clock
+        self.buckets = TokenBuckets(max_keys, clock=clock)
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+
+    def keys(self, endpoint, rules):
+        """Yield (key, requests, per) for each rule that applies to this request."""
+        for scope, requests, per in rules:
+            if scope == 'ip':
+                value = request.remote_addr
+            elif scope == 'user':
+                value = session.get('user_id')
+            elif endpoint == 'auth.recover' and request.args.get('step') == '2':
+                # Code entry posts no identifier; count guesses per account.
+                value = session.get('reset_user_id') and f"user:{session['reset_user_id']}"
+            else:
+                value = (request.form.get('identifier') or request.form.get('username') or '').strip().lower()
+            if value:
+                yield f'{endpoint}:{scope}:{value}', requests, per
+
+    def check(self, endpoint, method):
+        rule = self.limits.get(endpoint)
+        if rule is None or method not in rule[0]:
+            return
+        now = self.clock()
+        keys = list(self.keys(endpoint, rule[1]))
+        for key, requests, per in keys:
+            wait = self.buckets.take(key, requests, per, now)
+            if wait:
+                raise RateLimitExceeded(wait)
+        if self.shared:
+            self._maybe_sweep(now)
+            for key, requests, per in keys:
+                if not dataservice.take_rate_limit_token(key, requests, per, now):
+                    raise RateLimitExceeded(per / requests)
+
+    def _maybe_sweep(self, now):
+        if self.sweep_interval and now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            longest = max((per for _methods, rules in self.limits.values() for _scope, _n, per in rules), default=0)
+            dataservice.purge_rate_limits(now - longest)
+
+
+def init_app(app):
+    limiter = RateLimiter(
+        limits=app.config.get('RATE_LIMITS'),
+        shared=app.config.get('RATE_LIMIT_STORE', 'memory') == 'sqlite',
+        max_keys=app.config.get('RATE_LIMIT_MAX_KEYS', 100000),
+    )
+    app.extensions['rate_limit'] = limiter
+
+    @app.before_request
+    def enforce_rate_limits():
+        limiter.check(request.endpoint, request.method)
+
+    @app.errorhandler(RateLimitExceeded)
+    def rate_limited(e):
+        headers = {'Retry-After': str(max(1, round(e.retry_after)))}
+        if request.blueprint == 'api':
+            return jsonify({'error': 'Too many requests'}), 429, headers
+        return 'Too many requests. Please try again in a moment.', 429, headers
+
+    return limiter
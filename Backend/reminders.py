@@ -0,0 +1,102 @@
+import os
+import random
+import threading
+import time
+
+import dataservice
+
+DAY = 24 * 60 * 60
+
+# category -> (interval in seconds, message); replaces the browser setInterval timers
+DEFAULT_REMINDERS = {
+    'daily': (DAY, '🗓️ Daily Goal Reminder: Stay consistent!'),
+    'weekly': (7 * DAY, '📅 Weekly Goal Reminder: Keep up the momentum!'),
+    'monthly': (30 * DAY, '🗓️ Monthly Goal Reminder: Time to review progress!'),
+    'yearly': (365 * DAY, '📆 Yearly Goal Reminder: Reflect and plan ahead!'),
+}
+
+
+class ReminderScheduler:
+    """
+    A single background thread that fires due reminders. It sleeps until the
+    earliest next_fire_at (an index probe, so scheduling stays O(log n) with
+    any number of reminders) and fires them in batches.
+
+    `clock` returns unix seconds; pass a fake one, or call `run_pending(now)`
+    directly, to drive the scheduler without waiting on real time.
+    """
+
+    def __init__(self, app, clock=time.time, batch_size=500, jitter=300, max_sleep=60, rng=None):
+        self.app = app
+        self.clock = clock
+        self.batch_size = batch_size
+        self.jitter = jitter
+        self.max_sleep = max_sleep
+        self.rng = rng or random.Random()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def first_fire_at(self, interval_seconds, now=None):
+        """When a new reminder first fires: one interval from now, jittered."""
+        now = self.clock() if now is None else now
+        return int(now + interval_seconds + self.rng.uniform(0, self.jitter))
+
+    def run_pending(self, now=None):
+        """Fire every reminder due at `now`. Returns how many fired."""
+        now = int(self.clock() if now is None else now)
+        fired = 0
+        with self.app.app_context():
+            while True:
+                count = dataservice.fire_due_reminders(now, self.batch_size, self.jitter, self.rng)
+                fired += count
+                if count < self.batch_size:
+                    return fired
+
+    def seconds_until_next(self):
+        with self.app.app_context():
+            next_due = dataservice.next_reminder_due()
+        if next_due is None:
+            return self.max_sleep
+        return min(self.max_sleep, max(0.0, next_due - self.clock()))
+
+    def start(self):
+        # Started lazily from the first request, so a preloading server
+        # runs one scheduler per worker process rather than one in the master.
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Re-check the next due time, e.g. after a reminder was added."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+                delay = self.seconds_until_next()
+            except Exception:
+                self.app.logger.exception('Reminder scheduler pass failed')
+                delay = self.max_sleep
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+def init_app(app):
+    scheduler = ReminderScheduler(
+        app,
+        batch_size=app.config.get('REMINDER_BATCH_SIZE', 500),
+        jitter=app.config.get('REMINDER_JITTER_SECONDS', 300),
+    )
+    app.extensions['reminders'] = scheduler
+
+    @app.before_request
+    def start_reminder_scheduler():
+        scheduler.start()
+
+    return scheduler
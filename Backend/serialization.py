@@ -0,0 +1,104 @@
+import gzip
+import json
+from json.encoder import encode_basestring_ascii
+
+from flask import request
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; responses are then only gzipped
+    brotli = None
+
+# Only API JSON. HTML pages carry CSRF tokens next to reflected form input,
+# and compressing those lets an attacker recover the token (BREACH).
+COMPRESSIBLE_TYPES = {'application/json'}
+
+
+# --- JSON Encoding ---
+def encode_goals(goals):
+    """
+    A JSON array of {"id", "text", "completed"} objects from (id, text,
+    completed) tuples, without building an intermediate dict per goal
+    unless orjson is there to take them. Both encoders write the same JSON;
+    ids are emitted as they are (callers validate them).
+    """
+    if orjson is not None:
+        return orjson.dumps([{'id': goal_id, 'text': text, 'completed': bool(completed)}
+                             for goal_id, text, completed in goals])
+    return ('[' + ','.join([
+        '{"id":%s,"text":%s,"completed":%s}' % (
+            goal_id if type(goal_id) is int else json.dumps(goal_id), encode_basestring_ascii(text),
+            'true' if completed else 'false')
+        for goal_id, text, completed in goals
+    ]) + ']').encode('ascii')
+
+
+def encode_goal_groups(grouped):
+    """A JSON object of category -> encode_goals() arrays."""
+    return b'{' + b','.join(encode_basestring_ascii(category).encode('ascii') + b':' + encode_goals(goals)
+                            for category, goals in grouped.items()) + b'}'
+
+
+# --- Response Compression ---
+class ResponseCompressor:
+    """
+    Compresses JSON responses of at least `min_size` bytes with brotli
+    (when installed) or gzip, whichever the client prefers. Streamed and
+    already-encoded responses, such as static files, are left alone.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressible(self, response):
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        return response.mimetype in COMPRESSIBLE_TYPES
+
+    def choose(self, accept_encodings):
+        candidates = [('br', accept_encodings['br'])] if brotli is not None else []
+        candidates.append(('gzip', accept_encodings['gzip']))
+        # max() keeps the first of equals, so brotli wins a tie.
+        encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+        return encoding if quality > 0 else None
+
+    def compress(self, response):
+        if not self.compressible(response):
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose(request.accept_encodings)
+        if encoding is None:
+            return response
+        if encoding == 'br':
+            body = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            body = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ, so the entity tag can only be weak.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def init_app(app):
+    compressor = ResponseCompressor(
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+        gzip_level=app.config.get('COMPRESSION_LEVEL', 6),
+    )
+    app.extensions['compression'] = compressor
+    app.after_request(compressor.compress)
+    return compressor
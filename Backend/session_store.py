@@ -0,0 +1,164 @@
+import os
+import secrets
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+import dataservice
+from lru_cache import LRUCache
+
+
+def load_secret_key(path):
+    """
+    Read the secret key from `path`, creating it on first use. Every worker
+    and restart then signs cookies with the same key. O_EXCL makes the first
+    process to start the only one that writes it.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, 'rb') as handle:
+                key = handle.read()
+            if key:
+                return key
+            time.sleep(0.01)  # another worker is still writing it
+        raise RuntimeError(f'Secret key file {path} is empty')
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(key)
+    return key
+
+
+class ServerSession(SecureCookieSession):
+    """Session data kept server-side; only the signed `sid` goes in the cookie."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        # Read without marking the session accessed; a change means log in/out.
+        self.initial_user_id = dict.get(self, 'user_id')
+
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Stores sessions in the `sessions` table behind a process-wide LRU.
+    Other workers only see a change once SESSION_CACHE_TTL expires, so keep
+    it short. The session id is rotated whenever the logged-in user changes.
+    Unchanged sessions are written back only once half their lifetime has
+    passed. Expired rows are swept in small batches every `sweep_interval`.
+    """
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSession
+
+    def __init__(self, cache_size=10000, cache_ttl=5, sweep_interval=300, sweep_batch=1000, clock=time.time):
+        self.cache = LRUCache(cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.clock = clock
+        self._next_sweep = 0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class()
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self.session_class()
+        now = int(self.clock())
+        stored = self.cache.get(sid) if self.cache is not None else None
+        if stored is None or stored[1] <= now:
+            stored = dataservice.load_session(sid, now)
+            if stored is None:
+                return self.session_class()
+            if self.cache is not None:
+                self.cache.set(sid, stored)
+        data, expires_at = stored
+        return self.session_class(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = int(self.clock())
+        self._maybe_sweep(now)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session:
+            if session.sid is not None:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+                response.vary.add('Cookie')
+            return
+
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        expires_at = now + lifetime
+        if session.sid is None or dict.get(session, 'user_id') != session.initial_user_id:
+            if session.sid is not None:
+                self._delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            self._store(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        elif session.modified:
+            self._store(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        elif session.expires_at - now < lifetime // 2:
+            dataservice.touch_session(session.sid, expires_at)
+            if self.cache is not None:
+                self.cache.pop(session.sid)
+        else:
+            return
+
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+    def _store(self, sid, data, expires_at):
+        dataservice.save_session(sid, data, expires_at)
+        if self.cache is not None:
+            self.cache.set(sid, (data, expires_at))
+
+    def _delete(self, sid):
+        dataservice.delete_session(sid)
+        if self.cache is not None:
+            self.cache.pop(sid)
+
+    def _maybe_sweep(self, now):
+        if self.sweep_interval and now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            dataservice.purge_expired_sessions(now, self.sweep_batch)
+
+
+def init_app(app):
+    interface = SqliteSessionInterface(
+        cache_size=app.config.get('SESSION_CACHE_SIZE', 10000),
+        cache_ttl=app.config.get('SESSION_CACHE_TTL', 5),
+        sweep_interval=app.config.get('SESSION_SWEEP_INTERVAL', 300),
+    )
+    app.session_interface = interface
+
+    @app.cli.command('purge-sessions')
+    def purge_sessions_command():
+        """Delete every expired session now."""
+        total = 0
+        while True:
+            count = dataservice.purge_expired_sessions(limit=interface.sweep_batch)
+            total += count
+            if count < interface.sweep_batch:
+                break
+        print(f'Purged {total} expired sessions.')
+
+    return interface
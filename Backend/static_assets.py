@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip variants are built
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# A compressed variant is only kept if it saves at least this much.
+MIN_COMPRESSION_RATIO = 0.9
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+_JS_IMPORT = re.compile(r'''((?:\bfrom|\bimport)\s*\(?\s*)(['"])(\.{1,2}/[^'"]+)\2''')
+
+
+def _is_relative(reference):
+    return not re.match(r'^(?:[a-z][a-z0-9+.-]*:|/|#)', reference, re.IGNORECASE)
+
+
+def _references(name, text):
+    """(start, end, reference) for every relative asset reference in a CSS or JS file."""
+    if name.endswith('.css'):
+        return [(m.start(2), m.end(2), m.group(2)) for m in _CSS_URL.finditer(text) if _is_relative(m.group(2))]
+    if name.endswith('.js'):
+        return [(m.start(3), m.end(3), m.group(3)) for m in _JS_IMPORT.finditer(text)]
+    return []
+
+
+def _resolve(name, reference):
+    path = reference.split('?', 1)[0].split('#', 1)[0]
+    return os.path.normpath(os.path.join(os.path.dirname(name), path)).replace(os.sep, '/')
+
+
+def _compress(data):
+    """{encoding: bytes} for the variants worth keeping."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items()
+            if len(body) <= len(data) * MIN_COMPRESSION_RATIO}
+
+
+def build(static_dir, build_dir=BUILD_DIR):
+    """
+    Copy every file under `static_dir` into `static_dir/build_dir` with a
+    content hash in its name, plus .gz (and .br, with brotli installed)
+    variants, and write the manifest. Relative url(...) references in CSS
+    and ES-module imports in JS are rewritten to the hashed names first, so
+    a file's hash also changes when anything it references does.
+    Returns the manifest.
+    """
+    out_dir = os.path.join(static_dir, build_dir)
+    sources = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [d for d in dirs if d != build_dir]
+        for filename in files:
+            path = os.path.join(root, filename)
+            sources[os.path.relpath(path, static_dir).replace(os.sep, '/')] = path
+
+    assets = {}
+
+    def process(name, visiting=()):
+        if name in assets:
+            return assets[name]['path']
+        with open(sources[name], 'rb') as handle:
+            data = handle.read()
+        if name.endswith(('.css', '.js')):
+            text = data.decode('utf-8')
+            references = [(start, end, reference, _resolve(name, reference))
+                          for start, end, reference in _references(name, text)]
+            for start, end, reference, target in reversed(references):
+                if target in sources and target not in visiting and target != name:
+                    hashed = process(target, visiting + (name,))
+                    directory = reference.rsplit('/', 1)[0]
+                    text = text[:start] + directory + '/' + hashed.rsplit('/', 1)[1] + text[end:]
+            data = text.encode('utf-8')
+
+        stem, ext = os.path.splitext(name)
+        hashed = f'{build_dir}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        target_path = os.path.join(static_dir, *hashed.split('/'))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        variants = _compress(data)
+        for encoding, suffix in ENCODINGS:
+            if encoding in variants:
+                with open(target_path + suffix, 'wb') as handle:
+                    handle.write(variants[encoding])
+        with open(target_path, 'wb') as handle:
+            handle.write(data)
+        assets[name] = {'path': hashed, 'encodings': [encoding for encoding, _ in ENCODINGS if encoding in variants]}
+        return hashed
+
+    for name in sorted(sources):
+        process(name)
+
+    # Written last and swapped in atomically, so a worker never reads half a manifest.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as handle:
+        json.dump(assets, handle, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return assets
+
+
+def load_manifest(static_dir, build_dir=BUILD_DIR):
+    try:
+        with open(os.path.join(static_dir, build_dir, MANIFEST_NAME)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+class HashedStatic:
+    """
+    Points url_for('static', ...) at the hashed copies listed in the manifest
+    and serves those with a year-long immutable Cache-Control, picking the
+    precompressed variant the client accepts. Files missing from the manifest
+    are served as before.
+    """
+
+    def __init__(self, app, manifest):
+        self.static_dir = app.static_folder
+        # Changes whenever any hashed URL does; part of cached pages' keys.
+        self.version = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12]
+        self.urls = {name: asset['path'] for name, asset in manifest.items()}
+        self.encodings = {asset['path']: asset['encodings'] for asset in manifest.values()}
+        self.fallback = app.view_functions['static']
+
+    def url_defaults(self, endpoint, values):
+        if endpoint == 'static':
+            hashed = self.urls.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = hashed
+
+    def send(self, filename):
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return self.fallback(filename=filename)
+        encoding = next((encoding for encoding in encodings if request.accept_encodings[encoding]), None)
+        suffix = dict(ENCODINGS).get(encoding, '')
+        response = send_from_directory(
+            self.static_dir, filename + suffix, max_age=IMMUTABLE_MAX_AGE, download_name=os.path.basename(filename),
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+def init_app(app):
+    build_dir = app.config.get('STATIC_BUILD_DIR', BUILD_DIR)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress WebApp/static into its build directory."""
+        assets = build(app.static_folder, build_dir)
+        import template_cache
+        template_cache.clear()  # pages rendered with the old asset URLs
+        compressed = sum(1 for asset in assets.values() if asset['encodings'])
+        print(f'Built {len(assets)} assets ({compressed} precompressed, brotli '
+              f'{"on" if brotli is not None else "off: pip install brotli"}).')
+
+    if not app.config.get('STATIC_ASSETS_ENABLED', True):
+        return None
+    manifest = load_manifest(app.static_folder, build_dir)
+    if manifest is None:
+        app.logger.info('No static asset manifest; run `flask build-assets` to fingerprint assets.')
+        return None
+    hashed = HashedStatic(app, manifest)
+    app.url_defaults(hashed.url_defaults)
+    app.view_functions['static'] = hashed.send
+    app.extensions['static_assets'] = hashed
+    return hashed
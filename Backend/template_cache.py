@@ -0,0 +1,38 @@
+import os
+
+from flask import current_app, render_template, request
+
+from lru_cache import LRUCache
+
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', 64))
+
+_rendered = LRUCache(TEMPLATE_CACHE_SIZE)
+
+
+def render_cached(template_name, **context):
+    """
+    Render a template whose output depends only on its name and `context`,
+    reusing earlier output. Only use it for pages that never read the
+    session, the user or flashed messages. Bypassed while templates auto-reload.
+    The key also holds what url_for output depends on: the script root and
+    the static asset manifest.
+    """
+    if current_app.config.get('TEMPLATES_AUTO_RELOAD'):
+        return render_template(template_name, **context)
+
+    assets = current_app.extensions.get('static_assets')
+    key = (current_app.name, request.script_root, assets and assets.version,
+           template_name, tuple(sorted(context.items())))
+    html = _rendered.get(key)
+    if html is None:
+        html = render_template(template_name, **context)
+        _rendered.set(key, html)
+    return html
+
+
+def clear():
+    _rendered.clear()
+
+
+def stats():
+    return _rendered.stats()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported flat, as app.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+
+import dataservice  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Point dataservice at a new, fully migrated database file; returns its path."""
+    path = str(tmp_path / 'test.sqlite')
+    monkeypatch.setattr(dataservice, 'DATABASE_PATH', path)
+    dataservice.bootstrap_schema(path)
+    return path
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from asgi import HttpServer
+
+
+async def echo(scope, receive, send):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def exchange(raw):
+    async def run():
+        server = await HttpServer(echo).start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(raw)
+        status = await reader.readline()
+        writer.close()
+        server.close()
+        return status
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('framing', [
+    b'Content-Length: 5\r\nTransfer-Encoding: chunked\r\n',
+    b'Transfer-Encoding: chunked\r\nContent-Length: 5\r\n',
+    b'Content-Length: 5\r\nContent-Length: 6\r\n',
+    b'Transfer-Encoding: gzip, chunked\r\n',
+    b'Content-Length: -5\r\n',
+])
+def test_ambiguous_body_framing_is_rejected(framing):
+    status = exchange(b'POST / HTTP/1.1\r\nHost: x\r\n' + framing + b'\r\n5\r\nhello\r\n0\r\n\r\n')
+    assert status == b'HTTP/1.1 400 Bad Request\r\n'
+
+
+def test_chunked_body_is_read():
+    status = exchange(b'POST / HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n')
+    assert status == b'HTTP/1.1 200 OK\r\n'
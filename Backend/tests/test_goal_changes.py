@@ -0,0 +1,65 @@
+import pytest
+from flask import Flask
+
+import dataservice
+
+
+@pytest.fixture
+def app(database):
+    app = Flask(__name__)
+    dataservice.init_app(app)
+    with app.app_context():
+        yield app
+
+
+def daily_goals(user_id=1):
+    return [(goal['text'], goal['completed']) for goal in dataservice.get_goals_by_category(user_id, 'daily')]
+
+
+def test_change_set_applies_in_one_call(app):
+    dataservice.save_goals_for_category(1, 'daily', [{'text': text} for text in 'abcd'])
+    dataservice.save_goals_for_category(2, 'daily', [{'text': 'other'}])
+    a, b, c, d = (goal['id'] for goal in dataservice.get_goals_by_category(1, 'daily'))
+    other = dataservice.get_goals_by_category(2, 'daily')[0]['id']
+
+    inserted_ids = dataservice.apply_goal_changes(
+        1, 'daily',
+        inserted=[{'text': 'e'}, {'text': 'f', 'completed': True}],
+        updated=[{'id': a, 'text': 'A'}, {'id': b, 'completed': True}],
+        reordered=[{'id': c, 'sort_order': 0}, {'id': a, 'sort_order': 1}, {'id': b, 'sort_order': 2}],
+        deleted=[d, other],  # another user's id is ignored
+    )
+
+    # Inserted goals without a position go last, in the order sent.
+    assert daily_goals() == [('c', 0), ('A', 0), ('b', 1), ('e', 0), ('f', 1)]
+    assert [goal['id'] for goal in dataservice.get_goals_by_category(1, 'daily')][-2:] == inserted_ids
+    assert daily_goals(2) == [('other', 0)]
+
+
+def test_streaks_break_on_a_gap_day(app, monkeypatch):
+    dataservice.save_goals_for_category(1, 'daily', [{'text': 'run'}])
+    goal_id = dataservice.get_goals_by_category(1, 'daily')[0]['id']
+    start = 738000
+
+    def check_on(day):
+        monkeypatch.setattr(dataservice, '_today', lambda: day)
+        # Unchecked then checked, as a user ticking it off again each day.
+        dataservice.apply_goal_changes(1, 'daily', updated=[{'id': goal_id, 'completed': False}])
+        dataservice.apply_goal_changes(1, 'daily', updated=[{'id': goal_id, 'completed': True}])
+
+    def streaks(today):
+        stats = dataservice.get_goal_stats(1, today=today)[0]
+        return stats['current_streak'], stats['longest_streak']
+
+    for day in (start, start + 1, start + 2, start + 4, start + 5):  # start + 3 is missed
+        check_on(day)
+    assert streaks(start + 5) == (2, 3)
+    assert streaks(start + 7) == (0, 3)  # a whole day without a check ends it
+
+    # Unchecking today takes today off the streak.
+    dataservice.apply_goal_changes(1, 'daily', updated=[{'id': goal_id, 'completed': False}])
+    assert streaks(start + 5) == (1, 3)
+
+    # The incremental rollups match a rebuild from the raw events.
+    dataservice.rebuild_goal_stats()
+    assert streaks(start + 5) == (1, 3)
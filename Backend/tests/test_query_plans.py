@@ -0,0 +1,23 @@
+import sqlite3
+
+import pytest
+
+import dataservice
+
+
+def test_hot_queries_use_their_indexes(database):
+    conn = sqlite3.connect(database)
+    try:
+        dataservice.verify_query_plans(conn)
+    finally:
+        conn.close()
+
+
+def test_a_missing_index_fails(database):
+    conn = sqlite3.connect(database)
+    try:
+        conn.execute('DROP INDEX idx_goal_streaks_user_day')
+        with pytest.raises(AssertionError, match='goal_streaks'):
+            dataservice.verify_query_plans(conn)
+    finally:
+        conn.close()
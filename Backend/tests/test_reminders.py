@@ -0,0 +1,58 @@
+import pytest
+
+import dataservice
+from app import create_app
+from reminders import DAY, ReminderScheduler
+
+START = 1_700_000_000
+
+
+@pytest.fixture
+def app(database):
+    app = create_app({'TESTING': True, 'REMINDERS_ENABLED': False, 'MAINTENANCE_ENABLED': False,
+                      'RATE_LIMIT_ENABLED': False})
+    with app.app_context():
+        dataservice.create_user('alice', 'pw', 'alice@example.com')
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+def notifications(app):
+    with app.app_context():
+        return [row['message'] for row in dataservice.get_notifications(1, limit=None)]
+
+
+def test_reminder_fires_stays_off_and_comes_back(app, client):
+    now = [START]
+    scheduler = ReminderScheduler(app, clock=lambda: now[0], jitter=0)
+    app.extensions['reminders'] = scheduler  # not started: run_pending drives it
+
+    response = client.put('/api/reminders/daily', json={'message': 'Stretch'})
+    assert response.get_json()['next_fire_at'] == START + DAY
+    assert scheduler.run_pending(START + DAY - 1) == 0
+    assert scheduler.run_pending(START + DAY) == 1
+    assert len(notifications(app)) == 1 and notifications(app)[0].startswith('Stretch')
+
+    assert client.delete('/api/reminders/daily').status_code == 200
+    assert scheduler.run_pending(START + 5 * DAY) == 0
+    assert client.get('/api/reminders').get_json()[0]['enabled'] is False
+
+    now[0] = START + 5 * DAY
+    response = client.put('/api/reminders/daily', json={})
+    assert response.get_json()['next_fire_at'] == START + 6 * DAY
+    assert client.get('/api/reminders').get_json()[0]['enabled'] is True
+    assert scheduler.run_pending(START + 6 * DAY) == 1
+    assert len(notifications(app)) == 2
+
+
+@pytest.mark.parametrize('body', [[1], 'daily', {'message': {'a': 1}}, {'message': 5}, {'message': 'x' * 201}])
+def test_malformed_reminder_is_rejected(client, body):
+    assert client.put('/api/reminders/daily', json=body).status_code == 400
+    assert client.get('/api/reminders').get_json() == []
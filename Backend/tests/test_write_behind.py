@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+from flask import Flask
+
+import dataservice
+import write_behind
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Acknowledges three autosaves of the same list, then dies before the
+# flusher's window is up: no flush, no atexit hooks.
+CRASHING_PROCESS = '''
+import os, sys
+import dataservice, write_behind
+from flask import Flask
+
+dataservice.DATABASE_PATH = sys.argv[1]
+app = Flask('crashing')
+app.config.update(WRITE_BEHIND_LOG=sys.argv[2], WRITE_BEHIND_WINDOW_MS=60000)
+dataservice.init_app(app)
+queue = write_behind.init_app(app)
+with app.app_context():
+    for edit in range(1, 4):
+        queue.submit(1, 'daily', [{'text': f'goal {i}', 'completed': i < edit} for i in range(5)])
+os._exit(0)
+'''
+
+
+def daily_goals(app):
+    with app.app_context():
+        return [(goal['text'], goal['completed']) for goal in dataservice.get_goals_by_category(1, 'daily')]
+
+
+def test_saves_left_by_a_crash_are_replayed(database, tmp_path):
+    log_path = str(tmp_path / 'goal-writes.log')
+    subprocess.run([sys.executable, '-c', CRASHING_PROCESS, database, log_path],
+                   cwd=BACKEND_DIR, check=True)
+    with open(log_path, 'a') as log:
+        log.write('{"seq": 4, "user_id"')  # torn final record
+
+    app = Flask(__name__)
+    dataservice.init_app(app)
+    assert daily_goals(app) == []
+
+    replayed = write_behind.WriteBehindQueue(app, log_path).recover()
+
+    # Only the newest of the three logged lists is applied.
+    assert replayed == 1
+    assert daily_goals(app) == [(f'goal {i}', int(i < 3)) for i in range(5)]
+    assert os.path.getsize(log_path) == 0
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from jinja2 import TemplateNotFound
-from dataservice import get_goals_by_category, save_goals_for_category, reset_all_goals, create_notification, get_notifications, clear_notifications, find_user_by_id
+from template_cache import render_cached
+from dataservice import get_goals_by_category, get_all_goals, save_goals_for_category, reset_all_goals, create_notification, get_notifications, clear_notifications, find_user_by_id, NOTIFICATION_PAGE_SIZE, get_user_settings, update_notification_settings, flush_pending_goals
 # Create a new blueprint for views
 views_bp = Blueprint('views', __name__)
 
@@ -32,6 +33,12 @@ def settings():
         return redirect(url_for('auth.login'))
 
     user_id = session['user_id']
+    if request.method == 'POST' and 'save-notifications' in request.form:
+        update_notification_settings(user_id,
+                                     email_notifications='email-notifications' in request.form,
+                                     push_notifications='push-notifications' in request.form)
+        flash('Notification settings saved.', 'success')
+        return redirect(url_for('views.settings'))
     if request.method == 'POST':
         message = request.form.get('message')
         if message:
@@ -41,8 +48,13 @@ def settings():
         else:
             flash('Message cannot be empty', 'error')
 
-    notifications = get_notifications(user_id)
-    return render_template('settings.html', notifications=notifications)
+    before_id = request.args.get('before', type=int)
+    notifications = get_notifications(user_id, before_id=before_id)
+    next_before = notifications[-1]['id'] if len(notifications) == NOTIFICATION_PAGE_SIZE else None
+    user_settings = get_user_settings(user_id)
+    return render_template('settings.html', notifications=notifications, next_before=next_before,
+                           email_notifications=user_settings['email_notifications'],
+                           push_notifications=user_settings['push_notifications'])
 
 # Route to clear all notifications for the user
 @views_bp.route('/settings/notifications/clear', methods=['POST'])
@@ -55,6 +67,9 @@ def clear_all_notifications():
     flash("Notifications cleared.", 'info')
     return redirect(url_for('views.settings'))
 
+# Category pages are static shells; script.js loads the goals through the API
+CATEGORY_TEMPLATES = ('daily', 'weekly', 'monthly', 'yearly')
+
 # Route to render the goals page based on the category
 @views_bp.route('/goals/<category>')
 def goals_page(category):
@@ -63,6 +78,8 @@ def goals_page(category):
         return redirect(url_for('auth.login'))
 
     try:
+        if category in CATEGORY_TEMPLATES:
+            return render_cached(f'{category}.html')
         goals = get_goals_by_category(session['user_id'], category)
         return render_template(f'{category}.html', goals=goals)
     except TemplateNotFound:
@@ -76,12 +93,12 @@ def all_goals_page():
         flash("Please log in first", "warning")
         return redirect(url_for('auth.login'))
 
-    user_id = session['user_id']
+    goals = get_all_goals(session['user_id'], ['daily', 'weekly', 'monthly', 'yearly'])
     return render_template('all-goals.html',
-        daily_goals=get_goals_by_category(user_id, 'daily'),
-        weekly_goals=get_goals_by_category(user_id, 'weekly'),
-        monthly_goals=get_goals_by_category(user_id, 'monthly'),
-        yearly_goals=get_goals_by_category(user_id, 'yearly')
+        daily_goals=goals['daily'],
+        weekly_goals=goals['weekly'],
+        monthly_goals=goals['monthly'],
+        yearly_goals=goals['yearly']
     )
 
 # Route to save goals for a specific category (e.g., daily, weekly)
@@ -96,6 +113,7 @@ def save_goals():
     goals = request.form.getlist('goals')  # List of goals to be saved
 
     try:
+        flush_pending_goals(user_id)
         save_goals_for_category(user_id, category, goals)
         flash(f"Goals for {category} saved successfully!", 'success')
         return redirect(url_for('views.goals_page', category=category))
@@ -110,6 +128,7 @@ def reset_goals():
         flash("Please log in first", "warning")
         return redirect(url_for('auth.login'))
 
+    flush_pending_goals(session['user_id'])
     reset_all_goals(session['user_id'])
     flash("All goals have been reset.", 'info')
     return redirect(url_for('views.habit_tracker'))
\ No newline at end of file
@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+import dataservice
+
+
+class WriteBehindQueue:
+    """
+    Acknowledge goal autosaves once they are appended to a local log, and apply
+    them to SQLite from a background thread.
+
+    Saves are coalesced per (user_id, category): only the newest list submitted
+    within a `window` is written, and each flush applies its whole batch in one
+    transaction. Until then, dataservice reads see the pending lists. After a
+    crash, `recover` replays every logged save that was never marked applied.
+
+    The log and the pending state live in one process, so run a single worker
+    (or pin each user to one worker) when this mode is enabled.
+    """
+
+    def __init__(self, app, log_path, window=0.25, fsync=False):
+        self.app = app
+        self.log_path = log_path
+        self.window = window
+        self.fsync = fsync
+        self._pending = {}  # user_id -> {category: (seq, goals)}
+        self._seq = 0
+        self._lock = threading.Lock()        # guards _pending, _seq and the log
+        self._apply_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._stopped = False
+        self._log = None
+        self._thread = None
+        self._pid = None
+
+    # --- Log ---
+    def _append(self, record):
+        self._log.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def _read_log(self):
+        """Return the newest unapplied save per (user_id, category) found in the log."""
+        latest, applied = {}, set()
+        if not os.path.exists(self.log_path):
+            return latest
+        with open(self.log_path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a torn final line from a crash mid-write
+                if 'applied' in record:
+                    applied.update(record['applied'])
+                else:
+                    key = (record['user_id'], record['category'])
+                    if key not in latest or latest[key]['seq'] < record['seq']:
+                        latest[key] = record
+        return {key: record for key, record in latest.items() if record['seq'] not in applied}
+
+    # --- Lifecycle ---
+    def start(self):
+        # Started lazily from the first request (and submit()), so a
+        # preloading server replays the log and runs the flusher in its
+        # worker rather than in the master.
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is None:
+                replayed = self.recover()
+                if replayed:
+                    self.app.logger.info('Replayed %d pending goal saves from %s', replayed, self.log_path)
+                atexit.register(self.stop)
+            elif self._log is not None:
+                self._log.close()  # the parent's handle
+            self._pid = os.getpid()
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+            self._thread = threading.Thread(target=self._run, name='goal-write-behind', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def recover(self):
+        """Apply saves left in the log by a previous process, then empty it."""
+        records = self._read_log()
+        if records:
+            batch = [(r['user_id'], r['category'], r['seq'], r['goals']) for r in records.values()]
+            self._seq = max(r['seq'] for r in records.values())
+            with self.app.app_context():
+                self._apply(batch)
+        if os.path.exists(self.log_path):
+            open(self.log_path, 'w').close()
+        return len(records)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            time.sleep(self.window)  # let further edits in this window coalesce
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Write-behind flush failed')
+
+    # --- Queue ---
+    def submit(self, user_id, category, goals):
+        self.start()
+        with self._lock:
+            self._seq += 1
+            self._append({'seq': self._seq, 'user_id': user_id, 'category': category, 'goals': goals})
+            self._pending.setdefault(user_id, {})[category] = (self._seq, goals)
+        self._wake.set()
+
+    def pending_for_user(self, user_id):
+        with self._lock:
+            return dict(self._pending.get(user_id, ()))
+
+    def flush(self, user_id=None):
+        """
+        Apply pending saves (all of them, or just one user's) now.
+        Entries stay visible to readers until their transaction has committed.
+        """
+        with self._apply_lock:
+            with self._lock:
+                users = [user_id] if user_id is not None else list(self._pending)
+                batch = [(uid, category, seq, goals)
+                         for uid in users
+                         for category, (seq, goals) in self._pending.get(uid, {}).items()]
+            if not batch:
+                return 0
+
+            if has_app_context():
+                self._apply(batch)
+            else:
+                with self.app.app_context():
+                    self._apply(batch)
+
+            with self._lock:
+                for uid, category, seq, _goals in batch:
+                    categories = self._pending.get(uid, {})
+                    # A newer save may have arrived meanwhile; keep that one.
+                    if categories.get(category, (None,))[0] == seq:
+                        del categories[category]
+                        if not categories:
+                            del self._pending[uid]
+                if self._log is not None:
+                    if self._pending:
+                        self._append({'applied': [seq for _uid, _category, seq, _goals in batch]})
+                    else:
+                        self._log.seek(0)
+                        self._log.truncate()
+            return len(batch)
+
+    def _apply(self, batch):
+        # One transaction per database file the batch touches.
+        by_connection = {}
+        for entry in batch:
+            conn = dataservice.get_user_connection(entry[0])
+            by_connection.setdefault(id(conn), (conn, []))[1].append(entry)
+        for conn, entries in by_connection.values():
+            self._apply_entries(conn, entries)
+
+    def _apply_entries(self, conn, entries):
+        try:
+            for user_id, category, _seq, goals in entries:
+                dataservice.save_goals_for_category(user_id, category, goals, commit=False)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Fall back to one transaction per save so a single bad entry
+            # can't hold back everyone else's.
+            for user_id, category, seq, goals in entries:
+                try:
+                    dataservice.save_goals_for_category(user_id, category, goals)
+                except Exception:
+                    self.app.logger.exception('Dropping write-behind save %s for user %s', seq, user_id)
+
+
+def submit(user_id, category, goals):
+    current_app.extensions['write_behind'].submit(user_id, category, goals)
+    # Reads already include the pending save, so open tabs can be told now
+    # rather than when the flusher commits it.
+    dataservice.notify_change(user_id, 'goals', categories=[category])
+
+
+def init_app(app):
+    queue = WriteBehindQueue(
+        app,
+        app.config['WRITE_BEHIND_LOG'],
+        window=app.config.get('WRITE_BEHIND_WINDOW_MS', 250) / 1000,
+        fsync=app.config.get('WRITE_BEHIND_FSYNC', False),
+    )
+    app.extensions['write_behind'] = queue
+    dataservice.set_pending_goals_source(queue.pending_for_user, queue.flush)
+
+    @app.before_request
+    def start_write_behind():
+        queue.start()
+
+    return queue
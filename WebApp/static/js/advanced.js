@@ -1,4 +1,4 @@
-import { fetchContent, saveGoalsData } from './saveData.js';
+import { fetchContent, saveGoalsData, fetchReminders, saveReminder, subscribeToChanges } from './saveData.js';
 
 const form = document.getElementById('goal-form');
 const titleInput = document.getElementById('goal-title');
@@ -11,22 +11,32 @@ const timeSelect = document.getElementById('goal-time');
 // Initialize goal categories
 const categories = ['daily', 'weekly', 'monthly', 'yearly'];
 
-// Load all goals on page load for each category
+// Load all goals on page load for each category, then follow pushed changes
 categories.forEach(loadGoals);
+subscribeToChanges({
+  goals: goalsByCategory => {
+    for (const [category, goals] of Object.entries(goalsByCategory)) {
+      if (categories.includes(category)) renderGoals(category, goals);
+    }
+  },
+  resync: () => categories.forEach(loadGoals)
+});
 
 function loadGoals(category) {
   fetchContent(category)
-    .then(goals => {
-      const dropzone = document.querySelector(`#${category} .goal-dropzone`);
-      dropzone.innerHTML = ''; // Clear existing goals
-      goals.forEach(goal => renderGoal(goal, category, dropzone));
-    })
+    .then(goals => renderGoals(category, goals))
     .catch(err => {
       console.error(`Failed to load ${category} goals:`, err);
       alert(`❌ Failed to load ${category} goals. Please try again.`);
     });
 }
 
+function renderGoals(category, goals) {
+  const dropzone = document.querySelector(`#${category} .goal-dropzone`);
+  dropzone.innerHTML = ''; // Clear existing goals
+  goals.forEach(goal => renderGoal(goal, category, dropzone));
+}
+
 function renderGoal(goal, category, container) {
   const div = document.createElement('div');
   div.className = 'goal-card';
@@ -158,22 +168,15 @@ function resetTimer(category) {
   updateTimerDisplay(category);
 }
 
-// Notifications
-if ("Notification" in window && Notification.permission !== "granted") {
-  Notification.requestPermission();
-}
-
-function sendReminder(message) {
-  if (Notification.permission === "granted") {
-    new Notification(message);
-  }
-}
-
-// Schedule reminders for daily, weekly, monthly, and yearly goals
-setInterval(() => sendReminder("🗓️ Daily Goal Reminder: Stay consistent!"), 1000 * 60 * 60 * 24);
-setInterval(() => sendReminder("📅 Weekly Goal Reminder: Keep up the momentum!"), 1000 * 60 * 60 * 24 * 7);
-setInterval(() => sendReminder("🗓️ Monthly Goal Reminder: Time to review progress!"), 1000 * 60 * 60 * 24 * 30);
-setInterval(() => sendReminder("📆 Yearly Goal Reminder: Reflect and plan ahead!"), 1000 * 60 * 60 * 24 * 365);
+// Reminders are scheduled and delivered by the server as notifications,
+// so they keep firing after this tab is closed. A user who has never set
+// any up gets the defaults; one switched off (even all of them) stays off.
+fetchReminders()
+  .then(reminders => {
+    if (reminders.length > 0) return;
+    return Promise.all(categories.map(category => saveReminder(category)));
+  })
+  .catch(err => console.error('Failed to set up reminders:', err));
 
 // Category filter functionality
 const categoryFilter = document.getElementById("category-filter");
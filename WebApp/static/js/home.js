@@ -1,12 +1,27 @@
-import { fetchContent, resetGoalsData } from './saveData.js';
+import { fetchAllContent, resetGoalsData, subscribeToChanges } from './saveData.js';
 
 let charts = {};
+let goalsByCategory = {};
+
+const categories = [
+  { name: 'daily', color: '#28a745' },
+  { name: 'weekly', color: '#17a2b8' },
+  { name: 'monthly', color: '#ffc107' },
+  { name: 'yearly', color: '#dc3545' }
+];
 
 // Event listener to set up everything once DOM content is loaded
 document.addEventListener('DOMContentLoaded', () => {
   console.log('Home.js loaded');
   setupButtons();
   updateAllCharts();
+  subscribeToChanges({
+    goals: changed => {
+      Object.assign(goalsByCategory, changed); // Pushed lists replace the stale ones
+      renderAllCharts();
+    },
+    resync: updateAllCharts
+  });
 });
 
 // Escape function to sanitize href assignments
@@ -51,31 +66,28 @@ function setupButtons() {
 // Update all charts with the latest goal data
 async function updateAllCharts() {
   try {
-    const categories = [
-      { name: 'daily', color: '#28a745' },
-      { name: 'weekly', color: '#17a2b8' },
-      { name: 'monthly', color: '#ffc107' },
-      { name: 'yearly', color: '#dc3545' }
-    ];
-
-    let allGoals = [];
-
-    // Fetch goals for each category and update respective charts
-    for (const { name, color } of categories) {
-      const goals = await fetchContent(name);
-      allGoals = [...allGoals, ...goals];
-      updateChart(`${name}Chart`, goals, color);
-    }
-
-    // Create a combined chart for all goals
-    updateChart('allGoalsChart', allGoals, '#673ab7');
-
+    // Fetch every category in one request, then update the respective charts
+    goalsByCategory = await fetchAllContent(categories.map(({ name }) => name));
+    renderAllCharts();
   } catch (err) {
     console.error('Error updating charts:', err);
     alert('Failed to update charts. Please try again.');
   }
 }
 
+// Redraw every chart from the goals already loaded
+function renderAllCharts() {
+  let allGoals = [];
+  for (const { name, color } of categories) {
+    const goals = goalsByCategory[name] || [];
+    allGoals = [...allGoals, ...goals];
+    updateChart(`${name}Chart`, goals, color);
+  }
+
+  // Create a combined chart for all goals
+  updateChart('allGoalsChart', allGoals, '#673ab7');
+}
+
 // Count the number of completed goals
 function countCompleted(goals) {
   return goals.filter(g => g.completed).length;
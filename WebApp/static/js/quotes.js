@@ -24,6 +24,26 @@ function showNextQuote() {
   }, 500);
 }
 
-// Cycle every 30 seconds
+// Cycle every 30 seconds, but only while the tab is visible
+let quoteTimer = null;
+
+function startQuotes() {
+  if (quoteTimer === null) quoteTimer = setInterval(showNextQuote, 30000);
+}
+
+function stopQuotes() {
+  clearInterval(quoteTimer);
+  quoteTimer = null;
+}
+
+document.addEventListener('visibilitychange', () => {
+  if (document.hidden) {
+    stopQuotes();
+  } else {
+    showNextQuote();
+    startQuotes();
+  }
+});
+
 showNextQuote();
-setInterval(showNextQuote, 30000);
+if (!document.hidden) startQuotes();
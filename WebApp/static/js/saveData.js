@@ -13,6 +13,40 @@ async function handleFetchError(response) {
   return response.json();
 }
 
+/**
+ * GET a JSON resource, revalidating against the copy kept in sessionStorage.
+ * The server answers 304 without re-reading goals when the ETag still matches,
+ * so unchanged lists cost one tiny round trip instead of a full payload.
+ * @param {string} url - Same-origin API URL
+ * @returns {Promise<any>} - Parsed JSON, from the server or the stored copy
+ */
+async function fetchWithValidator(url) {
+  const key = `etag-cache:${url}`;
+  let cached = null;
+  try {
+    cached = JSON.parse(sessionStorage.getItem(key));
+  } catch (error) {
+    sessionStorage.removeItem(key);
+  }
+
+  const headers = cached?.etag ? { 'If-None-Match': cached.etag } : {};
+  const response = await fetch(url, { headers, cache: 'no-store' });
+  if (response.status === 304 && cached) {
+    return cached.data;
+  }
+
+  const data = await handleFetchError(response);
+  const etag = response.headers.get('ETag');
+  if (etag) {
+    try {
+      sessionStorage.setItem(key, JSON.stringify({ etag, data }));
+    } catch (error) {
+      sessionStorage.removeItem(key); // Storage full; just skip caching this one
+    }
+  }
+  return data;
+}
+
 /**
  * Fetch goals from the server for a specific category.
  * @param {string} category - One of: 'daily', 'weekly', 'monthly', 'yearly'
@@ -20,14 +54,28 @@ async function handleFetchError(response) {
  */
 export async function fetchContent(category) {
   try {
-    const response = await fetch(`/api/goals?category=${encodeURIComponent(category)}`);
-    return await handleFetchError(response);
+    return await fetchWithValidator(`/api/goals?category=${encodeURIComponent(category)}`);
   } catch (error) {
     console.error(`Error fetching goals for ${category}:`, error.message);
     throw error;
   }
 }
 
+/**
+ * Fetch goals for several categories in a single request.
+ * @param {Array<string>} categories - Categories to load; omit for all of them
+ * @returns {Promise<Object>} - Map of category name to array of goal objects
+ */
+export async function fetchAllContent(categories = []) {
+  try {
+    const query = categories.map(c => `category=${encodeURIComponent(c)}`).join('&');
+    return await fetchWithValidator(`/api/goals/all${query ? `?${query}` : ''}`);
+  } catch (error) {
+    console.error('Error fetching goals:', error.message);
+    throw error;
+  }
+}
+
 /**
  * Save an array of goals to the server for a given category.
  * @param {string} category - The goal category (e.g., 'daily')
@@ -50,6 +98,28 @@ export async function saveGoalsData(category, goalsList) {
   }
 }
 
+/**
+ * Send only the goals that changed in a category.
+ * @param {string} category - The goal category (e.g., 'daily')
+ * @param {Object} changes - { inserted, updated, reordered, deleted } change lists
+ * @returns {Promise<Object>} - Server response including `inserted_ids`
+ */
+export async function patchGoalsData(category, changes) {
+  try {
+    const response = await fetch(`/api/goals?category=${encodeURIComponent(category)}`, {
+      method: 'PATCH',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify(changes)
+    });
+    return await handleFetchError(response);
+  } catch (error) {
+    console.error(`Error updating goals for ${category}:`, error.message);
+    throw error;
+  }
+}
+
 /**
  * Reset all goals for the current user across all categories.
  * @returns {Promise<void>}
@@ -65,3 +135,75 @@ export async function resetGoalsData() {
     throw error;
   }
 }
+
+/**
+ * List the current user's server-side reminders.
+ * @returns {Promise<Array>} - [{ category, message, interval_seconds, next_fire_at, enabled }]
+ */
+export async function fetchReminders() {
+  try {
+    const response = await fetch('/api/reminders');
+    return await handleFetchError(response);
+  } catch (error) {
+    console.error('Error fetching reminders:', error.message);
+    throw error;
+  }
+}
+
+/**
+ * Enable the reminder for a category, optionally with a custom message.
+ * @param {string} category - One of: 'daily', 'weekly', 'monthly', 'yearly'
+ * @param {string} [message] - Replaces the default reminder text
+ * @returns {Promise<Object>} - Server response including `next_fire_at`
+ */
+export async function saveReminder(category, message) {
+  try {
+    const response = await fetch(`/api/reminders/${encodeURIComponent(category)}`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify(message ? { message } : {})
+    });
+    return await handleFetchError(response);
+  } catch (error) {
+    console.error(`Error saving the ${category} reminder:`, error.message);
+    throw error;
+  }
+}
+
+let changeStream = null;
+const changeHandlers = [];
+
+/**
+ * Listen for this user's changes pushed over /api/stream. Every module on a
+ * page shares one EventSource. Handlers: `goals(goalsByCategory)` with the
+ * full list of each changed category, `notifications(change)` with its
+ * `action`, and `resync()` after a reconnect, since changes made while the
+ * stream was down are not replayed. Pages only connect when the server has
+ * live updates on (`data-live-updates` on <body>); otherwise nothing is called.
+ * @param {Object} handlers - Any of { goals, notifications, resync }
+ */
+export function subscribeToChanges(handlers) {
+  changeHandlers.push(handlers);
+  if (changeStream || !('EventSource' in window) || !('liveUpdates' in document.body.dataset)) return;
+
+  changeStream = new EventSource('/api/stream');
+  let opened = false;
+  changeStream.addEventListener('open', () => {
+    if (opened) changeHandlers.forEach(h => h.resync?.());
+    opened = true;
+  });
+  for (const name of ['goals', 'notifications']) {
+    changeStream.addEventListener(name, event => {
+      let data;
+      try {
+        data = JSON.parse(event.data);
+      } catch (error) {
+        console.error(`Bad ${name} event:`, error.message);
+        return;
+      }
+      changeHandlers.forEach(h => h[name]?.(data));
+    });
+  }
+}
@@ -1,4 +1,4 @@
-import { fetchContent, saveGoalsData} from './saveData.js';
+import { fetchAllContent, saveGoalsData, patchGoalsData, subscribeToChanges } from './saveData.js';
 
 // Utility function to sanitize input to prevent XSS attacks
 function sanitizeInput(input) {
@@ -30,6 +30,7 @@ document.addEventListener("DOMContentLoaded", async function () {
     await loadGoalsFromDB();
     initializeDragAndDrop();
     bindGoalForm();
+    subscribeToChanges({ goals: applyGoalChanges, resync: loadGoalsFromDB });
 
     if (logoutBtn) {
       logoutBtn.style.display = "block";
@@ -45,27 +46,59 @@ document.addEventListener("DOMContentLoaded", async function () {
 
 let draggedItem = null;
 
+// What the server last confirmed for each list, so autosaves send only the
+// goals that changed. A list without an entry is saved whole.
+const savedGoals = new Map();
+
 async function loadGoalsFromDB() {
   const lists = document.querySelectorAll('.goal-category ul');
+  const categories = Array.from(lists, ul => ul.id.replace('-goals-list', ''));
+
+  let goalsByCategory = null;
+  try {
+    goalsByCategory = await fetchAllContent(categories); // One request for every list on the page
+  } catch (error) {
+    console.error("Failed loading goals:", error.message);
+  }
+
   for (const ul of lists) {
     const category = ul.id.replace('-goals-list', '');
-    ul.innerHTML = ""; // Clear existing list before loading new goals
-    addCategoryEditToggle(ul, category);
-
-    try {
-      const goals = await fetchContent(category);
-      goals.forEach(goal => {
-        const sanitizedText = sanitizeInput(goal.text); // Sanitize goal text
-        const li = createGoalElement(sanitizedText, goal.completed);
-        ul.appendChild(li);
-      });
-    } catch (error) {
-      console.error(`Failed loading goals for ${category}:`, error.message);
+    renderGoalList(ul, category, goalsByCategory?.[category] || []);
+    if (goalsByCategory) {
+      savedGoals.set(category, readGoals(ul));
+    } else {
+      savedGoals.delete(category);
     }
   }
   initializeDragAndDrop();
 }
 
+function renderGoalList(ul, category, goals) {
+  ul.innerHTML = ""; // Clear existing list before loading new goals
+  addCategoryEditToggle(ul, category);
+
+  try {
+    goals.forEach(goal => {
+      const sanitizedText = sanitizeInput(goal.text); // Sanitize goal text
+      const li = createGoalElement(sanitizedText, goal.completed, goal.id);
+      ul.appendChild(li);
+    });
+  } catch (error) {
+    console.error(`Failed loading goals for ${category}:`, error.message);
+  }
+}
+
+// Patch lists from a pushed `goals` event instead of refetching them
+function applyGoalChanges(goalsByCategory) {
+  for (const [category, goals] of Object.entries(goalsByCategory)) {
+    const ul = document.getElementById(`${category}-goals-list`);
+    // Leave a list alone while it is being dragged or edited in this tab
+    if (!ul || draggedItem || ul.contains(document.activeElement)) continue;
+    renderGoalList(ul, category, goals);
+    savedGoals.set(category, readGoals(ul));
+  }
+}
+
 function addCategoryEditToggle(ul, category) {
   const toggleBtn = document.createElement("button");
   toggleBtn.textContent = "Show Edit Buttons";
@@ -85,9 +118,10 @@ function addCategoryEditToggle(ul, category) {
   ul.appendChild(li);
 }
 
-function createGoalElement(text, completed = false) {
+function createGoalElement(text, completed = false, id = null) {
   const li = document.createElement("li");
   li.setAttribute("draggable", "true");
+  if (id) li.dataset.goalId = id; // Lets the server match rows instead of re-inserting them
 
   const editBtn = document.createElement("button");
   editBtn.textContent = "Edit";
@@ -188,25 +222,87 @@ function handleDrop(e) {
   saveCurrentGoals().catch(err => console.error("Drop save error:", err.message));
 }
 
-async function saveCurrentGoals() {
-  const lists = document.querySelectorAll('.goal-category ul');
+function goalItems(ul) {
+  return Array.from(ul.children)
+    .filter(li => !li.classList.contains('edit-toggle-li'))
+    .filter(li => li.querySelector('.goal-text').textContent.trim().length > 0);
+}
 
-  for (const ul of lists) {
-    const category = ul.id.replace('-goals-list', '');
-    const goals = Array.from(ul.children)
-      .filter(li => !li.classList.contains('edit-toggle-li'))
-      .map(li => ({
-        text: li.querySelector('.goal-text').textContent.trim(),
-        completed: li.querySelector('input[type="checkbox"]').checked
-      }))
-      .filter(goal => goal.text.length > 0);
+function readGoals(ul) {
+  return goalItems(ul).map(li => ({
+    id: li.dataset.goalId ? Number(li.dataset.goalId) : undefined,
+    text: li.querySelector('.goal-text').textContent.trim(),
+    completed: li.querySelector('input[type="checkbox"]').checked
+  }));
+}
+
+// The PATCH change set that turns the saved list into the current one
+function diffGoals(saved, goals) {
+  const before = new Map(saved.filter(goal => goal.id !== undefined).map((goal, index) => [goal.id, { ...goal, index }]));
+  const changes = { inserted: [], updated: [], reordered: [], deleted: [] };
+
+  goals.forEach((goal, index) => {
+    const old = goal.id !== undefined ? before.get(goal.id) : undefined;
+    if (!old) {
+      changes.inserted.push({ text: goal.text, completed: goal.completed, sort_order: index });
+      return;
+    }
+    before.delete(goal.id);
+    if (old.text !== goal.text || old.completed !== goal.completed) {
+      changes.updated.push({ id: goal.id, text: goal.text, completed: goal.completed });
+    }
+    if (old.index !== index) {
+      changes.reordered.push({ id: goal.id, sort_order: index });
+    }
+  });
+  changes.deleted = Array.from(before.keys());
+  return changes;
+}
+
+async function saveList(ul, category) {
+  const items = goalItems(ul);
+  const goals = readGoals(ul);
+  const saved = savedGoals.get(category);
 
+  if (saved) {
+    const changes = diffGoals(saved, goals);
+    if (Object.values(changes).every(list => list.length === 0)) return;
     try {
-      await saveGoalsData(category, goals);
+      const { inserted_ids: insertedIds } = await patchGoalsData(category, changes);
+      // New goals get their ids, so the next change to them is an update
+      const fresh = items.filter(li => !li.dataset.goalId || !saved.some(goal => goal.id === Number(li.dataset.goalId)));
+      fresh.forEach((li, index) => {
+        if (insertedIds[index] !== undefined) li.dataset.goalId = insertedIds[index];
+      });
+      savedGoals.set(category, readGoals(ul));
+      return;
     } catch (error) {
-      console.error(`Error saving ${category} goals:`, error.message);
+      console.error(`Error updating ${category} goals, saving the whole list:`, error.message);
     }
   }
+
+  // No confirmed copy to diff against: the server matches the full list instead.
+  // New goals have no ids until the list is reloaded, so keep saving it whole.
+  savedGoals.delete(category);
+  await saveGoalsData(category, goals);
+}
+
+let saving = Promise.resolve();
+
+// Saves run one after another, so each diff starts from the previous result
+function saveCurrentGoals() {
+  saving = saving.then(async () => {
+    const lists = document.querySelectorAll('.goal-category ul');
+    for (const ul of lists) {
+      const category = ul.id.replace('-goals-list', '');
+      try {
+        await saveList(ul, category);
+      } catch (error) {
+        console.error(`Error saving ${category} goals:`, error.message);
+      }
+    }
+  });
+  return saving;
 }
 
 function bindGoalForm() {
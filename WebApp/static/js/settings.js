@@ -1,10 +1,10 @@
+import { subscribeToChanges } from './saveData.js';
+
 // Theme Selector Element
 const themeSelector = document.getElementById('theme-selector');
 
-// Notification Preferences Elements
-const emailToggle = document.getElementById('email-notifications');
-const pushToggle = document.getElementById('push-notifications');
-const saveNotificationsBtn = document.getElementById('save-notifications');
+// Notification preferences (email/push) are rendered and saved by the server,
+// which also uses them to decide who gets digest emails.
 const clearNotificationsBtn = document.getElementById('clear-notifications');
 const notificationList = document.getElementById('notification-list');
 
@@ -16,9 +16,21 @@ const notificationTimeInput = document.getElementById('notification-time');
 // Load settings from localStorage on page load
 window.addEventListener('DOMContentLoaded', loadSettings);
 
+// Show server notifications (reminders, other tabs) as they are created
+if (notificationList) {
+  subscribeToChanges({
+    notifications: change => {
+      if (change.action === 'created') {
+        addNotificationToDOM(change.message, change.time);
+      } else if (change.action === 'cleared') {
+        notificationList.querySelectorAll('.notification-item').forEach(item => item.remove());
+      }
+    }
+  });
+}
+
 // Event listeners
 if (themeSelector) themeSelector.addEventListener('change', saveThemePreference);
-if (saveNotificationsBtn) saveNotificationsBtn.addEventListener('click', saveNotificationPreferences);
 if (clearNotificationsBtn) clearNotificationsBtn.addEventListener('click', clearNotifications);
 if (createNotificationForm) createNotificationForm.addEventListener('submit', handleNotificationFormSubmit);
 
@@ -26,7 +38,6 @@ if (createNotificationForm) createNotificationForm.addEventListener('submit', ha
 function loadSettings() {
   try {
     loadTheme();
-    loadNotificationPreferences();
     loadNotifications();
     loadScheduledNotifications();
   } catch (err) {
@@ -42,14 +53,6 @@ function loadTheme() {
   }
 }
 
-function loadNotificationPreferences() {
-  const emailPref = localStorage.getItem('emailNotifications');
-  const pushPref = localStorage.getItem('pushNotifications');
-  
-  if (emailToggle && emailPref !== null) emailToggle.checked = JSON.parse(emailPref);
-  if (pushToggle && pushPref !== null) pushToggle.checked = JSON.parse(pushPref);
-}
-
 function loadNotifications() {
   const savedNotifications = JSON.parse(localStorage.getItem('notifications')) || [];
   savedNotifications.forEach(notification => addNotificationToDOM(notification.message, notification.time));
@@ -67,18 +70,6 @@ function saveThemePreference(event) {
   document.body.setAttribute('data-theme', selectedTheme);
 }
 
-// Save notification preferences (email and push)
-function saveNotificationPreferences() {
-  try {
-    localStorage.setItem('emailNotifications', emailToggle.checked);
-    localStorage.setItem('pushNotifications', pushToggle.checked);
-    alert('Notification preferences saved!');
-  } catch (err) {
-    console.error('Error saving notification preferences:', err);
-    alert('Failed to save your notification preferences.');
-  }
-}
-
 // Clear notifications
 function clearNotifications() {
   localStorage.removeItem('notifications');